@@ -0,0 +1,87 @@
+import asyncio
+from loguru import logger
+from ..core.registry import ActionSpec, CONCURRENT, EXCLUSIVE
+
+class ActionDispatcher:
+    """
+    Runs the websocket actions of one session as tasks, so a slow action
+    (pip install, large directory walk) doesn't block the following messages.
+    Ordering and concurrency follow the ActionSpec each action was registered with.
+    """
+    def __init__(self):
+        self.tasks: set = set()
+        self.resource_locks: dict = {}
+        self.limits: dict = {}
+        self.exclusive = asyncio.Lock()
+        self.running = 0
+        self.idle = asyncio.Event()
+        self.idle.set()
+
+    def dispatch(self, action: str, handler, spec: ActionSpec, session, data: dict):
+        task = asyncio.create_task(self._run(action, handler, spec, session, data))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    def _resource_lock(self, key) -> asyncio.Lock:
+        lock = self.resource_locks.get(key)
+        if lock is None:
+            lock = self.resource_locks[key] = asyncio.Lock()
+        return lock
+
+    def _limit(self, action: str, limit: int) -> asyncio.Semaphore:
+        semaphore = self.limits.get(action)
+        if semaphore is None:
+            semaphore = self.limits[action] = asyncio.Semaphore(limit)
+        return semaphore
+
+    async def _call(self, action: str, handler, spec: ActionSpec, session, data: dict):
+        try:
+            if spec.limit:
+                async with self._limit(action, spec.limit):
+                    await handler(session, data)
+            else:
+                await handler(session, data)
+        except Exception as e:
+            logger.error(f"Error in websocket action '{action}': {e}")
+
+    async def _run(self, action: str, handler, spec: ActionSpec, session, data: dict):
+        if spec.concurrency == EXCLUSIVE:
+            async with self.exclusive:
+                await self.idle.wait()
+                await self._call(action, handler, spec, session, data)
+            return
+
+        if self.exclusive.locked():
+            async with self.exclusive:
+                pass
+
+        self.running += 1
+        self.idle.clear()
+        try:
+            if spec.concurrency == CONCURRENT:
+                await self._call(action, handler, spec, session, data)
+            else:
+                lock = self._resource_lock(spec.resource_key(data))
+                async with lock:
+                    await self._call(action, handler, spec, session, data)
+        finally:
+            self.running -= 1
+            if self.running == 0:
+                self.idle.set()
+
+    async def wait_all(self):
+        if self.tasks:
+            await asyncio.gather(*list(self.tasks), return_exceptions=True)
+
+    async def shutdown(self, timeout: float):
+        """Waits up to 'timeout' seconds for the running actions, then cancels the rest."""
+        if not self.tasks:
+            return
+        tasks = list(self.tasks)
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        if pending:
+            logger.warning(f"Cancelling {len(pending)} websocket actions still running on disconnect")
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
@@ -0,0 +1,198 @@
+import asyncio
+import itertools
+import json
+import zlib
+from collections import OrderedDict
+from fastapi import WebSocket
+from loguru import logger
+from ..core.metrics import metrics
+
+# Flushed as soon as they are queued (still after what is already pending, to keep ordering)
+BYPASS_ACTIONS = {"auth_error", "login", "resume", "pong"}
+
+# Large replies the client asks for again after a reconnect, and transient progress: not kept for session replay
+UNREPLAYED_ACTIONS = {"fs_download_chunk", "fs_batch_progress"}
+
+# Close code sent to clients that can't keep up (1013: try again later)
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+def _latest_wins_key(message: dict):
+    """Messages sharing a key replace each other while queued: only the latest state matters."""
+    action = message.get("action")
+    if action == "run_code":
+        return ("run_code", message.get("node"))
+    if action == "get_variable":
+        return ("get_variable", message.get("node"), message.get("name"))
+    if action == "trigger_fired":
+        return ("trigger_fired", message.get("node_id"))
+    if action == "fs_list":
+        return ("fs_list", message.get("path"), message.get("offset"))
+    if action == "fs_batch_progress":
+        return ("fs_batch_progress", message.get("batch_id"))
+    return None
+
+def _is_stream_chunk(message: dict) -> bool:
+    return message.get("action") == "package_manager:log"
+
+class OutboundQueue:
+    """
+    Bounded per-session outbound queue drained by a single writer task.
+    Senders never wait on the network: send() only queues the message.
+
+    While queued, run_code/get_variable/trigger_fired/fs_list/fs_batch_progress messages follow a
+    latest-wins policy and consecutive package_manager:log lines are merged.
+    The writer coalesces what accumulated within 'interval_ms' into one
+    {"action": "batch", "messages": [...]} frame, split on 'max_messages' /
+    'max_bytes'. Frames larger than 'compress_threshold' bytes are sent as
+    zlib-compressed binary frames.
+
+    A client that lets the queue grow past 'max_queue' messages, or that does not
+    accept a frame within 'send_timeout' seconds, is disconnected as a slow consumer.
+    """
+    def __init__(self, websocket: WebSocket, interval_ms: int, max_messages: int, max_bytes: int,
+                 compress_threshold: int, max_queue: int = 2000, send_timeout: float = 10.0):
+        self.websocket = websocket
+        self.interval = (interval_ms or 0) / 1000.0
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.compress_threshold = compress_threshold
+        self.max_queue = max_queue
+        self.send_timeout = send_timeout
+        self.pending: OrderedDict = OrderedDict()
+        self.sequence = itertools.count()
+        self.has_data = asyncio.Event()
+        self.urgent = asyncio.Event()
+        self.writer_task = None
+        self.closed = False
+
+    def _enqueue(self, message: dict, encoded: str = None):
+        merge_key = _latest_wins_key(message)
+        if merge_key is not None:
+            if self.pending.pop(merge_key, None) is not None:
+                metrics.increment("ws.queue.merged")
+            self.pending[merge_key] = (message, encoded)
+            return
+
+        if _is_stream_chunk(message) and self.pending:
+            last_key = next(reversed(self.pending))
+            last, _ = self.pending[last_key]
+            if _is_stream_chunk(last) and last.get("type") == message.get("type"):
+                # Build a new message: the queued ones may also be referenced elsewhere (replay outbox)
+                merged = dict(message)
+                merged["line"] = f"{last.get('line', '')}\n{message.get('line', '')}"
+                self.pending[last_key] = (merged, None)
+                metrics.increment("ws.queue.merged")
+                return
+
+        self.pending[("seq", next(self.sequence))] = (message, encoded)
+
+    async def send(self, message: dict, encoded: str = None):
+        """Queues 'message'; 'encoded' is its JSON when the caller already has it (session.record)."""
+        if self.closed:
+            return
+
+        self._enqueue(message, encoded)
+        if len(self.pending) > self.max_queue:
+            await self._disconnect_slow_consumer(f"{len(self.pending)} messages queued")
+            return
+
+        if self.writer_task is None:
+            self.writer_task = asyncio.create_task(self._writer())
+        self.has_data.set()
+        if message.get("action") in BYPASS_ACTIONS or len(self.pending) >= self.max_messages:
+            self.urgent.set()
+
+    async def _writer(self):
+        try:
+            while not self.closed:
+                await self.has_data.wait()
+                if self.interval > 0 and not self.urgent.is_set():
+                    try:
+                        await asyncio.wait_for(self.urgent.wait(), timeout=self.interval)
+                    except asyncio.TimeoutError:
+                        pass
+                self.has_data.clear()
+                self.urgent.clear()
+                await self._flush_pending()
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.debug(f"Outbound writer stopped: {e}")
+            self.closed = True
+
+    def _pack_frames(self, encoded: list[str]) -> list[str]:
+        frames = []
+        batch = []
+        batch_bytes = 0
+        for item in encoded:
+            if batch and (len(batch) >= self.max_messages or batch_bytes + len(item) > self.max_bytes):
+                frames.append(batch)
+                batch = []
+                batch_bytes = 0
+            batch.append(item)
+            batch_bytes += len(item)
+        if batch:
+            frames.append(batch)
+
+        result = []
+        for batch in frames:
+            if len(batch) == 1:
+                result.append(batch[0])
+            else:
+                metrics.increment("ws.batched_messages", len(batch))
+                result.append('{"action": "batch", "messages": [' + ", ".join(batch) + ']}')
+        return result
+
+    async def _flush_pending(self):
+        if not self.pending:
+            return
+        messages = list(self.pending.values())
+        self.pending.clear()
+        for frame in self._pack_frames([encoded or json.dumps(m) for m, encoded in messages]):
+            try:
+                await asyncio.wait_for(self._send_frame(frame), timeout=self.send_timeout)
+            except asyncio.TimeoutError:
+                await self._disconnect_slow_consumer(f"frame not accepted within {self.send_timeout}s")
+                return
+
+    async def _send_frame(self, frame: str):
+        metrics.increment("ws.frames")
+        if self.compress_threshold and len(frame) >= self.compress_threshold:
+            metrics.increment("ws.frames.compressed")
+            await self.websocket.send_bytes(zlib.compress(frame.encode('utf-8')))
+        else:
+            await self.websocket.send_text(frame)
+
+    async def _disconnect_slow_consumer(self, reason: str):
+        if self.closed:
+            return
+        self.closed = True
+        self.pending.clear()
+        metrics.increment("ws.slow_consumer_disconnects")
+        logger.warning(f"Disconnecting slow websocket consumer: {reason}")
+        try:
+            # A peer this slow may not finish the close handshake either: give up on it after send_timeout
+            await asyncio.wait_for(
+                self.websocket.close(code=SLOW_CONSUMER_CLOSE_CODE, reason="Slow consumer"), timeout=self.send_timeout
+            )
+        except asyncio.TimeoutError:
+            metrics.increment("ws.slow_consumer_close_timeouts")
+            logger.warning(f"Close handshake with slow consumer not done within {self.send_timeout}s, dropping it")
+        except Exception:
+            pass
+
+    async def close(self):
+        """Stops the writer and sends what is still queued (best effort)."""
+        if self.writer_task is not None:
+            self.writer_task.cancel()
+            try:
+                await self.writer_task
+            except asyncio.CancelledError:
+                pass
+            self.writer_task = None
+        if not self.closed:
+            self.closed = True
+            try:
+                await self._flush_pending()
+            except Exception:
+                pass
@@ -6,7 +6,12 @@ from fastapi import WebSocket, WebSocketDisconnect
 from fastapi.websockets import WebSocketState
 from ..services.user_manager import UserManager
 from ..services import filesystem as fs
-from ..core.config import EXECUTION_DEBOUNCE, WS_BATCH_INTERVAL
+from ..services.project_store import project_store
+from ..services.file_watcher import file_watcher
+from ..core.storage_manager import get_user_dir
+from ..core.config import EXECUTION_DEBOUNCE, WS_BATCH_INTERVAL, WS_BATCH_MAX_MESSAGES, WS_BATCH_MAX_BYTES, WS_COMPRESS_THRESHOLD, WS_SEND_QUEUE_MAX_MESSAGES, WS_SEND_TIMEOUT, WS_HANDLER_DRAIN_SECONDS
+from .outbound import OutboundQueue, BYPASS_ACTIONS, UNREPLAYED_ACTIONS
+from .dispatcher import ActionDispatcher
 from ..core.registry import ws_registry
 from ..core.node_registry import node_registry
 from ..auth.security import SECRET_KEY, ALGORITHM
@@ -68,103 +73,194 @@ class UserWebSocket:
         self.websocket = websocket
         self.user_manager = user_manager
         self.user = None
+        self.session = None
         self.last_execution_time = {} # Map node_id -> timestamp
+        self.outbound = OutboundQueue(
+            websocket,
+            interval_ms=WS_BATCH_INTERVAL,
+            max_messages=WS_BATCH_MAX_MESSAGES,
+            max_bytes=WS_BATCH_MAX_BYTES,
+            compress_threshold=WS_COMPRESS_THRESHOLD,
+            max_queue=WS_SEND_QUEUE_MAX_MESSAGES,
+            send_timeout=WS_SEND_TIMEOUT
+        )
+        self.dispatcher = ActionDispatcher()
 
     def is_open(self) -> bool:
         return self.websocket.client_state == WebSocketState.CONNECTED
 
+    async def send_json(self, message: dict):
+        session = self.session
+        if session is None or message.get("action") in BYPASS_ACTIONS:
+            await self.outbound.send(message)
+            return
+        # Sequenced messages are kept for replay and always go to the session's live connection
+        encoded = None
+        if message.get("action") not in UNREPLAYED_ACTIONS:
+            message, encoded = session.record(message)
+        if session.connection is not None:
+            await session.connection.outbound.send(message, encoded)
+
     async def close(self):
         try:
             await self.websocket.close()
         except Exception as e:
             pass
 
-    async def loop(self):
-        try:
-            data = await asyncio.wait_for(self.websocket.receive_json(), timeout=30.0)
-            if data["action"] == "login":
-                token = data.get("token")
-                try:
-                    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-                    identifier = payload.get("sub")
-                    if identifier is None:
-                        raise ValueError("Invalid token")
-                    
-                    # Verify user actually exists in database
-                    db = SessionLocal()
-                    try:
-                        db_user = db.query(User).filter(User.id == identifier).first()
-                        if not db_user:
-                            raise ValueError("User no longer exists in database")
-                        user_tier = db_user.tier
-                    finally:
-                        db.close()
-                        
-                except Exception as e:
-                    logger.warning(f"WebSocket authentication failed: {e}")
-                    await self.websocket.send_json({"action": "auth_error", "error": "Authentication failed"})
-                    await self.websocket.close(code=1008)
-                    return
+    def _watch_files(self):
+        """Pushes the changes of the user's files for as long as the session lives, reconnects included."""
+        session = self.session
 
-                self.user = self.user_manager.get_user(identifier, user_tier)
-                
-                # Close existing connection if any
-                old_conn = self.user_manager.active_connections.get(identifier)
-                if old_conn and old_conn is not self:
-                    logger.warning(f"User {identifier} connected from another session. Terminating previous connection...")
-                    try:
-                        await old_conn.websocket.close(code=1008)
-                    except Exception:
-                        pass
+        async def push(message: dict):
+            connection = session.connection
+            if connection is not None:
+                await connection.send_json(message)
+            else:
+                # Replayed on resume
+                session.record(message)
+
+        file_watcher.watch(self.user.files_dir, get_user_dir(self.user.user_id), session.token, push)
+
+    async def _login(self, data: dict) -> bool:
+        token = data.get("token")
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            identifier = payload.get("sub")
+            if identifier is None:
+                raise ValueError("Invalid token")
+            
+            # Verify user actually exists in database
+            db = SessionLocal()
+            try:
+                db_user = db.query(User).filter(User.id == identifier).first()
+                if not db_user:
+                    raise ValueError("User no longer exists in database")
+                user_tier = db_user.tier
+            finally:
+                db.close()
                 
-                self.user_manager.active_connections[identifier] = self
+        except Exception as e:
+            logger.warning(f"WebSocket authentication failed: {e}")
+            await self.websocket.send_json({"action": "auth_error", "error": "Authentication failed"})
+            await self.websocket.close(code=1008)
+            return False
+
+        self.user = self.user_manager.get_user(identifier, user_tier)
+        
+        # Close existing connection if any
+        old_conn = self.user_manager.active_connections.get(identifier)
+        if old_conn and old_conn is not self:
+            logger.warning(f"User {identifier} connected from another session. Terminating previous connection...")
+            try:
+                await old_conn.websocket.close(code=1008)
+            except Exception:
+                pass
+        
+        self.user_manager.active_connections[identifier] = self
+        self.session = self.user_manager.sessions.create(identifier, user_tier)
+        self.session.attach(self)
+        self._watch_files()
 
-                is_running = self.user.container is not None
-                if not is_running:
-                    await self.websocket.send_json({
-                        "action": "login",
-                        "status": "preparing",
-                        "message": "Initializing Python environment (starting runner)..."
-                    })
+        is_running = self.user.is_running()
+        if not is_running:
+            await self.send_json({
+                "action": "login",
+                "status": "preparing",
+                "message": "Initializing Python environment (starting runner)..."
+            })
 
-                try:
-                    await self.user.start()
-                except Exception as e:
-                    logger.error(f"Failed to start kernel for user {identifier}: {e}")
-                    await self.websocket.send_json({"error": f"Failed to initialize Python environment: {str(e)}"})
-                    await self.websocket.close()
+        try:
+            await self.user.start()
+        except Exception as e:
+            logger.error(f"Failed to start kernel for user {identifier}: {e}")
+            await self.send_json({"error": f"Failed to initialize Python environment: {str(e)}"})
+            await self.websocket.close()
+            return False
+
+        await self.send_json({
+            "action": "login", 
+            "status": "success",
+            "session_token": self.session.token,
+            "front_version": FRONTEND_VERSION,
+            "config": {
+                "core": {
+                    "debounce": EXECUTION_DEBOUNCE,
+                    "batch_interval": WS_BATCH_INTERVAL
+                },
+                "plugins": node_registry.get_all_configs()
+            }
+        })
+        return True
+
+    async def _resume(self, data: dict) -> bool:
+        """
+        Reattaches to a session dropped less than the grace window ago: no authentication,
+        kernel start or config dump, only the messages the client missed are replayed.
+        """
+        session = self.user_manager.sessions.get(data.get("session_token"))
+        if session is None:
+            return False
+        try:
+            missed = session.missed_since(int(data.get("last_seq", 0)))
+        except (TypeError, ValueError):
+            return False
+        if missed is None:
+            return False
+
+        self.user = self.user_manager.get_user(session.user_id, session.tier)
+        old_conn = self.user_manager.active_connections.get(session.user_id)
+        if old_conn and old_conn is not self:
+            try:
+                await old_conn.websocket.close()
+            except Exception:
+                pass
+
+        self.user_manager.active_connections[session.user_id] = self
+        self.session = session
+        session.attach(self)
+        self._watch_files()
+        await self.send_json({"action": "resume", "status": "success", "replayed": len(missed)})
+        for message in missed:
+            await self.outbound.send(message)
+        logger.info(f"User {session.user_id} resumed session, replayed {len(missed)} messages.")
+        return True
+
+    async def loop(self):
+        try:
+            data = await asyncio.wait_for(self.websocket.receive_json(), timeout=30.0)
+            if data.get("action") == "resume":
+                if not await self._resume(data):
+                    await self.send_json({"action": "resume", "status": "error", "error": "Session expired"})
+                    data = await asyncio.wait_for(self.websocket.receive_json(), timeout=30.0)
+            if self.session is None and data.get("action") == "login":
+                if not await self._login(data):
                     return
             if self.user is None:
                 await self.websocket.close()
                 logger.error("WebSocket error: no user")
                 return
-            await self.websocket.send_json({
-                "action": "login", 
-                "status": "success",
-                "front_version": FRONTEND_VERSION,
-                "config": {
-                    "core": {
-                        "debounce": EXECUTION_DEBOUNCE,
-                        "batch_interval": WS_BATCH_INTERVAL
-                    },
-                    "plugins": node_registry.get_all_configs()
-                }
-            })
             while True:
                 data = await self.websocket.receive_json()
                 if not verif_args(data, ["action"]):
-                    await self.websocket.send_json({"error": "missing arguments"})
+                    await self.send_json({"error": "missing arguments"})
                     continue
                 handler = ws_registry.get_handler(data["action"])
                 if handler:
-                    await handler(self, data)
+                    self.dispatcher.dispatch(data["action"], handler, ws_registry.get_spec(data["action"]), self, data)
                 else:
-                    await self.websocket.send_json({"error": f"Unknown action: {data['action']}"})
+                    await self.send_json({"error": f"Unknown action: {data['action']}"})
         except WebSocketDisconnect:
             pass
         except Exception as e:
             await self.websocket.close()
         finally:
+            await self.outbound.close()
+            if self.session:
+                self.session.detach(self)
             if self.user and self.user_manager.active_connections.get(self.user.user_id) is self:
                 del self.user_manager.active_connections[self.user.user_id]
+            # Lets in-flight actions (a save) finish, so their mutations are part of the flush below
+            await self.dispatcher.shutdown(WS_HANDLER_DRAIN_SECONDS)
+            if self.user:
+                await project_store.flush_dir(self.user.projects_dir)
 
@@ -1,15 +1,22 @@
 import os
 import json
 import time
+import asyncio
 import uuid
 from datetime import datetime, timezone
 from loguru import logger
-from ..core.registry import ws_registry
+from ..core.registry import ws_registry, CONCURRENT
 from ..services import filesystem as fs
-from ..core.node_registry import node_registry
+from ..services import project_journal
+from ..services.project_store import project_store
+from ..services import project_streaming
+from ..services import project_history
+from ..services.project_index import check_project_id
 from ..core.tier_manager import get_tier_config
-from ..core.storage_manager import check_user_quota
+from ..core.storage_manager import check_user_quota_async, get_user_dir, mark_usage_stale
+from ..core.config import PROJECT_LOAD_CHUNK_NODES
 from ..services.trigger_manager import trigger_manager
+from ..services.trigger_runner import trigger_runner, execution_timeout
 
 def verif_args(data: dict, required_args: list[str]) -> bool:
     for arg in required_args:
@@ -43,52 +50,30 @@ def _migrate_legacy_project(projects_dir):
     except Exception as e:
         logger.error(f"Error migrating legacy project: {e}")
 
-def _scan_projects(projects_dir):
-    projects = []
-    for filename in os.listdir(projects_dir):
-        if not filename.endswith(".json") or filename == "project.json":
-            continue
-        filepath = os.path.join(projects_dir, filename)
-        try:
-            with open(filepath, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            meta = data.get("meta", {})
-            project_id = filename[:-5]
-            projects.append({
-                "id": project_id,
-                "name": meta.get("name", "Untitled"),
-                "createdAt": meta.get("createdAt", ""),
-                "updatedAt": meta.get("updatedAt", "")
-            })
-        except Exception:
-            pass
-    projects.sort(key=lambda p: p.get("updatedAt", ""), reverse=True)
-    return projects
-
-@ws_registry.register("ping")
+@ws_registry.register("ping", concurrency=CONCURRENT)
 async def handle_ping(session, data: dict):
-    await session.websocket.send_json({"action": "pong"})
+    await session.send_json({"action": "pong"})
 
-@ws_registry.register("list_projects")
+@ws_registry.register("list_projects", resource="projects")
 async def handle_list_projects(session, data: dict):
     try:
         projects_dir = session.user.projects_dir
         os.makedirs(projects_dir, exist_ok=True)
         _migrate_legacy_project(projects_dir)
-        projects = _scan_projects(projects_dir)
-        await session.websocket.send_json({
+        projects = await project_store.list_projects(projects_dir)
+        await session.send_json({
             "action": "list_projects",
             "status": "success",
             "projects": projects
         })
     except Exception as e:
-        await session.websocket.send_json({
+        await session.send_json({
             "action": "list_projects",
             "status": "error",
             "error": str(e)
         })
 
-@ws_registry.register("create_project")
+@ws_registry.register("create_project", resource="projects")
 async def handle_create_project(session, data: dict):
     try:
         tier_config = get_tier_config(session.user.tier)
@@ -98,14 +83,13 @@ async def handle_create_project(session, data: dict):
         os.makedirs(projects_dir, exist_ok=True)
         
         if max_projects is not None:
-            existing_projects = _scan_projects(projects_dir)
-            if len(existing_projects) >= max_projects:
-                await session.websocket.send_json({
+            if await project_store.count_projects(projects_dir) >= max_projects:
+                await session.send_json({
                     "action": "create_project",
                     "status": "error",
                     "error": f"Limit of {max_projects} projects reached."
                 })
-                await session.websocket.send_json({
+                await session.send_json({
                     "action": "notification",
                     "level": "warning",
                     "message": f"Project limit reached ({max_projects}). Delete a project first."
@@ -115,19 +99,12 @@ async def handle_create_project(session, data: dict):
         now = datetime.now(timezone.utc).isoformat()
         project_id = str(uuid.uuid4())
         name = data.get("name", "Untitled")
-        project_data = {
-            "meta": {
-                "name": name,
-                "createdAt": now,
-                "updatedAt": now
-            },
-            "nodes": [],
-            "edges": []
-        }
-        project_path = os.path.join(projects_dir, f"{project_id}.json")
-        with open(project_path, "w", encoding="utf-8") as f:
-            json.dump(project_data, f, indent=2)
-        await session.websocket.send_json({
+        project_store.create(projects_dir, project_id, {
+            "name": name,
+            "createdAt": now,
+            "updatedAt": now
+        })
+        await session.send_json({
             "action": "create_project",
             "status": "success",
             "project": {
@@ -138,41 +115,40 @@ async def handle_create_project(session, data: dict):
             }
         })
     except Exception as e:
-        await session.websocket.send_json({
+        await session.send_json({
             "action": "create_project",
             "status": "error",
             "error": str(e)
         })
 
-@ws_registry.register("delete_project")
+@ws_registry.register("delete_project", resource="project", resource_arg="project_id")
 async def handle_delete_project(session, data: dict):
     try:
         if not verif_args(data, ["project_id"]):
-            await session.websocket.send_json({"error": "missing project_id"})
+            await session.send_json({"error": "missing project_id"})
             return
-        projects_dir = session.user.projects_dir
-        project_path = os.path.join(projects_dir, f"{data['project_id']}.json")
-        if os.path.exists(project_path):
-            os.remove(project_path)
+        check_project_id(data["project_id"])
+        await project_store.delete(session.user.projects_dir, data["project_id"])
         await trigger_manager.delete_project_triggers(data["project_id"])
-        await session.websocket.send_json({
+        await session.send_json({
             "action": "delete_project",
             "status": "success",
             "project_id": data["project_id"]
         })
     except Exception as e:
-        await session.websocket.send_json({
+        await session.send_json({
             "action": "delete_project",
             "status": "error",
             "error": str(e)
         })
 
-@ws_registry.register("update_trigger")
+@ws_registry.register("update_trigger", resource="trigger", resource_arg="node_id")
 async def handle_update_trigger(session, data: dict):
     try:
         if not verif_args(data, ["project_id", "node_id", "node_type"]):
-            await session.websocket.send_json({"error": "missing arguments for update_trigger"})
+            await session.send_json({"error": "missing arguments for update_trigger"})
             return
+        check_project_id(data["project_id"])
         
         is_active = data.get("is_active", True)
         config = data.get("config", {})
@@ -186,98 +162,126 @@ async def handle_update_trigger(session, data: dict):
             config=config
         )
         
-        await session.websocket.send_json({
+        await session.send_json({
             "action": "update_trigger",
             "status": "success",
             "node_id": data["node_id"],
             "is_active": is_active
         })
     except Exception as e:
-        await session.websocket.send_json({
+        await session.send_json({
             "action": "update_trigger",
             "status": "error",
             "error": str(e)
         })
 
-@ws_registry.register("delete_trigger")
+@ws_registry.register("delete_trigger", resource="trigger", resource_arg="node_id")
 async def handle_delete_trigger(session, data: dict):
     try:
         if not verif_args(data, ["node_id"]):
-            await session.websocket.send_json({"error": "missing node_id"})
+            await session.send_json({"error": "missing node_id"})
             return
             
         await trigger_manager.delete_trigger(data["node_id"])
-        await session.websocket.send_json({
+        await session.send_json({
             "action": "delete_trigger",
             "status": "success",
             "node_id": data["node_id"]
         })
     except Exception as e:
-        await session.websocket.send_json({
+        await session.send_json({
             "action": "delete_trigger",
             "status": "error",
             "error": str(e)
         })
 
-@ws_registry.register("rename_project")
+@ws_registry.register("list_trigger_runs", concurrency=CONCURRENT, limit=2)
+async def handle_list_trigger_runs(session, data: dict):
+    try:
+        runs = await asyncio.to_thread(
+            trigger_runner.list_runs, get_user_dir(session.user.user_id), data.get("project_id"), data.get("limit", 20)
+        )
+        await session.send_json({
+            "action": "list_trigger_runs",
+            "status": "success",
+            "project_id": data.get("project_id"),
+            "runs": runs
+        })
+    except Exception as e:
+        await session.send_json({
+            "action": "list_trigger_runs",
+            "status": "error",
+            "error": str(e)
+        })
+
+@ws_registry.register("get_trigger_run", concurrency=CONCURRENT, limit=2)
+async def handle_get_trigger_run(session, data: dict):
+    if not verif_args(data, ["run_id"]):
+        await session.send_json({"error": "missing run_id"})
+        return
+    run = await asyncio.to_thread(trigger_runner.read_run, get_user_dir(session.user.user_id), data["run_id"])
+    if run is None:
+        await session.send_json({
+            "action": "get_trigger_run",
+            "status": "error",
+            "run_id": data["run_id"],
+            "error": "Run not found"
+        })
+        return
+    await session.send_json({
+        "action": "get_trigger_run",
+        "status": "success",
+        "run": run
+    })
+
+@ws_registry.register("rename_project", resource="project", resource_arg="project_id")
 async def handle_rename_project(session, data: dict):
     try:
         if not verif_args(data, ["project_id", "name"]):
-            await session.websocket.send_json({"error": "missing project_id or name"})
+            await session.send_json({"error": "missing project_id or name"})
             return
+        check_project_id(data["project_id"])
         projects_dir = session.user.projects_dir
-        project_path = os.path.join(projects_dir, f"{data['project_id']}.json")
-        if not os.path.exists(project_path):
-            await session.websocket.send_json({
+        if not await project_store.exists(projects_dir, data["project_id"]):
+            await session.send_json({
                 "action": "rename_project",
                 "status": "error",
                 "error": "Project not found"
             })
             return
-        with open(project_path, "r", encoding="utf-8") as f:
-            project_data = json.load(f)
-        project_data.setdefault("meta", {})["name"] = data["name"]
-        project_data["meta"]["updatedAt"] = datetime.now(timezone.utc).isoformat()
-        with open(project_path, "w", encoding="utf-8") as f:
-            json.dump(project_data, f, indent=2)
-        await session.websocket.send_json({
+        project_store.rename(projects_dir, data["project_id"], data["name"], datetime.now(timezone.utc).isoformat())
+        await session.send_json({
             "action": "rename_project",
             "status": "success",
             "project_id": data["project_id"],
             "name": data["name"]
         })
     except Exception as e:
-        await session.websocket.send_json({
+        await session.send_json({
             "action": "rename_project",
             "status": "error",
             "error": str(e)
         })
 
-@ws_registry.register("run_node")
+@ws_registry.register("run_node", resource="kernel")
 async def handle_run_node(session, data: dict):
     if not verif_args(data, ["node", "code", "variables"]):
-        await session.websocket.send_json({"error": "missing arguments for run_code"})
+        await session.send_json({"error": "missing arguments for run_code"})
         return
 
     node_type = data.get("node_type", "CustomNode")
-    timeout = node_registry.get_timeout(node_type)
-    
-    tier_config = get_tier_config(session.user.tier)
-    tier_timeout = tier_config.get("execution_timeout")
-    if tier_timeout is not None:
-        if timeout is None or tier_timeout < timeout:
-            timeout = tier_timeout
+    timeout = execution_timeout(node_type, session.user.tier)
 
     inputs = data.get("inputs", [])
     node_id = data["node"]
 
-    if not check_user_quota(session.user.user_id, tier=session.user.tier):
-        await session.websocket.send_json({
+    if not await check_user_quota_async(session.user.user_id, tier=session.user.tier):
+        await session.send_json({
             "action": "notification",
             "level": "warning",
             "message": "Storage quota reached. Delete files to free up space."
         })
-        await session.websocket.send_json({
+        await session.send_json({
             "action": "run_code",
             "status": "error",
             "node": node_id,
@@ -286,7 +290,7 @@ async def handle_run_node(session, data: dict):
         return
 
     if not session.user.can_run_code():
-        await session.websocket.send_json({
+        await session.send_json({
             "action": "run_code",
             "status": "error",
             "node": node_id,
@@ -298,7 +302,7 @@ async def handle_run_node(session, data: dict):
     last_time = session.last_execution_time.get(node_id, 0)
     
     if now - last_time < 10:
-         await session.websocket.send_json({
+         await session.send_json({
              "action": "run_code",
              "status": "error",
              "node": node_id,
@@ -308,7 +312,7 @@ async def handle_run_node(session, data: dict):
          
     session.last_execution_time[node_id] = now
 
-    await session.websocket.send_json({"action": "run_code", "status": "running", "node": data["node"]})
+    await session.send_json({"action": "run_code", "status": "running", "node": data["node"]})
     
     try:
         response = await session.user.send_request({
@@ -320,14 +324,17 @@ async def handle_run_node(session, data: dict):
             "inputs": inputs
         })
         
+        # Node states and files written by the code: the next reconciliation measures them
+        mark_usage_stale(get_user_dir(session.user.user_id))
+
         if response.get("error") == "STORAGE_QUOTA_EXCEEDED":
-            await session.websocket.send_json({
+            await session.send_json({
                 "action": "notification",
                 "level": "warning",
                 "message": "Storage quota reached. Delete files to free up space."
             })
             
-        await session.websocket.send_json({
+        await session.send_json({
             "action": "run_code", 
             "status": response.get("status"), 
             "node": data["node"],
@@ -335,18 +342,18 @@ async def handle_run_node(session, data: dict):
             "error": response.get("error", "")
         })
     except Exception as e:
-        await session.websocket.send_json({
+        await session.send_json({
             "action": "run_code", 
             "status": "error", 
             "node": data["node"],
             "error": str(e)
         })
 
-@ws_registry.register("get_variable")
+@ws_registry.register("get_variable", resource="kernel")
 async def handle_get_variable(session, data: dict):
     try:
         if not verif_args(data, ["node", "name"]):
-            await session.websocket.send_json({"error": "missing arguments for get_variable"})
+            await session.send_json({"error": "missing arguments for get_variable"})
             return
         response = await session.user.send_request({
             "action": "get_variable",
@@ -355,13 +362,13 @@ async def handle_get_variable(session, data: dict):
         })
         
         if response.get("error") == "STORAGE_QUOTA_EXCEEDED":
-            await session.websocket.send_json({
+            await session.send_json({
                 "action": "notification",
                 "level": "warning",
                 "message": "Storage quota reached. Delete files to free up space."
             })
             
-        await session.websocket.send_json({
+        await session.send_json({
             "action": "get_variable",
             "node": data["node"],
             "name": data["name"],
@@ -370,115 +377,158 @@ async def handle_get_variable(session, data: dict):
         })
     except Exception as e:
         logger.error(f"Error in ws_get_variable: {e}")
-        await session.websocket.send_json({
+        await session.send_json({
             "action": "get_variable",
             "node": data.get("node"),
             "name": data.get("name"),
             "error": str(e)
         })
 
-@ws_registry.register("save_project")
+@ws_registry.register("save_project", resource="project", resource_arg="project_id")
 async def handle_save_project(session, data: dict):
     try:
         if not verif_args(data, ["project_id", "project_data"]):
-            await session.websocket.send_json({"error": "missing project_id or project_data"})
+            await session.send_json({"error": "missing project_id or project_data"})
             return
+        check_project_id(data["project_id"])
 
-        if not check_user_quota(session.user.user_id, tier=session.user.tier):
-            await session.websocket.send_json({
+        if not await check_user_quota_async(session.user.user_id, tier=session.user.tier):
+            await session.send_json({
                 "action": "notification",
                 "level": "error",
                 "message": "Storage quota reached. Cannot save project."
             })
-            await session.websocket.send_json({
+            await session.send_json({
                 "action": "save_project",
                 "status": "error",
                 "error": "STORAGE_QUOTA_EXCEEDED"
             })
             return
 
-        projects_dir = session.user.projects_dir
-        os.makedirs(projects_dir, exist_ok=True)
-        project_path = os.path.join(projects_dir, f"{data['project_id']}.json")
-
-        # Preserve existing meta, only update nodes/edges and updatedAt
-        meta = {}
-        if os.path.exists(project_path):
-            try:
-                with open(project_path, "r", encoding="utf-8") as f:
-                    existing = json.load(f)
-                meta = existing.get("meta", {})
-            except Exception:
-                pass
-
-        meta["updatedAt"] = datetime.now(timezone.utc).isoformat()
-        if "createdAt" not in meta:
-            meta["createdAt"] = meta["updatedAt"]
-        if "name" not in meta:
-            meta["name"] = "Untitled"
-
-        full_data = {
-            "meta": meta,
-            "nodes": data["project_data"].get("nodes", []),
-            "edges": data["project_data"].get("edges", [])
-        }
-
-        with open(project_path, "w", encoding="utf-8") as f:
-            json.dump(full_data, f, indent=2)
+        project_store.save_graph(
+            session.user.projects_dir,
+            data["project_id"],
+            data["project_data"].get("nodes", []),
+            data["project_data"].get("edges", []),
+            datetime.now(timezone.utc).isoformat()
+        )
 
-        await session.websocket.send_json({
+        await session.send_json({
             "action": "save_project",
             "status": "success",
             "project_id": data["project_id"]
         })
-    except OSError as e:
-        if e.errno == 28:
-            await session.websocket.send_json({
+    except Exception as e:
+        logger.error(f"Error saving project: {e}")
+        await session.send_json({
+            "action": "save_project",
+            "status": "error",
+            "error": str(e)
+        })
+
+@ws_registry.register("save_project_patch", resource="project", resource_arg="project_id")
+async def handle_save_project_patch(session, data: dict):
+    try:
+        if not verif_args(data, ["project_id", "ops"]):
+            await session.send_json({"error": "missing project_id or ops"})
+            return
+        check_project_id(data["project_id"])
+
+        if not await check_user_quota_async(session.user.user_id, tier=session.user.tier):
+            await session.send_json({
                 "action": "notification",
                 "level": "error",
                 "message": "Storage quota reached. Cannot save project."
             })
-            await session.websocket.send_json({
-                "action": "save_project",
+            await session.send_json({
+                "action": "save_project_patch",
                 "status": "error",
+                "project_id": data["project_id"],
                 "error": "STORAGE_QUOTA_EXCEEDED"
             })
-        else:
-            logger.error(f"Error saving project: {e}")
-            await session.websocket.send_json({
-                "action": "save_project",
+            return
+
+        projects_dir = session.user.projects_dir
+        project_id = data["project_id"]
+        ops = project_journal.validate_ops(data["ops"])
+        if not await project_store.exists(projects_dir, project_id):
+            # Patches need a base snapshot: the client falls back to a full save_project
+            await session.send_json({
+                "action": "save_project_patch",
                 "status": "error",
-                "error": str(e)
+                "project_id": project_id,
+                "error": "Project not found"
             })
+            return
+
+        project_store.apply_patch(projects_dir, project_id, ops, datetime.now(timezone.utc).isoformat())
+
+        await session.send_json({
+            "action": "save_project_patch",
+            "status": "success",
+            "project_id": project_id
+        })
     except Exception as e:
-        logger.error(f"Error saving project: {e}")
-        await session.websocket.send_json({
-            "action": "save_project",
+        logger.error(f"Error saving project patch: {e}")
+        await session.send_json({
+            "action": "save_project_patch",
             "status": "error",
+            "project_id": data.get("project_id"),
             "error": str(e)
         })
 
-@ws_registry.register("load_project")
+async def _stream_project(session, project_id: str, project_data: dict, viewport: dict = None):
+    """Meta, edges and node skeletons first, then node bodies in chunks, visible nodes first."""
+    nodes = project_data.get("nodes", [])
+    await session.send_json({
+        "action": "load_project",
+        "status": "streaming",
+        "project_id": project_id,
+        "total": len(nodes),
+        "project_data": {
+            "meta": project_data.get("meta", {}),
+            "nodes": [project_streaming.node_skeleton(node) for node in nodes],
+            "edges": project_data.get("edges", [])
+        }
+    })
+    ordered = project_streaming.order_by_viewport(nodes, viewport)
+    for chunk in project_streaming.iter_chunks(ordered, PROJECT_LOAD_CHUNK_NODES):
+        await session.send_json({
+            "action": "load_project_chunk",
+            "project_id": project_id,
+            "nodes": [project_streaming.node_body(node) for node in chunk]
+        })
+        # Let other sessions' work through between chunks
+        await asyncio.sleep(0)
+    await session.send_json({
+        "action": "load_project_end",
+        "project_id": project_id
+    })
+
+@ws_registry.register("load_project", resource="project", resource_arg="project_id")
 async def handle_load_project(session, data: dict):
     try:
         if not verif_args(data, ["project_id"]):
-            await session.websocket.send_json({"error": "missing project_id"})
+            await session.send_json({"error": "missing project_id"})
             return
+        check_project_id(data["project_id"])
 
-        projects_dir = session.user.projects_dir
-        project_path = os.path.join(projects_dir, f"{data['project_id']}.json")
-
-        if os.path.exists(project_path):
-            with open(project_path, "r", encoding="utf-8") as f:
-                project_data = json.load(f)
-            await session.websocket.send_json({
+        project_data = await project_store.load(session.user.projects_dir, data["project_id"])
+        nodes = project_data.get("nodes", []) if project_data is not None else []
+        if project_data is not None and session.session is not None:
+            # Its triggers now run in this client
+            session.session.active_project_id = data["project_id"]
+        if data.get("stream") and len(nodes) > PROJECT_LOAD_CHUNK_NODES:
+            await _stream_project(session, data["project_id"], project_data, data.get("viewport"))
+        elif project_data is not None:
+            await session.send_json({
                 "action": "load_project",
                 "status": "success",
                 "project_id": data["project_id"],
                 "project_data": project_data
             })
         else:
-            await session.websocket.send_json({
+            await session.send_json({
                 "action": "load_project",
                 "status": "error",
                 "project_id": data["project_id"],
@@ -486,8 +536,85 @@ async def handle_load_project(session, data: dict):
             })
     except Exception as e:
         logger.error(f"Error loading project: {e}")
-        await session.websocket.send_json({
+        await session.send_json({
             "action": "load_project",
             "status": "error",
             "error": str(e)
         })
+
+@ws_registry.register("list_versions", resource="project", resource_arg="project_id")
+async def handle_list_versions(session, data: dict):
+    try:
+        if not verif_args(data, ["project_id"]):
+            await session.send_json({"error": "missing project_id"})
+            return
+        check_project_id(data["project_id"])
+        versions = await project_store.read_history(
+            session.user.projects_dir, project_history.list_versions, data["project_id"]
+        )
+        await session.send_json({
+            "action": "list_versions",
+            "status": "success",
+            "project_id": data["project_id"],
+            "versions": versions
+        })
+    except Exception as e:
+        await session.send_json({
+            "action": "list_versions",
+            "status": "error",
+            "project_id": data.get("project_id"),
+            "error": str(e)
+        })
+
+@ws_registry.register("load_version", resource="project", resource_arg="project_id")
+async def handle_load_version(session, data: dict):
+    try:
+        if not verif_args(data, ["project_id", "version"]):
+            await session.send_json({"error": "missing project_id or version"})
+            return
+        check_project_id(data["project_id"])
+        project_data = await project_store.read_history(
+            session.user.projects_dir, project_history.load_version, data["project_id"], data["version"]
+        )
+        await session.send_json({
+            "action": "load_version",
+            "status": "success",
+            "project_id": data["project_id"],
+            "version": data["version"],
+            "project_data": project_data
+        })
+    except Exception as e:
+        await session.send_json({
+            "action": "load_version",
+            "status": "error",
+            "project_id": data.get("project_id"),
+            "error": str(e)
+        })
+
+@ws_registry.register("diff_versions", resource="project", resource_arg="project_id")
+async def handle_diff_versions(session, data: dict):
+    try:
+        if not verif_args(data, ["project_id", "from_version"]):
+            await session.send_json({"error": "missing project_id or from_version"})
+            return
+        check_project_id(data["project_id"])
+        # Without 'to_version' the diff is against the current state of the project
+        diff = await project_store.read_history(
+            session.user.projects_dir, project_history.diff_versions,
+            data["project_id"], data["from_version"], data.get("to_version")
+        )
+        await session.send_json({
+            "action": "diff_versions",
+            "status": "success",
+            "project_id": data["project_id"],
+            "from_version": data["from_version"],
+            "to_version": data.get("to_version"),
+            "diff": diff
+        })
+    except Exception as e:
+        await session.send_json({
+            "action": "diff_versions",
+            "status": "error",
+            "project_id": data.get("project_id"),
+            "error": str(e)
+        })
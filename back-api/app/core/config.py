@@ -17,15 +17,58 @@ core_config = ConfigManager(
         "token_expire_minutes": 10080,
         "allow_registration": True,
         "execution_debounce_ms": 50,
-        "ws_batch_interval_ms": 0,
+        "ws_batch_interval_ms": int(os.getenv("NODAL_BATCH_INTERVAL", 0)),
+        "ws_batch_max_messages": 200,
+        "ws_batch_max_bytes": 262144,
+        "ws_compress_threshold_bytes": 65536,
+        "ws_send_queue_max_messages": 2000,
+        "ws_send_timeout_seconds": 10,
+        "ws_handler_drain_seconds": 5,
+        "session_resume_grace_seconds": 120,
+        "session_outbox_size": 500,
+        "session_outbox_max_bytes": 4194304,
+        "project_journal_max_entries": 200,
+        "project_journal_max_bytes": 1048576,
+        "project_flush_delay_ms": 500,
+        "project_load_chunk_nodes": 100,
+        "project_history_interval_seconds": 300,
+        "project_history_max_versions": 50,
+        "storage_reconcile_seconds": 300,
+        "transfer_chunk_bytes": 262144,
+        "transfer_ttl_seconds": 86400,
+        "fs_watch_backend": "auto",
+        "fs_watch_debounce_ms": 300,
+        "fs_watch_poll_seconds": 2,
+        "preview_rows": 20,
+        "preview_sample_rows": 100,
+        "preview_scan_bytes": 67108864,
         "algorithm": "HS256",
+        "kernel_backend": os.getenv("NODAL_KERNEL_BACKEND", "docker"),
+        "kernel_lifecycle_workers": 16,
+        "max_concurrent_kernel_starts": 4,
+        "kernel_start_timeout_seconds": 60,
+        "idle_check_interval_seconds": 15,
+        "memory_pressure_min_available_mb": 512,
+        "trigger_misfire_policy": "fire_once",
+        "trigger_misfire_max_fires": 10,
+        "trigger_misfire_spacing_seconds": 10,
+        "trigger_startup_jitter_seconds": 30,
+        "trigger_runner_max_concurrent": 4,
+        "trigger_run_log_keep": 50,
+        "kernel_budget": {
+            "max_kernels": 50,
+            "max_memory_mb": 0
+        },
         "tiers": {
             "default": {
                 "mem_limit": "512m",
                 "cpu_quota": 50000,
                 "max_disk_mb": 500,
                 "execution_timeout": 30,
-                "max_projects": 5
+                "max_projects": 5,
+                "idle_pause_seconds": 120,
+                "idle_stop_seconds": 600,
+                "max_headless_runs": 1
             }
         }
     },
@@ -40,3 +83,40 @@ ACCESS_TOKEN_EXPIRE_MINUTES = core_config.get("token_expire_minutes")
 ALLOW_REGISTRATION = core_config.get("allow_registration")
 EXECUTION_DEBOUNCE = core_config.get("execution_debounce_ms")
 WS_BATCH_INTERVAL = core_config.get("ws_batch_interval_ms")
+WS_BATCH_MAX_MESSAGES = core_config.get("ws_batch_max_messages", 200)
+WS_BATCH_MAX_BYTES = core_config.get("ws_batch_max_bytes", 262144)
+WS_COMPRESS_THRESHOLD = core_config.get("ws_compress_threshold_bytes", 65536)
+WS_SEND_QUEUE_MAX_MESSAGES = core_config.get("ws_send_queue_max_messages", 2000)
+WS_SEND_TIMEOUT = core_config.get("ws_send_timeout_seconds", 10)
+WS_HANDLER_DRAIN_SECONDS = core_config.get("ws_handler_drain_seconds", 5)
+SESSION_RESUME_GRACE = core_config.get("session_resume_grace_seconds", 120)
+SESSION_OUTBOX_SIZE = core_config.get("session_outbox_size", 500)
+SESSION_OUTBOX_MAX_BYTES = core_config.get("session_outbox_max_bytes", 4194304)
+PROJECT_JOURNAL_MAX_ENTRIES = core_config.get("project_journal_max_entries", 200)
+PROJECT_JOURNAL_MAX_BYTES = core_config.get("project_journal_max_bytes", 1048576)
+PROJECT_FLUSH_DELAY_MS = core_config.get("project_flush_delay_ms", 500)
+PROJECT_LOAD_CHUNK_NODES = core_config.get("project_load_chunk_nodes", 100)
+PROJECT_HISTORY_INTERVAL = core_config.get("project_history_interval_seconds", 300)
+PROJECT_HISTORY_MAX_VERSIONS = core_config.get("project_history_max_versions", 50)
+STORAGE_RECONCILE_INTERVAL = core_config.get("storage_reconcile_seconds", 300)
+TRANSFER_CHUNK_BYTES = core_config.get("transfer_chunk_bytes", 262144)
+TRANSFER_TTL = core_config.get("transfer_ttl_seconds", 86400)
+FS_WATCH_BACKEND = core_config.get("fs_watch_backend", "auto")
+FS_WATCH_DEBOUNCE_MS = core_config.get("fs_watch_debounce_ms", 300)
+FS_WATCH_POLL_SECONDS = core_config.get("fs_watch_poll_seconds", 2)
+PREVIEW_ROWS = core_config.get("preview_rows", 20)
+PREVIEW_SAMPLE_ROWS = core_config.get("preview_sample_rows", 100)
+PREVIEW_SCAN_BYTES = core_config.get("preview_scan_bytes", 67108864)
+KERNEL_BACKEND = core_config.get("kernel_backend", "docker")
+KERNEL_LIFECYCLE_WORKERS = core_config.get("kernel_lifecycle_workers", 16)
+MAX_CONCURRENT_KERNEL_STARTS = core_config.get("max_concurrent_kernel_starts", 4)
+KERNEL_START_TIMEOUT = core_config.get("kernel_start_timeout_seconds", 60)
+IDLE_CHECK_INTERVAL = core_config.get("idle_check_interval_seconds", 15)
+MEMORY_PRESSURE_MIN_AVAILABLE_MB = core_config.get("memory_pressure_min_available_mb", 512)
+KERNEL_BUDGET = core_config.get("kernel_budget") or {}
+TRIGGER_MISFIRE_POLICY = core_config.get("trigger_misfire_policy", "fire_once")
+TRIGGER_MISFIRE_MAX_FIRES = core_config.get("trigger_misfire_max_fires", 10)
+TRIGGER_MISFIRE_SPACING = core_config.get("trigger_misfire_spacing_seconds", 10)
+TRIGGER_STARTUP_JITTER = core_config.get("trigger_startup_jitter_seconds", 30)
+TRIGGER_RUNNER_MAX_CONCURRENT = core_config.get("trigger_runner_max_concurrent", 4)
+TRIGGER_RUN_LOG_KEEP = core_config.get("trigger_run_log_keep", 50)
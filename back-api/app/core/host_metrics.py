@@ -0,0 +1,26 @@
+from typing import Optional
+
+MEMINFO_PATH = "/proc/meminfo"
+
+def get_available_memory_bytes() -> Optional[int]:
+    """
+    Returns the host's available memory (MemAvailable) in bytes.
+    Returns None when the value cannot be determined (e.g. non-Linux hosts).
+    """
+    try:
+        with open(MEMINFO_PATH, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    parts = line.split()
+                    return int(parts[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+def is_under_memory_pressure(min_available_mb: int) -> bool:
+    if not min_available_mb:
+        return False
+    available = get_available_memory_bytes()
+    if available is None:
+        return False
+    return available < min_available_mb * 1024 * 1024
@@ -0,0 +1,47 @@
+import time
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any
+
+class MetricsRegistry:
+    """
+    Minimal in-process metrics: timings (count/total/max) and counters.
+    Thread-safe, so lifecycle calls running in executors can report too.
+    """
+    def __init__(self):
+        self._timings: Dict[str, Dict[str, float]] = {}
+        self._counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, seconds: float):
+        with self._lock:
+            timing = self._timings.setdefault(name, {"count": 0, "total": 0.0, "max": 0.0})
+            timing["count"] += 1
+            timing["total"] += seconds
+            timing["max"] = max(timing["max"], seconds)
+
+    def increment(self, name: str, value: int = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    @contextmanager
+    def timer(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            timings = {}
+            for name, timing in self._timings.items():
+                timings[name] = {
+                    "count": timing["count"],
+                    "total": timing["total"],
+                    "max": timing["max"],
+                    "avg": timing["total"] / timing["count"] if timing["count"] else 0.0
+                }
+            return {"timings": timings, "counters": dict(self._counters)}
+
+metrics = MetricsRegistry()
@@ -8,8 +8,14 @@ class NodeRegistry:
     def __init__(self):
         self.node_configs = {}
         self.node_settings = {}
+        self.auto_trigger_types = set()
 
-    def register(self, config_schema: Dict[str, Any] = None):
+    def register(self, config_schema: Dict[str, Any] = None, auto_trigger: bool = False):
+        """
+        Registers the settings of the calling plugin's node type. 'auto_trigger' mirrors
+        the frontend config: the node runs when an upstream node finishes, including in
+        headless trigger runs.
+        """
         schema = config_schema or {}
         
         frame = inspect.currentframe().f_back
@@ -24,6 +30,11 @@ class NodeRegistry:
         )
         self.node_settings[node_type.lower()] = manager
         self.node_configs[node_type] = manager.config
+        if auto_trigger:
+            self.auto_trigger_types.add(node_type.lower())
+
+    def is_auto_trigger(self, node_type: str) -> bool:
+        return bool(node_type) and node_type.lower() in self.auto_trigger_types
 
     def get_timeout(self, node_type: str) -> float:
         if not node_type:
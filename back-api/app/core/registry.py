@@ -1,14 +1,43 @@
+from dataclasses import dataclass
+from typing import Optional
+
+# Concurrency classes of websocket actions (per session)
+CONCURRENT = "concurrent"  # runs as soon as it is received
+SERIAL = "serial"          # runs in order with the other actions of the same resource
+EXCLUSIVE = "exclusive"    # waits for every running action and blocks new ones until done
+
+@dataclass
+class ActionSpec:
+    concurrency: str = SERIAL
+    # Actions sharing a resource are serialized. 'resource_arg' narrows the resource to
+    # the value of that message field (e.g. one queue per project_id).
+    resource: str = "session"
+    resource_arg: Optional[str] = None
+    # Max number of concurrently running instances of this action per session
+    limit: Optional[int] = None
+
+    def resource_key(self, data: dict):
+        if self.resource_arg is None:
+            return (self.resource,)
+        return (self.resource, data.get(self.resource_arg))
+
 class WebSocketRegistry:
     def __init__(self):
         self._handlers = {}
+        self._specs = {}
 
-    def register(self, action_name: str):
+    def register(self, action_name: str, concurrency: str = SERIAL, resource: str = "session",
+                 resource_arg: str = None, limit: int = None):
         def decorator(func):
             self._handlers[action_name] = func
+            self._specs[action_name] = ActionSpec(concurrency, resource, resource_arg, limit)
             return func
         return decorator
 
     def get_handler(self, action_name: str):
         return self._handlers.get(action_name)
 
+    def get_spec(self, action_name: str) -> ActionSpec:
+        return self._specs.get(action_name) or ActionSpec()
+
 ws_registry = WebSocketRegistry()
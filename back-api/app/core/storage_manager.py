@@ -1,25 +1,176 @@
+"""
+Storage usage is kept per user directory in memory: known write paths report their
+delta, and writes we can't measure (kernel code, package installs) mark the usage
+stale. A background pass re-scans stale users, and every user periodically, to
+correct drift. Quota checks then only read the counter.
+
+Writes that land over time (uploads) reserve their size up front: quota checks
+count reservations as used, so concurrent writes can't overrun the quota together.
+"""
+
 import os
-from typing import Optional
+import time
+import asyncio
+import threading
+from typing import Dict, Optional
 from .config import STORAGE_DIR
 from .tier_manager import get_tier_config
 
-def get_user_storage_bytes(user_id: str) -> int:
-    user_dir = os.path.join(STORAGE_DIR, "users", str(user_id))
-    if not os.path.exists(user_dir):
-        return 0
+_usage_bytes: Dict[str, int] = {}
+_reconciled_at: Dict[str, float] = {}
+_stale = set()
+# Bumped on every known change of a user directory, so derived caches can tell they are outdated
+_usage_versions: Dict[str, int] = {}
+# user_dir -> reservation key -> bytes reserved and not written yet
+_reserved: Dict[str, Dict[str, int]] = {}
+_usage_lock = threading.Lock()
+
+def _bump_version(user_dir: str):
+    _usage_versions[user_dir] = _usage_versions.get(user_dir, 0) + 1
+
+def get_usage_version(user_dir: str) -> int:
+    with _usage_lock:
+        return _usage_versions.get(user_dir, 0)
+
+def get_user_dir(user_id: str) -> str:
+    return os.path.join(STORAGE_DIR, "users", str(user_id))
+
+def _scan_bytes(path: str) -> int:
     total_bytes = 0
-    for root, _, files in os.walk(user_dir):
-        for file_name in files:
-            file_path = os.path.join(root, file_name)
-            if not os.path.islink(file_path):
-                total_bytes += os.path.getsize(file_path)
+    stack = [path]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            total_bytes += entry.stat(follow_symlinks=False).st_size
+                    except OSError:
+                        continue
+        except (FileNotFoundError, NotADirectoryError, PermissionError):
+            continue
+    return total_bytes
+
+def get_path_bytes(path: str) -> int:
+    """Size of a file, or of everything under a directory (symlinks not followed)."""
+    try:
+        if os.path.isfile(path) and not os.path.islink(path):
+            return os.path.getsize(path)
+    except OSError:
+        return 0
+    return _scan_bytes(path)
+
+def reconcile_user_dir(user_dir: str) -> int:
+    """Full scan of a user directory, resetting its usage counter."""
+    total_bytes = _scan_bytes(user_dir) if os.path.exists(user_dir) else 0
+    with _usage_lock:
+        if _usage_bytes.get(user_dir) != total_bytes:
+            _bump_version(user_dir)
+        _usage_bytes[user_dir] = total_bytes
+        _reconciled_at[user_dir] = time.time()
+        _stale.discard(user_dir)
     return total_bytes
 
+def get_user_storage_bytes(user_id: str) -> int:
+    return reconcile_user_dir(get_user_dir(user_id))
+
+def get_cached_usage(user_dir: str) -> int:
+    with _usage_lock:
+        cached = _usage_bytes.get(user_dir)
+    if cached is None:
+        return reconcile_user_dir(user_dir)
+    return cached
+
+def record_usage_delta(user_dir: str, delta_bytes: int):
+    """Reported by write paths that know what they changed."""
+    with _usage_lock:
+        _bump_version(user_dir)
+        if user_dir in _usage_bytes:
+            _usage_bytes[user_dir] = max(0, _usage_bytes[user_dir] + delta_bytes)
+
+def mark_usage_stale(user_dir: str):
+    """For writes we can't measure: the next reconciliation pass re-scans the user."""
+    with _usage_lock:
+        _bump_version(user_dir)
+        if user_dir in _usage_bytes:
+            _stale.add(user_dir)
+
+def reconcile_usage(max_age_seconds: float, user_dirs: Optional[list] = None):
+    """Re-scans stale users and users not reconciled for 'max_age_seconds' (blocking: run it in a thread)."""
+    now = time.time()
+    with _usage_lock:
+        candidates = list(user_dirs) if user_dirs is not None else list(_usage_bytes)
+        due = [d for d in candidates if d in _stale or now - _reconciled_at.get(d, 0) > max_age_seconds]
+    for user_dir in due:
+        reconcile_user_dir(user_dir)
+    return len(due)
+
+def get_quota_bytes(tier: str = "default") -> Optional[int]:
+    max_disk_mb = get_tier_config(tier).get("max_disk_mb")
+    return max_disk_mb * 1024 * 1024 if max_disk_mb else None
+
+def _reserved_bytes(user_dir: str) -> int:
+    return sum(_reserved.get(user_dir, {}).values())
+
+def reserve_usage(user_dir: str, key: str, nbytes: int, limit_bytes: Optional[int] = None) -> bool:
+    """
+    Sets 'nbytes' aside under 'key' for a write to come, replacing a previous reservation
+    of 'key'. Returns False, reserving nothing, if that goes over 'limit_bytes'.
+    """
+    usage = get_cached_usage(user_dir)
+    with _usage_lock:
+        reservations = _reserved.setdefault(user_dir, {})
+        others = _reserved_bytes(user_dir) - reservations.get(key, 0)
+        if limit_bytes is not None and _usage_bytes.get(user_dir, usage) + others + nbytes > limit_bytes:
+            return False
+        reservations[key] = max(0, nbytes)
+        return True
+
+def use_reservation(user_dir: str, key: str, nbytes: int, limit_bytes: Optional[int] = None) -> bool:
+    """
+    Records 'nbytes' about to be written under the reservation 'key'. Bytes past the
+    reservation must fit under 'limit_bytes': returns False, recording nothing, if they don't.
+    """
+    usage = get_cached_usage(user_dir)
+    with _usage_lock:
+        reservations = _reserved.setdefault(user_dir, {})
+        own = reservations.get(key, 0)
+        extra = max(0, nbytes - own)
+        current = _usage_bytes.get(user_dir, usage)
+        if extra and limit_bytes is not None and current + _reserved_bytes(user_dir) + extra > limit_bytes:
+            return False
+        reservations[key] = own - min(own, nbytes)
+        _bump_version(user_dir)
+        if user_dir in _usage_bytes:
+            _usage_bytes[user_dir] = max(0, current + nbytes)
+        return True
+
+def release_usage(user_dir: str, key: str):
+    with _usage_lock:
+        reservations = _reserved.get(user_dir)
+        if reservations is not None:
+            reservations.pop(key, None)
+            if not reservations:
+                del _reserved[user_dir]
+
 def check_user_quota(user_id: str, incoming_bytes: int = 0, tier: str = "default") -> bool:
-    config = get_tier_config(tier)
-    max_disk_mb = config.get("max_disk_mb")
-    if not max_disk_mb:
+    allowed_bytes = get_quota_bytes(tier)
+    if allowed_bytes is None:
         return True
-    current_bytes = get_user_storage_bytes(user_id)
-    allowed_bytes = max_disk_mb * 1024 * 1024
-    return (current_bytes + incoming_bytes) <= allowed_bytes
+    user_dir = get_user_dir(user_id)
+    current_bytes = get_cached_usage(user_dir)
+    with _usage_lock:
+        reserved_bytes = _reserved_bytes(user_dir)
+    return (current_bytes + reserved_bytes + incoming_bytes) <= allowed_bytes
+
+async def check_user_quota_async(user_id: str, incoming_bytes: int = 0, tier: str = "default") -> bool:
+    """check_user_quota for the event loop: a cold usage counter is filled by a scan in a worker thread."""
+    user_dir = get_user_dir(user_id)
+    with _usage_lock:
+        cached = user_dir in _usage_bytes
+    if not cached and get_quota_bytes(tier) is not None:
+        await asyncio.to_thread(get_cached_usage, user_dir)
+    return check_user_quota(user_id, incoming_bytes, tier)
@@ -1,6 +1,8 @@
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from .config import core_config
 
+MEM_UNITS = {"b": 1, "k": 1024, "m": 1024 ** 2, "g": 1024 ** 3}
+
 def get_tier_config(user_tier: str) -> Dict[str, Any]:
     """
     Resolves the configuration limits for a given user tier.
@@ -34,3 +36,22 @@ def get_tier_config(user_tier: str) -> Dict[str, Any]:
             resolved_config[key] = value
             
     return resolved_config
+
+def parse_mem_limit(mem_limit) -> Optional[int]:
+    """
+    Converts a Docker style memory limit ('512m', '2g', 1048576) to bytes.
+    Returns None when no limit is set or the value can't be parsed.
+    """
+    if mem_limit is None or mem_limit == "":
+        return None
+    if isinstance(mem_limit, (int, float)):
+        return int(mem_limit)
+    value = str(mem_limit).strip().lower()
+    multiplier = 1
+    if value and value[-1] in MEM_UNITS:
+        multiplier = MEM_UNITS[value[-1]]
+        value = value[:-1]
+    try:
+        return int(float(value) * multiplier)
+    except ValueError:
+        return None
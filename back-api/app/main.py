@@ -7,7 +7,7 @@ from fastapi.responses import FileResponse
 from .services.user_manager import UserManager
 from .api.websocket import UserWebSocket
 from .core.config import STORAGE_DIR, FRONTEND_DIR
-from .core.database import engine, Base
+from .core.database import engine, Base, add_missing_columns
 from .auth.routes import router as auth_router
 import logging
 from loguru import logger
@@ -33,6 +33,8 @@ for _log in ['uvicorn', 'uvicorn.error', 'uvicorn.access', 'fastapi']:
     _logger.propagate = False
 
 from .services.trigger_manager import trigger_manager
+from .services.project_store import project_store
+from .services.file_watcher import file_watcher
 
 user_manager = UserManager()
 app = FastAPI()
@@ -42,12 +44,16 @@ app.include_router(auth_router)
 @app.on_event("startup")
 async def startup_event():
     Base.metadata.create_all(bind=engine)
+    add_missing_columns(engine)
     await user_manager.cleanup_orphans()
     await user_manager.start_cleanup_loop()
     await trigger_manager.initialize(user_manager)
 
 @app.on_event("shutdown")
 async def shutdown_event():
+    await project_store.flush_all()
+    await trigger_manager.stop()
+    await file_watcher.stop_all()
     await user_manager.stop_all_kernels()
 
 app.mount("/assets", StaticFiles(directory=os.path.join(FRONTEND_DIR, "assets")), name="assets")
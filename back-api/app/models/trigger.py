@@ -12,6 +12,9 @@ class Trigger(Base):
     node_type = Column(String(64), nullable=False, index=True)
     is_active = Column(Boolean, nullable=False, default=True)
     config_json = Column(Text, nullable=False, default="{}")
+    # UTC, kept by the scheduler so restarts resume the schedule instead of restarting it
+    next_fire_at = Column(DateTime, nullable=True)
+    last_fired_at = Column(DateTime, nullable=True)
     created_at = Column(DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
     updated_at = Column(DateTime, nullable=False, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
 
@@ -0,0 +1,538 @@
+"""
+Previews of tabular data files without a kernel: schema, first rows, a random sample
+and per-column stats for CSV/TSV, JSON lines, Parquet (when pyarrow is installed)
+and .npy/.npz arrays.
+
+Files are streamed, never loaded whole. Up to PREVIEW_SCAN_BYTES, text files are
+read in one pass: exact row count and stats, and a reservoir sample. Larger files
+are sampled at random byte offsets instead, and their stats and row count are
+estimated from the head and the sample. Arrays are memory-mapped, even inside
+uncompressed .npz archives. Parquet stats come from the row group metadata.
+Results are cached per path, size and mtime.
+"""
+
+import os
+import csv
+import io
+import json
+import math
+import random
+import zipfile
+import threading
+from collections import OrderedDict
+import numpy as np
+from ..core.config import PREVIEW_ROWS, PREVIEW_SAMPLE_ROWS, PREVIEW_SCAN_BYTES
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+CSV_EXTENSIONS = {".csv", ".tsv"}
+JSONL_EXTENSIONS = {".jsonl", ".ndjson"}
+PARQUET_EXTENSIONS = {".parquet"}
+ARRAY_EXTENSIONS = {".npy", ".npz"}
+
+MAX_DISTINCT = 1000
+MAX_COLUMNS = 200
+MAX_CELL_CHARS = 200
+MAX_CACHED_PREVIEWS = 32
+MAX_SAMPLED_RECORD_BYTES = 64 * 1024
+
+_cache: "OrderedDict[tuple, dict]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def supported(path: str) -> bool:
+    ext = os.path.splitext(path)[1].lower()
+    return ext in CSV_EXTENSIONS | JSONL_EXTENSIONS | ARRAY_EXTENSIONS or (ext in PARQUET_EXTENSIONS and pq is not None)
+
+
+def _clean(value):
+    """JSON-safe cell: numpy scalars unwrapped, NaN/inf as None, long strings cut."""
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    if isinstance(value, (bytes, bytearray)):
+        value = value.decode("utf-8", errors="replace")
+    if isinstance(value, str):
+        return value if len(value) <= MAX_CELL_CHARS else value[:MAX_CELL_CHARS] + "…"
+    if isinstance(value, (list, tuple, dict)):
+        return _clean(json.dumps(value, default=str))
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    return _clean(str(value))
+
+
+def _parse_cell(raw: str):
+    """Typed value of a CSV cell."""
+    if raw == "":
+        return None
+    try:
+        return int(raw)
+    except ValueError:
+        pass
+    try:
+        return float(raw)
+    except ValueError:
+        pass
+    lowered = raw.lower()
+    if lowered in ("true", "false"):
+        return lowered == "true"
+    return raw
+
+
+class _ColumnStats:
+    def __init__(self, name: str):
+        self.name = name
+        self.count = 0
+        self.nulls = 0
+        self.kinds = set()
+        self.numeric_count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.distinct = set()
+
+    def add(self, value):
+        if value is None or (isinstance(value, float) and math.isnan(value)):
+            self.nulls += 1
+            return
+        self.count += 1
+        if isinstance(value, bool):
+            self.kinds.add("boolean")
+        elif isinstance(value, (int, float)):
+            self.kinds.add("integer" if isinstance(value, int) else "float")
+            if math.isfinite(value):
+                self.numeric_count += 1
+                self.total += value
+                self.min = value if self.min is None else min(self.min, value)
+                self.max = value if self.max is None else max(self.max, value)
+        else:
+            self.kinds.add("string")
+            value = value if isinstance(value, str) else json.dumps(value, default=str)
+        if len(self.distinct) <= MAX_DISTINCT:
+            self.distinct.add(value)
+
+    def type(self) -> str:
+        if not self.kinds:
+            return "empty"
+        if self.kinds <= {"integer"}:
+            return "integer"
+        if self.kinds <= {"integer", "float"}:
+            return "float"
+        if self.kinds == {"boolean"}:
+            return "boolean"
+        return "string"
+
+    def result(self) -> dict:
+        stats = {
+            "count": self.count,
+            "nulls": self.nulls,
+            "distinct": len(self.distinct) if len(self.distinct) <= MAX_DISTINCT else f">{MAX_DISTINCT}"
+        }
+        if self.numeric_count:
+            stats.update(min=_clean(self.min), max=_clean(self.max), mean=_clean(self.total / self.numeric_count))
+        return {"name": self.name, "type": self.type(), "stats": stats}
+
+
+def _reservoir_add(reservoir: list, item, seen: int, size: int, rng: random.Random):
+    """Keeps a uniform sample of 'size' items; 'seen' counts the items before this one."""
+    if len(reservoir) < size:
+        reservoir.append(item)
+    else:
+        j = rng.randrange(seen + 1)
+        if j < size:
+            reservoir[j] = item
+
+
+class _Lines:
+    """
+    Lines of 'f' (text or binary) from its current position, counting the bytes read.
+    Stops, setting 'truncated', when asked for more once 'limit' bytes were read.
+    """
+    def __init__(self, f, limit: int = None):
+        self.f = f
+        self.limit = limit
+        self.bytes = 0
+        self.truncated = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        if self.limit is not None and self.bytes >= self.limit:
+            self.truncated = True
+            raise StopIteration
+        line = self.f.readline()
+        if not line:
+            raise StopIteration
+        if isinstance(line, bytes):
+            self.bytes += len(line)
+            return line.decode("utf-8", errors="replace")
+        self.bytes += len(line.encode("utf-8"))
+        return line
+
+
+def _non_blank_lines(lines):
+    return (line for line in lines if line.strip())
+
+
+def _records_at_random_offsets(path: str, start: int, count: int, rng: random.Random, read_records) -> list:
+    """
+    (record, bytes) of the second record after 'count' random offsets: a cheap sample of a huge text
+    file (biased towards long records). The first one is skipped, as the offset may have landed in a
+    record spanning lines (a quoted CSV field). A record still going on after MAX_SAMPLED_RECORD_BYTES
+    may be cut, it is dropped.
+    """
+    size = os.path.getsize(path)
+    records = []
+    if start >= size:
+        return records
+    with open(path, "rb") as f:
+        for offset in sorted(rng.randrange(start, size) for _ in range(count)):
+            f.seek(offset)
+            f.readline()
+            lines = _Lines(f, MAX_SAMPLED_RECORD_BYTES)
+            reader = iter(read_records(lines))
+            next(reader, None)
+            skipped_bytes = lines.bytes
+            record = next(reader, None)
+            if record is not None and not lines.truncated:
+                records.append((record, lines.bytes - skipped_bytes))
+    return records
+
+
+# --- Text formats ---
+
+def _preview_rows(path: str, read_records, parse_record, header: list, data_start: int,
+                  rows: int, sample_rows: int, rng) -> dict:
+    """
+    Shared by CSV and JSON lines: 'read_records' turns text lines into records (lines, or CSV
+    rows that may span lines), 'parse_record' turns one record into a list of typed values
+    (aligned with 'header', which it may extend) plus the list of raw cells shown.
+    """
+    size = os.path.getsize(path)
+    head, sample, columns = [], [], {}
+    exact = size <= PREVIEW_SCAN_BYTES
+
+    def add_stats(values):
+        for i, value in enumerate(values[:MAX_COLUMNS]):
+            if i >= len(header):
+                header.append(f"column_{i}")
+            if i not in columns:
+                columns[i] = _ColumnStats(header[i])
+            columns[i].add(value)
+
+    row_count = 0
+    with open(path, "r", encoding="utf-8", errors="replace", newline="") as f:
+        f.seek(data_start)
+        if exact:
+            for record in read_records(f):
+                try:
+                    values, cells = parse_record(record)
+                except ValueError:
+                    continue
+                add_stats(values)
+                if len(head) < rows:
+                    head.append(cells)
+                _reservoir_add(sample, cells, row_count, sample_rows, rng)
+                row_count += 1
+        else:
+            lines = _Lines(f)
+            for record in read_records(lines) if rows > 0 else ():
+                try:
+                    values, cells = parse_record(record)
+                except ValueError:
+                    continue
+                add_stats(values)
+                head.append(cells)
+                if len(head) >= rows:
+                    break
+            sampled_bytes = lines.bytes
+            for record, record_bytes in _records_at_random_offsets(path, data_start, sample_rows, rng, read_records):
+                try:
+                    values, cells = parse_record(record)
+                except ValueError:
+                    continue
+                sampled_bytes += record_bytes
+                add_stats(values)
+                sample.append(cells)
+            sampled = len(head) + len(sample)
+            row_count = round((size - data_start) / (sampled_bytes / sampled)) if sampled else 0
+
+    return {
+        "columns": [columns[i].result() if i in columns else {"name": name, "type": "empty", "stats": {}}
+                    for i, name in enumerate(header[:MAX_COLUMNS])],
+        "rows": head,
+        "sample": sample,
+        "row_count": row_count,
+        "row_count_exact": exact,
+        "stats_from": "all" if exact else "sample"
+    }
+
+
+def _preview_csv(path: str, rows: int, sample_rows: int, rng) -> dict:
+    with open(path, "r", encoding="utf-8", errors="replace", newline="") as f:
+        head_text = f.read(64 * 1024)
+        if path.lower().endswith(".tsv"):
+            dialect = csv.excel_tab
+        else:
+            try:
+                dialect = csv.Sniffer().sniff(head_text, delimiters=",;\t|")
+            except csv.Error:
+                dialect = csv.excel
+        # Read as a record: a quoted column name may hold a newline
+        f.seek(0)
+        header_lines = _Lines(f)
+        header = next(csv.reader(header_lines, dialect), [])
+
+    def read_records(lines):
+        # Quoted fields may span lines: csv.reader pulls as many as a row needs
+        return csv.reader(lines, dialect)
+
+    def parse_record(cells: list):
+        if not cells:
+            raise ValueError("Blank line")
+        return [_parse_cell(cell) for cell in cells], [_clean(cell) for cell in cells[:MAX_COLUMNS]]
+
+    result = _preview_rows(path, read_records, parse_record, header, header_lines.bytes, rows, sample_rows, rng)
+    result["format"] = "tsv" if dialect is csv.excel_tab or dialect.delimiter == "\t" else "csv"
+    result["delimiter"] = dialect.delimiter
+    return result
+
+
+def _preview_jsonl(path: str, rows: int, sample_rows: int, rng) -> dict:
+    header = []
+    positions = {}
+
+    def parse_line(line: str):
+        record = json.loads(line)
+        if not isinstance(record, dict):
+            record = {"value": record}
+        for key in record:
+            if key not in positions and len(positions) < MAX_COLUMNS:
+                positions[key] = len(header)
+                header.append(key)
+        values = [None] * len(header)
+        for key, value in record.items():
+            if key in positions:
+                values[positions[key]] = value
+        return values, [_clean(value) for value in values]
+
+    result = _preview_rows(path, _non_blank_lines, parse_line, header, 0, rows, sample_rows, rng)
+    # Rows parsed before a column appeared are shorter: pad them
+    for row in result["rows"] + result["sample"]:
+        row.extend([None] * (len(header) - len(row)))
+    result["format"] = "jsonl"
+    return result
+
+
+# --- Parquet ---
+
+def _preview_parquet(path: str, rows: int, sample_rows: int, rng) -> dict:
+    parquet_file = pq.ParquetFile(path)
+    metadata = parquet_file.metadata
+    schema = parquet_file.schema_arrow
+    names = schema.names[:MAX_COLUMNS]
+
+    head = []
+    if metadata.num_rows:
+        batch = next(parquet_file.iter_batches(batch_size=rows, columns=names))
+        head = [[_clean(row.get(name)) for name in names] for row in batch.to_pylist()]
+
+    # Sampled rows are read row group by row group, skipping the ones over the memory cap
+    wanted = sorted(rng.sample(range(metadata.num_rows), min(sample_rows, metadata.num_rows)))
+    sample, first_row = [], 0
+    for group in range(metadata.num_row_groups if wanted else 0):
+        group_meta = metadata.row_group(group)
+        last_row = first_row + group_meta.num_rows
+        local = [i - first_row for i in wanted if first_row <= i < last_row]
+        if local and group_meta.total_byte_size <= PREVIEW_SCAN_BYTES:
+            table = parquet_file.read_row_group(group, columns=names).take(local)
+            sample.extend([_clean(row.get(name)) for name in names] for row in table.to_pylist())
+        first_row = last_row
+
+    columns = []
+    for index, name in enumerate(names):
+        stats = {"count": 0, "nulls": 0}
+        minimum = maximum = None
+        for group in range(metadata.num_row_groups):
+            column_stats = metadata.row_group(group).column(index).statistics
+            if column_stats is None:
+                stats = None
+                break
+            stats["nulls"] += column_stats.null_count or 0
+            stats["count"] += metadata.row_group(group).num_rows - (column_stats.null_count or 0)
+            if column_stats.has_min_max:
+                minimum = column_stats.min if minimum is None else min(minimum, column_stats.min)
+                maximum = column_stats.max if maximum is None else max(maximum, column_stats.max)
+        if stats is not None and minimum is not None:
+            stats.update(min=_clean(minimum), max=_clean(maximum))
+        columns.append({"name": name, "type": str(schema.field(name).type), "stats": stats or {}})
+
+    return {
+        "format": "parquet",
+        "columns": columns,
+        "rows": head,
+        "sample": sample,
+        "row_count": metadata.num_rows,
+        "row_count_exact": True,
+        "stats_from": "metadata"
+    }
+
+
+# --- Arrays ---
+
+def _npz_member(path: str, info: zipfile.ZipInfo):
+    """Memory-maps an uncompressed .npy member of an .npz archive in place; None if compressed."""
+    if info.compress_type != zipfile.ZIP_STORED:
+        return None
+    with open(path, "rb") as f:
+        # Local file header: 30 fixed bytes, then the name and extra fields
+        f.seek(info.header_offset + 26)
+        name_length, extra_length = np.frombuffer(f.read(4), dtype="<u2")
+        f.seek(info.header_offset + 30 + int(name_length) + int(extra_length))
+        version = np.lib.format.read_magic(f)
+        read_header = np.lib.format.read_array_header_1_0 if version == (1, 0) else np.lib.format.read_array_header_2_0
+        shape, fortran_order, dtype = read_header(f)
+        offset = f.tell()
+    if dtype.hasobject:
+        return None
+    return np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=shape, order="F" if fortran_order else "C")
+
+
+def _column_names(ndim: int, width: int) -> list:
+    return [f"column_{i}" for i in range(width)] if ndim == 2 else ["value"] if ndim <= 1 else [f"[{i}]" for i in range(width)]
+
+
+def _preview_array(array, rows: int, sample_rows: int, rng) -> dict:
+    length = array.shape[0] if array.ndim else 1
+    if array.size == 0:
+        # reshape(length, -1) can't infer the width of an empty array: an empty table
+        width = min(int(np.prod(array.shape[1:])), MAX_COLUMNS)
+        return {
+            "format": "npy",
+            "shape": list(array.shape),
+            "dtype": str(array.dtype),
+            "columns": [{"name": name, "type": "empty", "stats": {}} for name in _column_names(array.ndim, width)],
+            "rows": [],
+            "sample": [],
+            "row_count": length,
+            "row_count_exact": True,
+            "stats_from": "all"
+        }
+    # order="A" keeps a view on memory-mapped arrays, C or Fortran ordered
+    table = array.reshape(length, -1, order="A") if array.ndim else array.reshape(1, 1)
+    width = min(table.shape[1], MAX_COLUMNS)
+    names = _column_names(array.ndim, width)
+
+    indices = sorted(rng.sample(range(length), min(sample_rows, length)))
+    head_rows = table[:rows, :width]
+    sample_table = table[indices, :width] if indices else table[:0, :width]
+
+    # Exact stats on arrays under the scan cap, read in chunks of rows; the sample otherwise
+    exact = array.nbytes <= PREVIEW_SCAN_BYTES
+    columns = [_ColumnStats(name) for name in names]
+    if np.issubdtype(array.dtype, np.number) or array.dtype == np.bool_:
+        source = table[:, :width] if exact else sample_table
+        chunk_rows = max(1, (16 * 1024 * 1024) // max(1, source[:1].nbytes))
+        for start in range(0, source.shape[0], chunk_rows):
+            chunk = np.asarray(source[start:start + chunk_rows])
+            for i, column in enumerate(columns):
+                values = chunk[:, i]
+                if array.dtype == np.bool_:
+                    column.kinds.add("boolean")
+                    column.count += values.size
+                    continue
+                finite = values[np.isfinite(values)] if np.issubdtype(array.dtype, np.floating) else values
+                column.kinds.add("integer" if np.issubdtype(array.dtype, np.integer) else "float")
+                column.nulls += values.size - finite.size
+                column.count += finite.size
+                if finite.size:
+                    column.numeric_count += finite.size
+                    column.total += float(finite.sum(dtype=np.float64))
+                    low, high = finite.min().item(), finite.max().item()
+                    column.min = low if column.min is None else min(column.min, low)
+                    column.max = high if column.max is None else max(column.max, high)
+        results = [column.result() for column in columns]
+        for result in results:
+            result["stats"].pop("distinct")
+    else:
+        exact = False
+        for row in sample_table:
+            for i, column in enumerate(columns):
+                column.add(_clean(row[i]))
+        results = [column.result() for column in columns]
+
+    return {
+        "format": "npy",
+        "shape": list(array.shape),
+        "dtype": str(array.dtype),
+        "columns": results,
+        "rows": [[_clean(value) for value in row] for row in head_rows],
+        "sample": [[_clean(value) for value in row] for row in sample_table],
+        "row_count": length,
+        "row_count_exact": True,
+        "stats_from": "all" if exact else "sample"
+    }
+
+
+def _preview_npz(path: str, rows: int, sample_rows: int, rng, array_name: str = None) -> dict:
+    with zipfile.ZipFile(path) as archive:
+        members = [info for info in archive.infolist() if info.filename.endswith(".npy")]
+        arrays = []
+        for info in members:
+            arrays.append({"name": info.filename[:-4], "compressed": info.compress_type != zipfile.ZIP_STORED, "size": info.file_size})
+        if not members:
+            return {"format": "npz", "arrays": arrays}
+        selected = next((info for info in members if info.filename[:-4] == array_name), members[0])
+
+        array = _npz_member(path, selected)
+        if array is None:
+            if selected.file_size > PREVIEW_SCAN_BYTES:
+                raise ValueError(f"Array '{selected.filename[:-4]}' is compressed and too large to preview")
+            with archive.open(selected) as f:
+                array = np.lib.format.read_array(io.BytesIO(f.read()), allow_pickle=False)
+
+    result = _preview_array(array, rows, sample_rows, rng)
+    result.update(format="npz", arrays=arrays, array=selected.filename[:-4])
+    return result
+
+
+def _build_preview(path: str, rows: int, sample_rows: int, array_name: str = None) -> dict:
+    ext = os.path.splitext(path)[1].lower()
+    rng = random.Random()
+    if ext in CSV_EXTENSIONS:
+        return _preview_csv(path, rows, sample_rows, rng)
+    if ext in JSONL_EXTENSIONS:
+        return _preview_jsonl(path, rows, sample_rows, rng)
+    if ext in PARQUET_EXTENSIONS:
+        if pq is None:
+            raise ValueError("Parquet previews need pyarrow installed on the server")
+        return _preview_parquet(path, rows, sample_rows, rng)
+    if ext == ".npy":
+        return _preview_array(np.load(path, mmap_mode="r", allow_pickle=False), rows, sample_rows, rng)
+    if ext == ".npz":
+        return _preview_npz(path, rows, sample_rows, rng, array_name)
+    raise ValueError(f"No preview for '{ext}' files")
+
+
+def preview(path: str, rows: int = PREVIEW_ROWS, sample_rows: int = PREVIEW_SAMPLE_ROWS, array_name: str = None) -> dict:
+    """Preview of a data file (blocking: run it in a thread). Cached until the file changes."""
+    stat = os.stat(path)
+    key = (path, rows, sample_rows, array_name)
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached and cached["size"] == stat.st_size and cached["mtime_ns"] == stat.st_mtime_ns:
+            _cache.move_to_end(key)
+            return dict(cached["result"], cached=True)
+
+    result = _build_preview(path, rows, sample_rows, array_name)
+    result["size"] = stat.st_size
+    with _cache_lock:
+        _cache[key] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "result": result}
+        while len(_cache) > MAX_CACHED_PREVIEWS:
+            _cache.popitem(last=False)
+    return dict(result, cached=False)
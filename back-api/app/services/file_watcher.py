@@ -0,0 +1,266 @@
+"""
+Watches the files directory of each logged-in session, so writes made by node code
+reach the file explorer as fs_changed deltas without any refresh.
+
+Change notifications come from watchfiles (inotify on Linux) when it is installed,
+otherwise from a scandir poller. Either way a snapshot of every entry
+(type, size, mtime) is kept per directory: the changed parts are re-scanned and
+diffed against it, which gives the tree deltas and the exact usage delta. While a
+directory is watched, the watcher is what accounts for its storage usage.
+
+Explorer operations send their own fs_changed right away and note it here: the
+watcher then drops the same change when it sees it, instead of sending it again.
+"""
+
+import os
+import time
+import asyncio
+from typing import Awaitable, Callable, Dict, Optional
+from loguru import logger
+from .filesystem import record_changes, tree_entry
+from ..core.config import FS_WATCH_BACKEND, FS_WATCH_DEBOUNCE_MS, FS_WATCH_POLL_SECONDS
+from ..core.metrics import metrics
+from ..core.storage_manager import record_usage_delta
+
+try:
+    import watchfiles
+except ImportError:
+    watchfiles = None
+
+# How long a change reported by a handler waits for the watcher to see it
+REPORTED_TTL_SECONDS = 10.0
+
+
+def _scan(files_dir: str, rel_root: str = "") -> Dict[str, tuple]:
+    """rel_path -> (is_dir, size, mtime_ns) for 'rel_root' (if not the root) and everything under it."""
+    snapshot = {}
+    root = os.path.join(files_dir, rel_root) if rel_root else files_dir
+    if rel_root:
+        try:
+            stat = os.stat(root)
+        except OSError:
+            return snapshot
+        is_dir = os.path.isdir(root)
+        snapshot[rel_root] = (is_dir, 0 if is_dir else stat.st_size, stat.st_mtime_ns)
+        if not is_dir:
+            return snapshot
+
+    stack = [root]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                for entry in it:
+                    try:
+                        is_dir = entry.is_dir()
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    rel_path = os.path.relpath(entry.path, files_dir)
+                    snapshot[rel_path] = (is_dir, 0 if is_dir else stat.st_size, stat.st_mtime_ns)
+                    if is_dir:
+                        stack.append(entry.path)
+        except (FileNotFoundError, NotADirectoryError, PermissionError):
+            continue
+    return snapshot
+
+
+def _diff(files_dir: str, before: dict, after: dict):
+    """Tree changes between two snapshots, reported at the top-most added/removed paths, and the byte delta."""
+    changes = []
+    delta_bytes = 0
+
+    removed = {path for path in before if path not in after}
+    for path in sorted(removed):
+        delta_bytes -= before[path][1]
+        if os.path.dirname(path) not in removed:
+            changes.append({"type": "removed", "path": path})
+
+    added = {path for path in after if path not in before}
+    for path in sorted(added):
+        delta_bytes += after[path][1]
+        if os.path.dirname(path) not in added:
+            changes.append({"type": "added", "entry": tree_entry(os.path.join(files_dir, path), files_dir, after[path][0])})
+
+    for path, (is_dir, size, mtime_ns) in after.items():
+        previous = before.get(path)
+        if previous is None or is_dir or previous[0]:
+            continue
+        if previous[1] != size or previous[2] != mtime_ns:
+            delta_bytes += size - previous[1]
+            changes.append({"type": "resized", "path": path, "size": size})
+    return changes, delta_bytes
+
+
+def _change_key(change: dict) -> tuple:
+    if change["type"] == "added":
+        return ("added", change["entry"]["path"])
+    if change["type"] == "resized":
+        return ("resized", change["path"], change["size"])
+    return (change["type"], change["path"])
+
+
+def _reported_keys(change: dict) -> list:
+    """Keys of the watcher changes a handler's change stands for."""
+    if change["type"] == "renamed":
+        # The watcher has no renames: it sees the old path removed and the new one added
+        return [("removed", change["old_path"]), ("added", change["new_path"])]
+    return [_change_key(change)]
+
+
+def _top_level(paths: set) -> list:
+    """Drops the paths that are under another one of 'paths'."""
+    roots = []
+    for path in sorted(paths):
+        if roots and (path == roots[-1] or path.startswith(roots[-1] + os.sep)):
+            continue
+        roots.append(path)
+    return roots
+
+
+class _Watch:
+    def __init__(self, files_dir: str, user_dir: str, owner: str, push: Callable[[dict], Awaitable]):
+        self.files_dir = files_dir
+        # Notifications come with resolved paths
+        self.root = os.path.realpath(files_dir)
+        self.user_dir = user_dir
+        self.owner = owner
+        self.push = push
+        self.snapshot: Dict[str, tuple] = {}
+        # Change key -> expiry of the changes handlers already sent
+        self.reported: Dict[tuple, float] = {}
+        self.stop_event = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+
+class FileWatcher:
+    def __init__(self, backend: str = FS_WATCH_BACKEND, debounce_ms: int = FS_WATCH_DEBOUNCE_MS,
+                 poll_seconds: float = FS_WATCH_POLL_SECONDS):
+        self.use_notify = watchfiles is not None and backend != "poll"
+        self.debounce_ms = debounce_ms
+        self.poll_seconds = poll_seconds
+        self.watches: Dict[str, _Watch] = {}
+
+    def is_watching(self, files_dir: str) -> bool:
+        return files_dir in self.watches
+
+    def watch(self, files_dir: str, user_dir: str, owner: str, push: Callable[[dict], Awaitable]):
+        """
+        Starts watching 'files_dir' for the session 'owner'; events go through 'push'.
+        A new session of the same user takes the running watch over.
+        """
+        watch = self.watches.get(files_dir)
+        if watch is not None:
+            watch.owner = owner
+            watch.push = push
+            return
+        os.makedirs(files_dir, exist_ok=True)
+        watch = _Watch(files_dir, user_dir, owner, push)
+        self.watches[files_dir] = watch
+        watch.task = asyncio.create_task(self._run(watch))
+
+    def note_reported(self, files_dir: str, changes: list):
+        """Changes a handler already sent to the client: the watcher won't send them again."""
+        watch = self.watches.get(files_dir)
+        if watch is None:
+            return
+        expires_at = time.monotonic() + REPORTED_TTL_SECONDS
+        for change in changes:
+            for key in _reported_keys(change):
+                watch.reported[key] = expires_at
+
+    async def unwatch(self, files_dir: str):
+        watch = self.watches.pop(files_dir, None)
+        if watch is None:
+            return
+        watch.stop_event.set()
+        if watch.task:
+            watch.task.cancel()
+            try:
+                await watch.task
+            except asyncio.CancelledError:
+                pass
+
+    async def prune(self, live_owners: set):
+        """Stops the watches whose session is gone."""
+        for files_dir, watch in list(self.watches.items()):
+            if watch.owner not in live_owners:
+                await self.unwatch(files_dir)
+
+    async def stop_all(self):
+        for files_dir in list(self.watches):
+            await self.unwatch(files_dir)
+
+    async def _run(self, watch: _Watch):
+        watch.snapshot = await asyncio.to_thread(_scan, watch.root)
+        if self.use_notify:
+            try:
+                await self._notify_loop(watch)
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"File notifications failed for {watch.files_dir}, polling instead: {e}")
+        await self._poll_loop(watch)
+
+    async def _notify_loop(self, watch: _Watch):
+        async for batch in watchfiles.awatch(watch.root, debounce=self.debounce_ms, stop_event=watch.stop_event):
+            changed = set()
+            for _, path in batch:
+                rel_path = os.path.relpath(path, watch.root)
+                if rel_path == "." or rel_path.startswith(".." + os.sep):
+                    continue
+                # Re-scan from the top-most directory we don't know yet
+                while os.path.dirname(rel_path) and os.path.dirname(rel_path) not in watch.snapshot:
+                    rel_path = os.path.dirname(rel_path)
+                changed.add(rel_path)
+            if changed:
+                await self._rescan(watch, _top_level(changed))
+
+    async def _poll_loop(self, watch: _Watch):
+        while not watch.stop_event.is_set():
+            try:
+                await asyncio.wait_for(watch.stop_event.wait(), timeout=self.poll_seconds)
+                return
+            except asyncio.TimeoutError:
+                pass
+            try:
+                after = await asyncio.to_thread(_scan, watch.root)
+                await self._apply(watch, watch.snapshot, after, after)
+            except Exception as e:
+                logger.error(f"Failed to poll {watch.files_dir}: {e}")
+
+    async def _rescan(self, watch: _Watch, roots: list):
+        def scan_roots():
+            before, after = {}, {}
+            for root in roots:
+                prefix = root + os.sep
+                before.update((p, v) for p, v in watch.snapshot.items() if p == root or p.startswith(prefix))
+                after.update(_scan(watch.root, root))
+            return before, after
+
+        before, after = await asyncio.to_thread(scan_roots)
+        snapshot = {p: v for p, v in watch.snapshot.items() if p not in before}
+        snapshot.update(after)
+        await self._apply(watch, before, after, snapshot)
+
+    async def _apply(self, watch: _Watch, before: dict, after: dict, snapshot: dict):
+        changes, delta_bytes = await asyncio.to_thread(_diff, watch.root, before, after)
+        watch.snapshot = snapshot
+        if not changes:
+            return
+        metrics.increment("fs_watch.events")
+        record_usage_delta(watch.user_dir, delta_bytes)
+        if watch.reported:
+            now = time.monotonic()
+            watch.reported = {key: expires_at for key, expires_at in watch.reported.items() if expires_at > now}
+            changes = [change for change in changes if watch.reported.pop(_change_key(change), None) is None]
+            if not changes:
+                return
+        try:
+            await watch.push(record_changes(watch.files_dir, changes))
+        except Exception as e:
+            logger.warning(f"Failed to push file changes for {watch.files_dir}: {e}")
+
+
+file_watcher = FileWatcher()
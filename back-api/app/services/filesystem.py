@@ -1,8 +1,15 @@
 import os
 import json
+import time
 import base64
+import shutil
 import asyncio
 from pathlib import Path
+from typing import Awaitable, Callable, Dict, Optional
+from ..core.storage_manager import get_path_bytes
+from .transfers import transfer_manager, TransferError
+from . import text_reader
+from . import file_preview
 
 
 BINARY_EXTENSIONS = {
@@ -16,6 +23,19 @@ BINARY_EXTENSIONS = {
 
 MAX_TEXT_SIZE = 1024 * 512  # 512 KB max for text file reads
 MAX_BINARY_SIZE = 1024 * 1024 * 5  # 5 MB max for binary file reads
+DEFAULT_RANGE_LINES = 200  # fs_read_range lines per reply
+MAX_RANGE_LINES = 5000
+MAX_PREVIEW_ROWS = 1000  # fs_preview head and sample rows
+
+DEFAULT_PAGE_SIZE = 200  # fs_list entries per directory page
+MAX_PAGE_SIZE = 1000
+MAX_LIST_DEPTH = 3
+
+MAX_BATCH_OPERATIONS = 10000  # fs_batch operations per request
+BATCH_SLICE_SECONDS = 0.25  # fs_batch work between two progress events
+
+# files_dir -> version, bumped by every fs_changed event
+_tree_versions: Dict[str, int] = {}
 
 
 def _is_binary(file_path: str) -> bool:
@@ -32,52 +52,140 @@ def _safe_resolve(base_dir: str, relative_path: str) -> str:
     return str(target)
 
 
-def _build_tree(current_dir: str, root_dir: str) -> list:
-    """Build a recursive file tree structure. Paths are always relative to root_dir."""
-    entries = []
+def tree_entry(full_path: str, root_dir: str, is_dir: bool) -> dict:
+    """One tree entry; directories come without children until they are listed."""
+    name = os.path.basename(full_path)
+    rel_path = os.path.relpath(full_path, root_dir)
+    if is_dir:
+        return {"name": name, "path": rel_path, "type": "directory"}
     try:
-        items = sorted(os.listdir(current_dir), key=lambda x: (not os.path.isdir(os.path.join(current_dir, x)), x.lower()))
-    except PermissionError:
-        return entries
-
-    for item in items:
-        full_path = os.path.join(current_dir, item)
-        rel_path = os.path.relpath(full_path, root_dir)
-
-        if os.path.isdir(full_path):
-            entries.append({
-                "name": item,
-                "path": rel_path,
-                "type": "directory",
-                "children": _build_tree(full_path, root_dir)
-            })
-        else:
-            try:
-                size = os.path.getsize(full_path)
-            except OSError:
-                size = 0
-            entries.append({
-                "name": item,
-                "path": rel_path,
-                "type": "file",
-                "size": size,
-                "binary": _is_binary(full_path)
-            })
-
-    return entries
-
-
-async def fs_list(files_dir: str) -> dict:
-    """List the complete file tree under the user's files directory."""
-    os.makedirs(files_dir, exist_ok=True)
-    tree = await asyncio.to_thread(_build_tree, files_dir, files_dir)
+        size = os.path.getsize(full_path)
+    except OSError:
+        size = 0
     return {
-        "action": "fs_list",
-        "status": "success",
-        "tree": tree
+        "name": name,
+        "path": rel_path,
+        "type": "file",
+        "size": size,
+        "binary": _is_binary(full_path)
     }
 
 
+def _list_dir(current_dir: str, root_dir: str, depth: int, offset: int, limit: int):
+    """
+    One page of a directory (directories first, then by name). Only the entries of
+    the page are stat'ed; sub-directories are expanded while 'depth' > 1, each with
+    their own first page. Returns (entries, total entries in the directory).
+    """
+    try:
+        with os.scandir(current_dir) as it:
+            items = []
+            for item in it:
+                try:
+                    is_dir = item.is_dir()
+                except OSError:
+                    is_dir = False
+                items.append((not is_dir, item.name.lower(), item.path, is_dir))
+    except (FileNotFoundError, NotADirectoryError, PermissionError):
+        return [], 0
+
+    items.sort()
+    entries = []
+    for _, _, full_path, is_dir in items[offset:offset + limit]:
+        entry = tree_entry(full_path, root_dir, is_dir)
+        if is_dir and depth > 1:
+            entry["children"], entry["total"] = _list_dir(full_path, root_dir, depth - 1, 0, limit)
+        entries.append(entry)
+    return entries, len(items)
+
+
+def get_tree_version(files_dir: str) -> int:
+    return _tree_versions.get(files_dir, 0)
+
+
+def record_changes(files_dir: str, changes: list) -> dict:
+    """
+    Bumps the tree version and returns the fs_changed event describing 'changes'.
+    Clients that see a version jump missed an event and must list again.
+    """
+    version = _tree_versions.get(files_dir, 0) + 1
+    _tree_versions[files_dir] = version
+    return {"action": "fs_changed", "version": version, "changes": changes}
+
+
+def normalize_path(files_dir: str, relative_path: str) -> str:
+    """Normalized form of a user path, as it appears in listings ('' for the root)."""
+    rel_path = os.path.relpath(_safe_resolve(files_dir, relative_path), Path(files_dir).resolve())
+    return "" if rel_path == "." else rel_path
+
+
+async def fs_entry(files_dir: str, relative_path: str) -> Optional[dict]:
+    """The tree entry of a path, or None if it doesn't exist."""
+    try:
+        target = _safe_resolve(files_dir, relative_path)
+    except PermissionError:
+        return None
+    if not os.path.lexists(target):
+        return None
+    return await asyncio.to_thread(tree_entry, target, str(Path(files_dir).resolve()), os.path.isdir(target))
+
+
+def first_missing(files_dir: str, relative_path: str) -> Optional[str]:
+    """
+    Top-most component of 'relative_path' that doesn't exist yet, i.e. what shows up
+    in the tree once the path is created. None if the path already exists.
+    """
+    try:
+        target = Path(_safe_resolve(files_dir, relative_path))
+    except PermissionError:
+        return None
+    if os.path.lexists(target):
+        return None
+    base = Path(files_dir).resolve()
+    missing = target
+    while missing.parent != base and not os.path.lexists(missing.parent):
+        missing = missing.parent
+    return os.path.relpath(missing, base)
+
+
+async def path_bytes(files_dir: str, relative_path: str) -> int:
+    """Disk usage of a file or directory of the user's files (0 if it doesn't exist)."""
+    try:
+        target = _safe_resolve(files_dir, relative_path)
+    except PermissionError:
+        return 0
+    return await asyncio.to_thread(get_path_bytes, target)
+
+
+async def fs_list(files_dir: str, relative_path: str = "", depth: int = 1,
+                  offset: int = 0, limit: int = DEFAULT_PAGE_SIZE) -> dict:
+    """List one page of a directory of the user's files, expanded 'depth' levels down."""
+    try:
+        os.makedirs(files_dir, exist_ok=True)
+        target = _safe_resolve(files_dir, relative_path)
+        if not os.path.isdir(target):
+            return {"action": "fs_list", "status": "error", "path": relative_path, "error": "Not a directory"}
+
+        depth = max(1, min(int(depth), MAX_LIST_DEPTH))
+        offset = max(0, int(offset))
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        entries, total = await asyncio.to_thread(_list_dir, target, str(Path(files_dir).resolve()), depth, offset, limit)
+        return {
+            "action": "fs_list",
+            "status": "success",
+            "path": normalize_path(files_dir, relative_path),
+            "entries": entries,
+            "offset": offset,
+            "total": total,
+            "version": get_tree_version(files_dir)
+        }
+
+    except PermissionError as e:
+        return {"action": "fs_list", "status": "error", "path": relative_path, "error": str(e)}
+    except Exception as e:
+        return {"action": "fs_list", "status": "error", "path": relative_path, "error": str(e)}
+
+
 async def fs_read(files_dir: str, relative_path: str) -> dict:
     """Read a file's content. Returns text or base64 for binary files."""
     try:
@@ -111,7 +219,7 @@ async def fs_read(files_dir: str, relative_path: str) -> dict:
             }
         else:
             if file_size > MAX_TEXT_SIZE:
-                return {"action": "fs_read", "status": "error", "error": f"File too large ({file_size} bytes)"}
+                return {"action": "fs_read", "status": "error", "error": f"File too large ({file_size} bytes), read it with fs_read_range"}
 
             def read_text():
                 with open(target, "r", encoding="utf-8", errors="replace") as f:
@@ -133,6 +241,55 @@ async def fs_read(files_dir: str, relative_path: str) -> dict:
         return {"action": "fs_read", "status": "error", "error": str(e)}
 
 
+async def fs_read_range(files_dir: str, relative_path: str, mode: str = "lines", offset: int = 0,
+                        length: int = MAX_TEXT_SIZE, start_line: int = 0, count: int = DEFAULT_RANGE_LINES) -> dict:
+    """
+    Read part of a text file of any size: a byte range ('bytes'), a line range ('lines')
+    or the last lines ('tail'). A reply never holds more than MAX_TEXT_SIZE bytes.
+    """
+    try:
+        target = _safe_resolve(files_dir, relative_path)
+        if not os.path.isfile(target):
+            return {"action": "fs_read_range", "status": "error", "path": relative_path, "error": "Not a file"}
+
+        length = max(0, min(int(length), MAX_TEXT_SIZE))
+        count = max(0, min(int(count), MAX_RANGE_LINES))
+        if mode == "bytes":
+            result = await asyncio.to_thread(text_reader.read_bytes, target, int(offset), length)
+        elif mode == "lines":
+            result = await asyncio.to_thread(text_reader.read_lines, target, int(start_line), count, MAX_TEXT_SIZE)
+        elif mode == "tail":
+            result = await asyncio.to_thread(text_reader.read_tail, target, count, MAX_TEXT_SIZE)
+        else:
+            return {"action": "fs_read_range", "status": "error", "path": relative_path, "error": f"Unknown mode: {mode}"}
+        return {"action": "fs_read_range", "status": "success", "path": relative_path, "mode": mode, **result}
+
+    except PermissionError as e:
+        return {"action": "fs_read_range", "status": "error", "path": relative_path, "error": str(e)}
+    except Exception as e:
+        return {"action": "fs_read_range", "status": "error", "path": relative_path, "error": str(e)}
+
+
+async def fs_preview(files_dir: str, relative_path: str, rows: int = None, sample_rows: int = None, array: str = None) -> dict:
+    """Schema, first rows, a random sample and column stats of a data file, without a kernel."""
+    try:
+        target = _safe_resolve(files_dir, relative_path)
+        if not os.path.isfile(target):
+            return {"action": "fs_preview", "status": "error", "path": relative_path, "error": "Not a file"}
+        if not file_preview.supported(target):
+            return {"action": "fs_preview", "status": "error", "path": relative_path, "error": "No preview for this file type"}
+
+        rows = max(0, min(int(rows if rows is not None else file_preview.PREVIEW_ROWS), MAX_PREVIEW_ROWS))
+        sample_rows = max(0, min(int(sample_rows if sample_rows is not None else file_preview.PREVIEW_SAMPLE_ROWS), MAX_PREVIEW_ROWS))
+        result = await asyncio.to_thread(file_preview.preview, target, rows, sample_rows, array)
+        return {"action": "fs_preview", "status": "success", "path": relative_path, **result}
+
+    except PermissionError as e:
+        return {"action": "fs_preview", "status": "error", "path": relative_path, "error": str(e)}
+    except Exception as e:
+        return {"action": "fs_preview", "status": "error", "path": relative_path, "error": str(e)}
+
+
 async def fs_write(files_dir: str, relative_path: str, content: str, encoding: str = "utf-8") -> dict:
     """Write content to a file. Supports text (utf-8) and binary (base64)."""
     try:
@@ -168,7 +325,6 @@ async def fs_delete(files_dir: str, relative_path: str) -> dict:
         if not os.path.exists(target):
             return {"action": "fs_delete", "status": "error", "error": "Path not found"}
 
-        import shutil
         if os.path.isdir(target):
             await asyncio.to_thread(shutil.rmtree, target)
         else:
@@ -213,3 +369,245 @@ async def fs_rename(files_dir: str, old_path: str, new_path: str) -> dict:
         return {"action": "fs_rename", "status": "error", "error": str(e)}
     except Exception as e:
         return {"action": "fs_rename", "status": "error", "error": str(e)}
+
+
+def _top_level(paths) -> list:
+    """Drops the paths that are under another one of 'paths'."""
+    roots = []
+    for path in sorted(paths):
+        if roots and (path == roots[-1] or path.startswith(roots[-1] + os.sep)):
+            continue
+        roots.append(path)
+    return roots
+
+
+class _Batch:
+    """
+    Runs the operations of an fs_batch, recording what they change: the paths they
+    removed, the top-most paths they created and the usage delta. The tree delta is
+    only computed once everything ran, from what exists at that point.
+    """
+    def __init__(self, files_dir: str, operations: list):
+        self.files_dir = files_dir
+        self.root = str(Path(files_dir).resolve())
+        self.operations = operations
+        self.results = []
+        self.removed = set()
+        self.touched = set()
+        self.delta_bytes = 0
+
+    @property
+    def done(self) -> bool:
+        return len(self.results) >= len(self.operations)
+
+    def run(self, budget_seconds: float):
+        """Runs operations until they are all done or 'budget_seconds' elapsed, at least one (blocking)."""
+        deadline = time.monotonic() + budget_seconds
+        while not self.done:
+            index = len(self.results)
+            operation = self.operations[index]
+            try:
+                self._run_one(operation)
+                self.results.append({"index": index, "status": "success"})
+            except Exception as e:
+                self.results.append({"index": index, "status": "error", "error": str(e)})
+            if time.monotonic() >= deadline:
+                break
+
+    def _source(self, operation: dict) -> str:
+        target = _safe_resolve(self.files_dir, operation["path"])
+        if target == self.root:
+            raise PermissionError("Can't change the root directory")
+        if not os.path.lexists(target):
+            raise FileNotFoundError(f"Path not found: {operation['path']}")
+        return target
+
+    def _destination(self, operation: dict, source: str) -> str:
+        if "dest" not in operation:
+            raise ValueError("missing dest")
+        dest = _safe_resolve(self.files_dir, operation["dest"])
+        if dest == source or dest.startswith(source + os.sep):
+            raise ValueError("Can't move or copy a path into itself")
+        return dest
+
+    def _rel(self, target: str) -> str:
+        return os.path.relpath(target, self.root)
+
+    def _run_one(self, operation: dict):
+        op = operation.get("op") if isinstance(operation, dict) else None
+        if op not in ("delete", "move", "copy", "mkdir"):
+            raise ValueError(f"Unknown operation: {op}")
+        if "path" not in operation:
+            raise ValueError("missing path")
+
+        if op == "mkdir":
+            created = first_missing(self.files_dir, operation["path"])
+            os.makedirs(_safe_resolve(self.files_dir, operation["path"]), exist_ok=True)
+            if created:
+                self.touched.add(created)
+            return
+
+        source = self._source(operation)
+        if op == "delete":
+            freed_bytes = get_path_bytes(source)
+            if os.path.isdir(source) and not os.path.islink(source):
+                shutil.rmtree(source)
+            else:
+                os.remove(source)
+            self.delta_bytes -= freed_bytes
+            self.removed.add(self._rel(source))
+            return
+
+        dest = self._destination(operation, source)
+        created = first_missing(self.files_dir, operation["dest"])
+        if op == "move":
+            replaced_bytes = get_path_bytes(dest) if os.path.lexists(dest) else 0
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            os.rename(source, dest)
+            self.delta_bytes -= replaced_bytes
+            self.removed.add(self._rel(source))
+        else:
+            if os.path.lexists(dest):
+                raise FileExistsError(f"Destination exists: {operation['dest']}")
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            if os.path.isdir(source) and not os.path.islink(source):
+                shutil.copytree(source, dest, symlinks=True)
+            else:
+                shutil.copy2(source, dest, follow_symlinks=False)
+            self.delta_bytes += get_path_bytes(dest)
+        self.touched.add(created or self._rel(dest))
+
+    def changes(self) -> list:
+        """One change per top-most affected path: 'added' if it exists now, 'removed' otherwise."""
+        changes = []
+        for path in _top_level(self.removed | self.touched):
+            full_path = os.path.join(self.root, path)
+            if os.path.lexists(full_path):
+                changes.append({"type": "added", "entry": tree_entry(full_path, self.root, os.path.isdir(full_path))})
+            else:
+                changes.append({"type": "removed", "path": path})
+        return changes
+
+
+def _copied_bytes(files_dir: str, operations: list) -> int:
+    total = 0
+    for operation in operations:
+        if isinstance(operation, dict) and operation.get("op") == "copy" and "path" in operation:
+            try:
+                total += get_path_bytes(_safe_resolve(files_dir, operation["path"]))
+            except PermissionError:
+                continue
+    return total
+
+
+async def batch_incoming_bytes(files_dir: str, operations: list) -> int:
+    """Bytes an fs_batch adds to the user's files (its copies), to check the quota once up front."""
+    if not isinstance(operations, list):
+        return 0
+    return await asyncio.to_thread(_copied_bytes, files_dir, operations)
+
+
+async def fs_batch(files_dir: str, operations: list, batch_id=None,
+                   on_progress: Optional[Callable[[dict], Awaitable]] = None):
+    """
+    Run delete/move/copy/mkdir operations on many paths, in order, in a worker thread.
+    A failed operation doesn't stop the others: each gets its own result.
+    'on_progress' gets an fs_batch_progress event every BATCH_SLICE_SECONDS of work.
+    Returns (reply, tree changes, usage delta in bytes).
+    """
+    if not isinstance(operations, list):
+        return {"action": "fs_batch", "status": "error", "batch_id": batch_id, "error": "operations must be a list"}, [], 0
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        return {"action": "fs_batch", "status": "error", "batch_id": batch_id,
+                "error": f"Too many operations (max {MAX_BATCH_OPERATIONS})"}, [], 0
+
+    os.makedirs(files_dir, exist_ok=True)
+    batch = _Batch(files_dir, operations)
+    while True:
+        await asyncio.to_thread(batch.run, BATCH_SLICE_SECONDS)
+        if batch.done:
+            break
+        if on_progress is not None:
+            await on_progress({"action": "fs_batch_progress", "batch_id": batch_id,
+                               "done": len(batch.results), "total": len(operations)})
+
+    changes = await asyncio.to_thread(batch.changes)
+    failed = sum(1 for result in batch.results if result["status"] == "error")
+    reply = {
+        "action": "fs_batch",
+        "status": "success",
+        "batch_id": batch_id,
+        "results": batch.results,
+        "succeeded": len(batch.results) - failed,
+        "failed": failed
+    }
+    return reply, changes, batch.delta_bytes
+
+def _transfer_error(action: str, e: Exception, transfer_id=None) -> dict:
+    result = {"action": action, "status": "error", "transfer_id": transfer_id, "error": str(e)}
+    if isinstance(e, TransferError) and e.offset is not None:
+        result["offset"] = e.offset
+    return result
+
+
+async def fs_upload_start(files_dir: str, user_dir: str, relative_path: str, size: int, transfer_id: str = None,
+                          reserve_bytes: int = None, limit_bytes: int = None) -> dict:
+    """
+    Start a chunked upload to a path of the user's files, or get the offset to resume it from.
+    A new upload reserves 'reserve_bytes' of the quota 'limit_bytes' for itself.
+    """
+    try:
+        _safe_resolve(files_dir, relative_path)
+        if not isinstance(size, int) or size < 0:
+            raise TransferError("Invalid size")
+        transfer = await transfer_manager.start_upload(user_dir, relative_path, size, transfer_id, reserve_bytes, limit_bytes)
+        return {"action": "fs_upload_start", "status": "success", "path": relative_path, "size": size, **transfer}
+    except Exception as e:
+        return dict(_transfer_error("fs_upload_start", e, transfer_id), path=relative_path)
+
+
+async def fs_upload_chunk(user_dir: str, transfer_id: str, offset: int, data: str, checksum: str, limit_bytes: int = None) -> dict:
+    """Append one base64 chunk, checked against its sha256 and the quota 'limit_bytes', to an upload."""
+    try:
+        new_offset = await transfer_manager.write_chunk(user_dir, transfer_id, offset, data, checksum, limit_bytes)
+        return {"action": "fs_upload_chunk", "status": "success", "transfer_id": transfer_id, "offset": new_offset}
+    except Exception as e:
+        return _transfer_error("fs_upload_chunk", e, transfer_id)
+
+
+async def fs_upload_finish(files_dir: str, user_dir: str, transfer_id: str) -> dict:
+    """Move a complete upload into the user's files."""
+    try:
+        relative_path = transfer_manager.upload_path(user_dir, transfer_id)
+        target = _safe_resolve(files_dir, relative_path)
+        size = await transfer_manager.finish_upload(user_dir, transfer_id, target)
+        return {"action": "fs_upload_finish", "status": "success", "transfer_id": transfer_id, "path": relative_path, "size": size}
+    except Exception as e:
+        return _transfer_error("fs_upload_finish", e, transfer_id)
+
+
+async def fs_upload_cancel(user_dir: str, transfer_id: str) -> dict:
+    try:
+        await transfer_manager.cancel_upload(user_dir, transfer_id)
+        return {"action": "fs_upload_cancel", "status": "success", "transfer_id": transfer_id}
+    except Exception as e:
+        return _transfer_error("fs_upload_cancel", e, transfer_id)
+
+
+async def fs_download_start(files_dir: str, user_dir: str, relative_path: str) -> dict:
+    """Start a chunked download of a file, without size limit."""
+    try:
+        target = _safe_resolve(files_dir, relative_path)
+        transfer = transfer_manager.start_download(user_dir, relative_path, target)
+        return {"action": "fs_download_start", "status": "success", **transfer}
+    except Exception as e:
+        return dict(_transfer_error("fs_download_start", e), path=relative_path)
+
+
+async def fs_download_chunk(user_dir: str, transfer_id: str, offset: int) -> dict:
+    """The chunk of a download starting at 'offset'; the last one has 'eof' set."""
+    try:
+        chunk = await transfer_manager.read_chunk(user_dir, transfer_id, offset)
+        return {"action": "fs_download_chunk", "status": "success", "transfer_id": transfer_id, **chunk}
+    except Exception as e:
+        return _transfer_error("fs_download_chunk", e, transfer_id)
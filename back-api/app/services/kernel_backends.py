@@ -0,0 +1,417 @@
+import os
+import sys
+import signal
+import socket
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, Tuple
+from loguru import logger
+from ..core.config import BASE_DIR, STORAGE_DIR, KERNEL_LIFECYCLE_WORKERS, MAX_CONCURRENT_KERNEL_STARTS
+from ..core.tier_manager import parse_mem_limit
+from ..core.metrics import metrics
+
+CGROUP_ROOT = "/sys/fs/cgroup"
+CGROUP_PARENT = "nodalpy"
+CPU_PERIOD = 100000
+
+# Blocking runtime calls (Docker SDK, process reaping) never run on the event loop.
+# A dedicated pool keeps them from starving asyncio.to_thread users (file system, pip...).
+LIFECYCLE_EXECUTOR = ThreadPoolExecutor(max_workers=KERNEL_LIFECYCLE_WORKERS, thread_name_prefix="kernel-lifecycle")
+kernel_start_semaphore = asyncio.Semaphore(MAX_CONCURRENT_KERNEL_STARTS)
+
+async def run_lifecycle_call(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(LIFECYCLE_EXECUTOR, functools.partial(func, *args, **kwargs))
+
+class KernelBackend:
+    """
+    Runtime used to launch the kernel of a single user.
+    A backend only manages the kernel lifecycle, the proxy owns the TCP connection to it.
+    """
+    name = "base"
+
+    def __init__(self, proxy):
+        self.proxy = proxy
+
+    def describe(self) -> str:
+        return f"{self.name} kernel of user {self.proxy.user_id}"
+
+    def is_running(self) -> bool:
+        raise NotImplementedError
+
+    async def start(self, config: Dict[str, Any], launch_token: str) -> Tuple[str, int]:
+        """
+        Launches the kernel with the tier limits in 'config', passing it 'launch_token' for
+        the handshake. Returns the (host, port) it listens on.
+        """
+        raise NotImplementedError
+
+    async def exit_logs(self) -> Optional[str]:
+        """Returns the kernel logs if it already exited, None while it is alive."""
+        raise NotImplementedError
+
+    async def stop(self):
+        raise NotImplementedError
+
+    async def pause(self):
+        raise NotImplementedError
+
+    async def unpause(self):
+        raise NotImplementedError
+
+    @classmethod
+    async def cleanup_orphans(cls):
+        """Removes kernels left behind by a previous server process."""
+        pass
+
+
+class DockerKernelBackend(KernelBackend):
+    name = "docker"
+
+    def __init__(self, proxy):
+        super().__init__(proxy)
+        user_id = proxy.user_id
+        self.container_name = f"nodalpy_kernel_{user_id}"
+        self.image_name = os.getenv("NODAL_KERNEL_IMAGE", "nodalpy_server:latest")
+        self.network_name = os.getenv("NODAL_DOCKER_NETWORK", "nodalpy_network")
+        self.host_storage_path = os.getenv("HOST_STORAGE_PATH", os.path.join(os.getcwd(), "storage"))
+        self.user_host_kernel_data_path = os.path.join(self.host_storage_path, "users", str(user_id), "kernel_data")
+        self.container = None
+        self.docker_client = None
+
+    def describe(self) -> str:
+        return f"kernel container '{self.container_name}'"
+
+    def is_running(self) -> bool:
+        return self.container is not None
+
+    async def start(self, config: Dict[str, Any], launch_token: str) -> Tuple[str, int]:
+        import docker
+
+        logger.info(f"Spawning kernel container '{self.container_name}' using image '{self.image_name}'...")
+
+        try:
+            with metrics.timer("kernel.docker.connect"):
+                self.docker_client = await run_lifecycle_call(docker.from_env)
+        except Exception as e:
+            logger.error(f"Failed to connect to Docker daemon: {e}")
+            raise RuntimeError(f"Failed to connect to Docker daemon: {e}")
+
+        def remove_stale():
+            try:
+                stale = self.docker_client.containers.get(self.container_name)
+                logger.info(f"Found stale container '{self.container_name}'. Stopping and removing it...")
+                stale.stop(timeout=2)
+                stale.remove()
+            except docker.errors.NotFound:
+                pass
+
+        with metrics.timer("kernel.docker.stale_cleanup"):
+            await run_lifecycle_call(remove_stale)
+
+        try:
+            with metrics.timer("kernel.docker.run"):
+                self.container = await run_lifecycle_call(
+                    self.docker_client.containers.run,
+                    image=self.image_name,
+                    command=[
+                        "python",
+                        "-m",
+                        "kernel.main",
+                        "--user-id",
+                        self.proxy.user_id,
+                        "--host",
+                        "0.0.0.0",
+                        "--port",
+                        "8000",
+                        "--storage-dir",
+                        "/app/storage",
+                        "--launch-token",
+                        launch_token
+                    ],
+                    name=self.container_name,
+                    network=self.network_name,
+                    volumes={
+                        self.user_host_kernel_data_path: {
+                            "bind": "/app/storage",
+                            "mode": "rw"
+                        }
+                    },
+                    mem_limit=config.get("mem_limit"),
+                    cpu_quota=config.get("cpu_quota"),
+                    detach=True,
+                    auto_remove=True
+                )
+        except Exception as e:
+            logger.error(f"Failed to run Docker container '{self.container_name}': {e}")
+            self.container = None
+            raise e
+
+        return self.container_name, 8000
+
+    async def exit_logs(self) -> Optional[str]:
+        container = self.container
+        await run_lifecycle_call(container.reload)
+        if container.status != "exited":
+            return None
+        logs = await run_lifecycle_call(container.logs)
+        self.container = None
+        return logs.decode('utf-8')
+
+    async def stop(self):
+        if self.container is None:
+            return
+        container = self.container
+        self.container = None
+        try:
+            with metrics.timer("kernel.docker.stop"):
+                await run_lifecycle_call(container.stop, timeout=2)
+        except Exception as e:
+            logger.warning(f"Error stopping container: {e}")
+
+    async def pause(self):
+        await run_lifecycle_call(self.container.pause)
+
+    async def unpause(self):
+        await run_lifecycle_call(self.container.unpause)
+
+    @classmethod
+    async def cleanup_orphans(cls):
+        def remove_container(container):
+            logger.info(f"Found orphaned kernel container '{container.name}'. Stopping & removing...")
+            try:
+                container.stop(timeout=2)
+                container.remove()
+            except Exception:
+                pass
+
+        try:
+            import docker
+            client = await run_lifecycle_call(docker.from_env)
+            containers = await run_lifecycle_call(client.containers.list, all=True)
+        except Exception as e:
+            logger.warning(f"Docker connection error during startup cleanup: {e}")
+            return
+
+        orphans = [c for c in containers if c.name.startswith("nodalpy_kernel_")]
+        with metrics.timer("kernel.docker.orphan_cleanup"):
+            await asyncio.gather(*(run_lifecycle_call(remove_container, c) for c in orphans))
+
+
+def _find_free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _cgroup_available() -> bool:
+    return os.path.exists(os.path.join(CGROUP_ROOT, "cgroup.controllers"))
+
+
+def _write_cgroup_file(path: str, value: str):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(value)
+
+
+class LocalProcessBackend(KernelBackend):
+    """
+    Runs the kernel as a local 'python -m kernel.main' subprocess.
+    Tier limits are enforced with a cgroup v2 group when the host allows it,
+    and with rlimits / niceness otherwise.
+    """
+    name = "local"
+
+    def __init__(self, proxy):
+        super().__init__(proxy)
+        self.process = None
+        self.cgroup_dir = None
+        self.log_path = os.path.join(proxy.local_storage_dir, "kernel.log")
+        self.pid_path = os.path.join(proxy.local_storage_dir, "kernel.pid")
+
+    def describe(self) -> str:
+        pid = self.process.pid if self.process else None
+        return f"local kernel process of user {self.proxy.user_id} (pid {pid})"
+
+    def is_running(self) -> bool:
+        return self.process is not None
+
+    def _setup_cgroup(self, config: Dict[str, Any]) -> Optional[str]:
+        if not _cgroup_available():
+            return None
+        try:
+            parent = os.path.join(CGROUP_ROOT, CGROUP_PARENT)
+            os.makedirs(parent, exist_ok=True)
+            try:
+                _write_cgroup_file(os.path.join(parent, "cgroup.subtree_control"), "+memory +cpu")
+            except OSError:
+                pass
+            cgroup_dir = os.path.join(parent, str(self.proxy.user_id))
+            os.makedirs(cgroup_dir, exist_ok=True)
+            mem_bytes = parse_mem_limit(config.get("mem_limit"))
+            if mem_bytes:
+                _write_cgroup_file(os.path.join(cgroup_dir, "memory.max"), str(mem_bytes))
+            cpu_quota = config.get("cpu_quota")
+            if cpu_quota:
+                _write_cgroup_file(os.path.join(cgroup_dir, "cpu.max"), f"{int(cpu_quota)} {CPU_PERIOD}")
+            return cgroup_dir
+        except OSError as e:
+            logger.debug(f"cgroups unavailable for local kernel of user {self.proxy.user_id}: {e}")
+            return None
+
+    def _make_preexec(self, config: Dict[str, Any], cgroup_dir: Optional[str]):
+        mem_bytes = parse_mem_limit(config.get("mem_limit"))
+        cpu_quota = config.get("cpu_quota")
+
+        def preexec():
+            # Runs in the child between fork and exec: only async-signal-safe style work here
+            if cgroup_dir:
+                try:
+                    _write_cgroup_file(os.path.join(cgroup_dir, "cgroup.procs"), str(os.getpid()))
+                    return
+                except OSError:
+                    pass
+            import resource
+            if mem_bytes:
+                try:
+                    resource.setrlimit(resource.RLIMIT_DATA, (mem_bytes, mem_bytes))
+                except (ValueError, OSError):
+                    pass
+            if cpu_quota and cpu_quota < CPU_PERIOD:
+                # No rlimit caps a CPU share: lower the scheduling priority instead
+                try:
+                    os.nice(10)
+                except OSError:
+                    pass
+
+        return preexec
+
+    async def start(self, config: Dict[str, Any], launch_token: str) -> Tuple[str, int]:
+        port = _find_free_port()
+        self.cgroup_dir = self._setup_cgroup(config)
+        logger.info(f"Spawning local kernel process for user {self.proxy.user_id} on port {port} "
+                    f"(limits: {'cgroup' if self.cgroup_dir else 'rlimit'})...")
+
+        log_file = open(self.log_path, "wb")
+        try:
+            with metrics.timer("kernel.local.spawn"):
+                self.process = await asyncio.create_subprocess_exec(
+                    sys.executable,
+                    "-m",
+                    "kernel.main",
+                    "--user-id",
+                    str(self.proxy.user_id),
+                    "--host",
+                    "127.0.0.1",
+                    "--port",
+                    str(port),
+                    "--storage-dir",
+                    self.proxy.kernel_data_dir,
+                    "--launch-token",
+                    launch_token,
+                    cwd=BASE_DIR,
+                    stdout=log_file,
+                    stderr=asyncio.subprocess.STDOUT,
+                    start_new_session=True,
+                    preexec_fn=self._make_preexec(config, self.cgroup_dir)
+                )
+        except Exception as e:
+            logger.error(f"Failed to spawn local kernel for user {self.proxy.user_id}: {e}")
+            self.process = None
+            raise e
+        finally:
+            log_file.close()
+
+        with open(self.pid_path, "w", encoding="utf-8") as f:
+            f.write(str(self.process.pid))
+
+        return "127.0.0.1", port
+
+    def _read_logs(self) -> str:
+        try:
+            with open(self.log_path, "r", encoding="utf-8", errors="replace") as f:
+                return f.read()[-20000:]
+        except OSError:
+            return ""
+
+    def _cleanup(self):
+        self.process = None
+        try:
+            os.remove(self.pid_path)
+        except OSError:
+            pass
+        if self.cgroup_dir:
+            try:
+                os.rmdir(self.cgroup_dir)
+            except OSError:
+                pass
+            self.cgroup_dir = None
+
+    async def exit_logs(self) -> Optional[str]:
+        if self.process.returncode is None:
+            return None
+        self._cleanup()
+        return self._read_logs()
+
+    def _signal_group(self, sig):
+        try:
+            os.killpg(self.process.pid, sig)
+        except ProcessLookupError:
+            pass
+
+    async def stop(self):
+        if self.process is None:
+            return
+        if self.process.returncode is None:
+            with metrics.timer("kernel.local.stop"):
+                self._signal_group(signal.SIGCONT)
+                self._signal_group(signal.SIGTERM)
+                try:
+                    await asyncio.wait_for(self.process.wait(), timeout=2)
+                except asyncio.TimeoutError:
+                    self._signal_group(signal.SIGKILL)
+                    await self.process.wait()
+        self._cleanup()
+
+    async def pause(self):
+        self._signal_group(signal.SIGSTOP)
+
+    async def unpause(self):
+        self._signal_group(signal.SIGCONT)
+
+    @classmethod
+    async def cleanup_orphans(cls):
+        def do_cleanup():
+            users_dir = os.path.join(STORAGE_DIR, "users")
+            if not os.path.isdir(users_dir):
+                return
+            for user_id in os.listdir(users_dir):
+                pid_path = os.path.join(users_dir, user_id, "kernel.pid")
+                try:
+                    with open(pid_path, "r", encoding="utf-8") as f:
+                        pid = int(f.read().strip())
+                    with open(f"/proc/{pid}/cmdline", "rb") as f:
+                        cmdline = f.read()
+                    if b"kernel.main" in cmdline:
+                        logger.info(f"Found orphaned local kernel process {pid} of user {user_id}. Killing...")
+                        os.killpg(pid, signal.SIGKILL)
+                except (OSError, ValueError):
+                    pass
+                try:
+                    os.remove(pid_path)
+                except OSError:
+                    pass
+
+        await run_lifecycle_call(do_cleanup)
+
+
+KERNEL_BACKENDS = {
+    DockerKernelBackend.name: DockerKernelBackend,
+    LocalProcessBackend.name: LocalProcessBackend,
+}
+
+def get_backend_class(name: str):
+    backend_class = KERNEL_BACKENDS.get(name)
+    if backend_class is None:
+        raise ValueError(f"Unknown kernel backend '{name}'. Available: {', '.join(KERNEL_BACKENDS)}")
+    return backend_class
@@ -0,0 +1,224 @@
+"""
+Content-addressed project history, under <projects_dir>/.history:
+
+    objects/<2 first hex chars>/<sha256>.json   one node or edge body, stored once
+    versions/<project_id>/<version>.json        manifest: meta + [id, hash] per node/edge
+
+A version costs its manifest plus the bodies that changed since the previous ones.
+Objects no manifest references anymore are removed by collect_garbage().
+"""
+
+import os
+import json
+import time
+import shutil
+import hashlib
+from datetime import datetime, timezone
+from loguru import logger
+from .project_index import write_json_atomic, check_project_id
+from . import project_journal
+from ..core.config import PROJECT_HISTORY_INTERVAL, PROJECT_HISTORY_MAX_VERSIONS
+
+HISTORY_DIR_NAME = ".history"
+
+# (projects_dir, project_id) -> time of the last recorded version
+_last_recorded = {}
+
+
+def _history_dir(projects_dir: str) -> str:
+    return os.path.join(projects_dir, HISTORY_DIR_NAME)
+
+
+def _objects_dir(projects_dir: str) -> str:
+    return os.path.join(_history_dir(projects_dir), "objects")
+
+
+def _versions_dir(projects_dir: str, project_id: str) -> str:
+    """Versions of a project; raises ValueError unless it is a direct child of versions/."""
+    root = os.path.join(_history_dir(projects_dir), "versions")
+    path = os.path.join(root, check_project_id(project_id))
+    # Also rejects a symlink pointing elsewhere: everything below is read, written or removed
+    if os.path.dirname(os.path.realpath(path)) != os.path.realpath(root):
+        raise ValueError("Invalid project id")
+    return path
+
+
+def _object_path(projects_dir: str, digest: str) -> str:
+    return os.path.join(_objects_dir(projects_dir), digest[:2], f"{digest}.json")
+
+
+def _canonical(item: dict) -> bytes:
+    return json.dumps(item, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+
+def _hash_items(items: list) -> list:
+    return [[item.get("id"), hashlib.sha256(_canonical(item)).hexdigest()] for item in items]
+
+
+def _store_objects(projects_dir: str, items: list, entries: list):
+    for item, (_, digest) in zip(items, entries):
+        path = _object_path(projects_dir, digest)
+        if os.path.exists(path):
+            continue
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_json_atomic(path, item)
+
+
+def _read_object(projects_dir: str, digest: str) -> dict:
+    with open(_object_path(projects_dir, digest), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _version_ids(projects_dir: str, project_id: str) -> list:
+    try:
+        names = os.listdir(_versions_dir(projects_dir, project_id))
+    except FileNotFoundError:
+        return []
+    return sorted(name[:-5] for name in names if name.endswith(".json"))
+
+
+def _read_manifest(projects_dir: str, project_id: str, version: str) -> dict:
+    if not str(version).isdigit():
+        raise ValueError(f"Invalid version {version}")
+    path = os.path.join(_versions_dir(projects_dir, project_id), f"{version}.json")
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        raise ValueError(f"Unknown version {version}")
+
+
+def record_version(projects_dir: str, project_id: str, project_data: dict = None, force: bool = False) -> str:
+    """
+    Records the current state of a project as a new version, at most once every
+    PROJECT_HISTORY_INTERVAL seconds unless 'force'. Returns the version id, or None
+    when nothing was recorded (not due, or unchanged since the last version).
+    """
+    key = (projects_dir, project_id)
+    now = time.time()
+    versions = None
+    if key not in _last_recorded:
+        versions = _version_ids(projects_dir, project_id)
+        _last_recorded[key] = int(versions[-1]) / 1000.0 if versions else 0.0
+    if not force and now - _last_recorded[key] < PROJECT_HISTORY_INTERVAL:
+        return None
+
+    if project_data is None:
+        project_data = project_journal.load_project(projects_dir, project_id)
+        if project_data is None:
+            return None
+    nodes = project_data.get("nodes", [])
+    edges = project_data.get("edges", [])
+    manifest = {
+        "meta": project_data.get("meta", {}),
+        "nodes": _hash_items(nodes),
+        "edges": _hash_items(edges)
+    }
+
+    versions = versions if versions is not None else _version_ids(projects_dir, project_id)
+    _last_recorded[key] = now
+    if versions:
+        previous = _read_manifest(projects_dir, project_id, versions[-1])
+        if previous["nodes"] == manifest["nodes"] and previous["edges"] == manifest["edges"]:
+            return None
+
+    _store_objects(projects_dir, nodes, manifest["nodes"])
+    _store_objects(projects_dir, edges, manifest["edges"])
+    version = f"{int(now * 1000):013d}"
+    manifest["createdAt"] = datetime.now(timezone.utc).isoformat()
+    os.makedirs(_versions_dir(projects_dir, project_id), exist_ok=True)
+    write_json_atomic(os.path.join(_versions_dir(projects_dir, project_id), f"{version}.json"), manifest)
+
+    # Retention: dropping manifests frees the objects only they referenced
+    expired = versions[:max(0, len(versions) + 1 - PROJECT_HISTORY_MAX_VERSIONS)]
+    for old in expired:
+        os.remove(os.path.join(_versions_dir(projects_dir, project_id), f"{old}.json"))
+    if expired:
+        collect_garbage(projects_dir)
+    return version
+
+
+def list_versions(projects_dir: str, project_id: str) -> list:
+    versions = []
+    for version in reversed(_version_ids(projects_dir, project_id)):
+        manifest = _read_manifest(projects_dir, project_id, version)
+        versions.append({
+            "version": version,
+            "createdAt": manifest.get("createdAt"),
+            "name": manifest.get("meta", {}).get("name", "Untitled"),
+            "nodes": len(manifest["nodes"]),
+            "edges": len(manifest["edges"])
+        })
+    return versions
+
+
+def load_version(projects_dir: str, project_id: str, version: str) -> dict:
+    manifest = _read_manifest(projects_dir, project_id, version)
+    return {
+        "meta": manifest.get("meta", {}),
+        "nodes": [_read_object(projects_dir, digest) for _, digest in manifest["nodes"]],
+        "edges": [_read_object(projects_dir, digest) for _, digest in manifest["edges"]]
+    }
+
+
+def _diff_entries(old: list, new: list) -> dict:
+    old_map, new_map = dict(map(tuple, old)), dict(map(tuple, new))
+    return {
+        "added": [item_id for item_id in new_map if item_id not in old_map],
+        "removed": [item_id for item_id in old_map if item_id not in new_map],
+        "changed": [item_id for item_id, digest in new_map.items() if item_id in old_map and old_map[item_id] != digest]
+    }
+
+
+def diff_versions(projects_dir: str, project_id: str, from_version: str, to_version: str = None) -> dict:
+    """Ids of the nodes/edges added, removed or changed between two versions ('to_version' None: the current project)."""
+    old = _read_manifest(projects_dir, project_id, from_version)
+    if to_version is None:
+        current = project_journal.load_project(projects_dir, project_id)
+        if current is None:
+            raise ValueError("Project not found")
+        new = {"nodes": _hash_items(current.get("nodes", [])), "edges": _hash_items(current.get("edges", []))}
+    else:
+        new = _read_manifest(projects_dir, project_id, to_version)
+    return {
+        "nodes": _diff_entries(old["nodes"], new["nodes"]),
+        "edges": _diff_entries(old["edges"], new["edges"])
+    }
+
+
+def delete_history(projects_dir: str, project_id: str):
+    _last_recorded.pop((projects_dir, project_id), None)
+    shutil.rmtree(_versions_dir(projects_dir, project_id), ignore_errors=True)
+    collect_garbage(projects_dir)
+
+
+def collect_garbage(projects_dir: str) -> int:
+    """Removes the objects no manifest references. Returns the number of objects removed."""
+    referenced = set()
+    versions_root = os.path.join(_history_dir(projects_dir), "versions")
+    if os.path.isdir(versions_root):
+        for project_id in os.listdir(versions_root):
+            try:
+                versions = _version_ids(projects_dir, project_id)
+            except ValueError:
+                continue  # Not a project's versions: an invalid name, or a symlink
+            for version in versions:
+                manifest = _read_manifest(projects_dir, project_id, version)
+                referenced.update(digest for _, digest in manifest["nodes"])
+                referenced.update(digest for _, digest in manifest["edges"])
+
+    removed = 0
+    objects_root = _objects_dir(projects_dir)
+    if not os.path.isdir(objects_root):
+        return 0
+    for prefix in os.listdir(objects_root):
+        prefix_dir = os.path.join(objects_root, prefix)
+        for name in os.listdir(prefix_dir):
+            if name[:-5] not in referenced:
+                os.remove(os.path.join(prefix_dir, name))
+                removed += 1
+        if not os.listdir(prefix_dir):
+            os.rmdir(prefix_dir)
+    if removed:
+        logger.info(f"History GC removed {removed} objects in {projects_dir}")
+    return removed
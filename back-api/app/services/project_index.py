@@ -0,0 +1,159 @@
+import os
+import re
+import json
+from loguru import logger
+
+INDEX_FILE_NAME = ".index.json"
+LEGACY_PROJECT_FILE = "project.json"
+# UUIDs and other plain names: no separators, no dots, so never a path out of the projects dir
+PROJECT_ID_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+
+def is_valid_project_id(project_id) -> bool:
+    return isinstance(project_id, str) and PROJECT_ID_PATTERN.fullmatch(project_id) is not None
+
+
+def check_project_id(project_id) -> str:
+    """Returns 'project_id', or raises ValueError if it can't safely name a project file."""
+    if not is_valid_project_id(project_id):
+        raise ValueError("Invalid project id")
+    return project_id
+
+
+def _index_path(projects_dir: str) -> str:
+    return os.path.join(projects_dir, INDEX_FILE_NAME)
+
+
+def _is_project_file(filename: str) -> bool:
+    return filename.endswith(".json") and not filename.startswith(".") and filename != LEGACY_PROJECT_FILE
+
+
+def write_json_atomic(path: str, data, indent=None):
+    """Write JSON to a temp file next to 'path' then swap it in, so readers never see a partial file."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=indent)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _load_index(projects_dir: str) -> dict:
+    try:
+        with open(_index_path(projects_dir), "r", encoding="utf-8") as f:
+            index = json.load(f)
+        if isinstance(index, dict):
+            return index
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.warning(f"Rebuilding corrupted project index in {projects_dir}: {e}")
+    return {}
+
+
+def _save_index(projects_dir: str, index: dict):
+    write_json_atomic(_index_path(projects_dir), index)
+
+
+def _entry_from_meta(meta: dict, stat: os.stat_result) -> dict:
+    return {
+        "name": meta.get("name", "Untitled"),
+        "createdAt": meta.get("createdAt", ""),
+        "updatedAt": meta.get("updatedAt", ""),
+        "mtime_ns": stat.st_mtime_ns,
+        "size": stat.st_size
+    }
+
+
+def _read_entry(filepath: str, stat: os.stat_result):
+    """Parse a project file to rebuild its index entry (only for files the index doesn't know yet)."""
+    try:
+        with open(filepath, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return _entry_from_meta(data.get("meta", {}), stat)
+    except Exception:
+        return None
+
+
+def _is_fresh(entry: dict, stat: os.stat_result) -> bool:
+    return entry.get("mtime_ns") == stat.st_mtime_ns and entry.get("size") == stat.st_size
+
+
+def _sync_index(projects_dir: str) -> dict:
+    """
+    Returns the index reconciled with the directory content. Project files are only
+    stat'ed; one is parsed only when it is missing from the index or was modified
+    behind our back (size/mtime mismatch). Entries whose file is gone are dropped.
+    """
+    index = _load_index(projects_dir)
+    synced = {}
+    changed = False
+    with os.scandir(projects_dir) as it:
+        for dir_entry in it:
+            if not dir_entry.is_file() or not _is_project_file(dir_entry.name):
+                continue
+            project_id = dir_entry.name[:-5]
+            stat = dir_entry.stat()
+            entry = index.get(project_id)
+            if entry is None or not _is_fresh(entry, stat):
+                entry = _read_entry(dir_entry.path, stat)
+                changed = True
+                if entry is None:
+                    continue
+            synced[project_id] = entry
+
+    if changed or len(synced) != len(index):
+        try:
+            _save_index(projects_dir, synced)
+        except OSError as e:
+            logger.warning(f"Could not persist project index in {projects_dir}: {e}")
+    return synced
+
+
+def list_projects(projects_dir: str) -> list:
+    projects = [
+        {
+            "id": project_id,
+            "name": entry["name"],
+            "createdAt": entry["createdAt"],
+            "updatedAt": entry["updatedAt"]
+        }
+        for project_id, entry in _sync_index(projects_dir).items()
+    ]
+    projects.sort(key=lambda p: p.get("updatedAt", ""), reverse=True)
+    return projects
+
+
+def count_projects(projects_dir: str) -> int:
+    return len(_sync_index(projects_dir))
+
+
+def get_meta(projects_dir: str, project_id: str):
+    """Meta of a project from the index, or None if the project doesn't exist."""
+    path = os.path.join(projects_dir, f"{check_project_id(project_id)}.json")
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    entry = _load_index(projects_dir).get(project_id)
+    if entry is None or not _is_fresh(entry, stat):
+        entry = _read_entry(path, stat)
+        if entry is None:
+            return None
+    return {"name": entry["name"], "createdAt": entry["createdAt"], "updatedAt": entry["updatedAt"]}
+
+
+def record_project(projects_dir: str, project_id: str, meta: dict):
+    """Must be called right after the project file was written."""
+    stat = os.stat(os.path.join(projects_dir, f"{check_project_id(project_id)}.json"))
+    index = _load_index(projects_dir)
+    index[project_id] = _entry_from_meta(meta, stat)
+    _save_index(projects_dir, index)
+
+
+def remove_project(projects_dir: str, project_id: str):
+    index = _load_index(projects_dir)
+    if index.pop(project_id, None) is not None:
+        _save_index(projects_dir, index)
@@ -0,0 +1,141 @@
+"""
+Append-only patch journal kept next to each project snapshot (<id>.json -> <id>.journal).
+
+Each journal line is {"updatedAt": ..., "ops": [...]} where an op is one of:
+    {"op": "upsert", "collection": "nodes"|"edges", "id": ..., "value": {...}}
+    {"op": "remove", "collection": "nodes"|"edges", "id": ...}
+    {"op": "order",  "collection": "nodes"|"edges", "ids": [...]}
+
+Ops are keyed by id, so replaying a line twice is harmless: a crash between writing
+the compacted snapshot and removing the journal doesn't corrupt the project.
+"""
+
+import os
+import json
+from loguru import logger
+from .project_index import write_json_atomic, check_project_id
+from ..core.config import PROJECT_JOURNAL_MAX_ENTRIES, PROJECT_JOURNAL_MAX_BYTES
+
+COLLECTIONS = ("nodes", "edges")
+OPS = ("upsert", "remove", "order")
+
+# Number of lines of each journal, counted once then maintained on append
+_entry_counts = {}
+
+
+def snapshot_path(projects_dir: str, project_id: str) -> str:
+    return os.path.join(projects_dir, f"{check_project_id(project_id)}.json")
+
+
+def journal_path(projects_dir: str, project_id: str) -> str:
+    return os.path.join(projects_dir, f"{check_project_id(project_id)}.journal")
+
+
+def validate_ops(ops) -> list:
+    if not isinstance(ops, list):
+        raise ValueError("ops must be a list")
+    for op in ops:
+        if not isinstance(op, dict) or op.get("op") not in OPS or op.get("collection") not in COLLECTIONS:
+            raise ValueError(f"Invalid patch op: {op}")
+        if op["op"] == "order":
+            if not isinstance(op.get("ids"), list):
+                raise ValueError("order op requires 'ids'")
+        elif "id" not in op:
+            raise ValueError(f"{op['op']} op requires 'id'")
+        elif op["op"] == "upsert" and not isinstance(op.get("value"), dict):
+            raise ValueError("upsert op requires a 'value' object")
+    return ops
+
+
+def apply_ops(project_data: dict, ops: list):
+    for op in ops:
+        items = project_data.setdefault(op["collection"], [])
+        if op["op"] == "order":
+            by_id = {item.get("id"): item for item in items}
+            ordered = [by_id.pop(item_id) for item_id in op["ids"] if item_id in by_id]
+            # Items the order doesn't mention keep their relative position at the end
+            ordered.extend(item for item in items if item.get("id") in by_id)
+            project_data[op["collection"]] = ordered
+            continue
+
+        index = next((i for i, item in enumerate(items) if item.get("id") == op["id"]), None)
+        if op["op"] == "upsert":
+            value = dict(op["value"], id=op["id"])
+            if index is None:
+                items.append(value)
+            else:
+                items[index] = value
+        elif index is not None:
+            del items[index]
+
+
+def _read_journal(path: str) -> list:
+    entries = []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # Only the last line can be torn (crash while appending)
+                    logger.warning(f"Skipping torn journal entry in {path}")
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+def load_project(projects_dir: str, project_id: str):
+    """Snapshot with the journal tail replayed on top, or None if the project doesn't exist."""
+    path = snapshot_path(projects_dir, project_id)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        project_data = json.load(f)
+
+    for entry in _read_journal(journal_path(projects_dir, project_id)):
+        apply_ops(project_data, entry.get("ops", []))
+        if entry.get("updatedAt"):
+            project_data.setdefault("meta", {})["updatedAt"] = entry["updatedAt"]
+    return project_data
+
+
+def _entry_count(path: str) -> int:
+    if path not in _entry_counts:
+        try:
+            with open(path, "rb") as f:
+                _entry_counts[path] = sum(1 for line in f if line.strip())
+        except FileNotFoundError:
+            _entry_counts[path] = 0
+    return _entry_counts[path]
+
+
+def append_patch(projects_dir: str, project_id: str, ops: list, updated_at: str) -> bool:
+    """Appends one patch to the journal. Returns True when the journal is due for compaction."""
+    path = journal_path(projects_dir, project_id)
+    count = _entry_count(path)
+    line = json.dumps({"updatedAt": updated_at, "ops": ops}) + "\n"
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(line)
+    _entry_counts[path] = count + 1
+
+    return _entry_counts[path] >= PROJECT_JOURNAL_MAX_ENTRIES or os.path.getsize(path) >= PROJECT_JOURNAL_MAX_BYTES
+
+
+def compact(projects_dir: str, project_id: str):
+    """Folds the journal into a new snapshot. Returns the compacted project data."""
+    project_data = load_project(projects_dir, project_id)
+    if project_data is None:
+        return None
+    write_json_atomic(snapshot_path(projects_dir, project_id), project_data, indent=2)
+    discard(projects_dir, project_id)
+    return project_data
+
+
+def discard(projects_dir: str, project_id: str):
+    """Drops the journal, for when the snapshot was fully rewritten or the project deleted."""
+    path = journal_path(projects_dir, project_id)
+    _entry_counts.pop(path, None)
+    if os.path.exists(path):
+        os.remove(path)
@@ -0,0 +1,277 @@
+import asyncio
+import os
+import time
+from loguru import logger
+from . import project_index
+from . import project_journal
+from . import project_history
+from .project_index import write_json_atomic, check_project_id
+from ..core.metrics import metrics
+from ..core.storage_manager import get_path_bytes, record_usage_delta, mark_usage_stale
+from ..core.config import PROJECT_FLUSH_DELAY_MS
+
+
+class _PendingWrite:
+    """Mutations of one project accepted but not written yet, folded together."""
+    def __init__(self):
+        self.graph = None       # {"nodes", "edges"} replacing the stored graph
+        self.ops = []           # journal ops on top of the stored graph (when graph is None)
+        self.meta = {}          # meta fields to override
+        self.created = False    # no file on disk yet
+        self.rewrite = False    # the snapshot must be rewritten (graph or meta changed)
+        self.requests = 0
+
+    def absorb_newer(self, newer: "_PendingWrite"):
+        """Folds mutations accepted after this one (used to requeue a failed flush)."""
+        if newer.graph is not None:
+            self.graph = newer.graph
+            self.ops = []
+        elif self.graph is not None:
+            project_journal.apply_ops(self.graph, newer.ops)
+        else:
+            self.ops.extend(newer.ops)
+        self.meta.update(newer.meta)
+        self.rewrite = self.rewrite or newer.rewrite
+        self.requests += newer.requests
+
+
+class ProjectStore:
+    """
+    Write-behind store for project files. Mutations are accepted in memory and
+    coalesced per project; a flush runs 'delay_ms' after the first pending mutation,
+    or explicitly on disconnect/shutdown. Disk I/O runs in worker threads and
+    snapshots are written with an atomic rename.
+
+    Reads (load/list) flush the projects they touch first, so they always see
+    accepted mutations. Flushes of a user's projects are serialized, as they all
+    update the same index file.
+    """
+    def __init__(self, delay_ms: int):
+        self.delay = delay_ms / 1000.0
+        self.pending = {}        # (projects_dir, project_id) -> _PendingWrite
+        self.timers = {}         # (projects_dir, project_id) -> flush task
+        self.dir_locks = {}      # projects_dir -> asyncio.Lock
+        self.requests = 0
+        self.flushes = 0
+
+    def _dir_lock(self, projects_dir: str) -> asyncio.Lock:
+        if projects_dir not in self.dir_locks:
+            self.dir_locks[projects_dir] = asyncio.Lock()
+        return self.dir_locks[projects_dir]
+
+    def _pending(self, projects_dir: str, project_id: str) -> _PendingWrite:
+        key = (projects_dir, check_project_id(project_id))
+        entry = self.pending.get(key)
+        if entry is None:
+            entry = self.pending[key] = _PendingWrite()
+        entry.requests += 1
+        self.requests += 1
+        metrics.increment("project_store.requests")
+        if key not in self.timers:
+            self.timers[key] = asyncio.create_task(self._delayed_flush(key))
+        return entry
+
+    async def _delayed_flush(self, key):
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            return
+        self.timers.pop(key, None)
+        await self.flush(*key)
+
+    # --- Mutations ---
+
+    def create(self, projects_dir: str, project_id: str, meta: dict):
+        entry = self._pending(projects_dir, project_id)
+        entry.created = True
+        entry.rewrite = True
+        entry.graph = {"nodes": [], "edges": []}
+        entry.meta.update(meta)
+
+    def save_graph(self, projects_dir: str, project_id: str, nodes: list, edges: list, updated_at: str):
+        entry = self._pending(projects_dir, project_id)
+        entry.graph = {"nodes": nodes, "edges": edges}
+        entry.ops = []
+        entry.rewrite = True
+        entry.meta["updatedAt"] = updated_at
+
+    def apply_patch(self, projects_dir: str, project_id: str, ops: list, updated_at: str):
+        entry = self._pending(projects_dir, project_id)
+        if entry.graph is not None:
+            project_journal.apply_ops(entry.graph, ops)
+        else:
+            entry.ops.extend(ops)
+        entry.meta["updatedAt"] = updated_at
+
+    def rename(self, projects_dir: str, project_id: str, name: str, updated_at: str):
+        entry = self._pending(projects_dir, project_id)
+        entry.rewrite = True
+        entry.meta.update({"name": name, "updatedAt": updated_at})
+
+    async def delete(self, projects_dir: str, project_id: str):
+        key = (projects_dir, check_project_id(project_id))
+        timer = self.timers.pop(key, None)
+        if timer:
+            timer.cancel()
+        self.pending.pop(key, None)
+        async with self._dir_lock(projects_dir):
+            # A failed flush that was in progress may have requeued its mutations
+            self.pending.pop(key, None)
+            await asyncio.to_thread(self._delete_files, projects_dir, project_id)
+
+    # --- Reads ---
+
+    async def exists(self, projects_dir: str, project_id: str) -> bool:
+        if (projects_dir, check_project_id(project_id)) in self.pending:
+            return True
+        return await asyncio.to_thread(os.path.exists, project_journal.snapshot_path(projects_dir, project_id))
+
+    async def load(self, projects_dir: str, project_id: str):
+        check_project_id(project_id)
+        await self.flush(projects_dir, project_id)
+        async with self._dir_lock(projects_dir):
+            return await asyncio.to_thread(project_journal.load_project, projects_dir, project_id)
+
+    async def list_projects(self, projects_dir: str) -> list:
+        await self.flush_dir(projects_dir)
+        async with self._dir_lock(projects_dir):
+            return await asyncio.to_thread(project_index.list_projects, projects_dir)
+
+    async def count_projects(self, projects_dir: str) -> int:
+        await self.flush_dir(projects_dir)
+        async with self._dir_lock(projects_dir):
+            return await asyncio.to_thread(project_index.count_projects, projects_dir)
+
+    async def read_history(self, projects_dir: str, func, *args):
+        """Runs a project_history reader in a worker thread, serialized with the flushes of the user."""
+        await self.flush_dir(projects_dir)
+        async with self._dir_lock(projects_dir):
+            return await asyncio.to_thread(func, projects_dir, *args)
+
+    # --- Flushing ---
+
+    async def flush(self, projects_dir: str, project_id: str):
+        key = (projects_dir, project_id)
+        timer = self.timers.pop(key, None)
+        if timer and timer is not asyncio.current_task():
+            timer.cancel()
+
+        async with self._dir_lock(projects_dir):
+            # Taken under the lock: mutations accepted while waiting are part of this flush
+            entry = self.pending.pop(key, None)
+            if entry is None:
+                return
+            start = time.perf_counter()
+            try:
+                await asyncio.to_thread(self._write_accounted, projects_dir, project_id, entry)
+            except Exception as e:
+                metrics.increment("project_store.flush_errors")
+                logger.error(f"Error flushing project {project_id}: {e}")
+                # Keep the mutations: the next flush (save, disconnect or shutdown) retries
+                newer = self.pending.get(key)
+                if newer is not None:
+                    entry.absorb_newer(newer)
+                self.pending[key] = entry
+                return
+            metrics.observe("project_store.flush", time.perf_counter() - start)
+            metrics.increment("project_store.flushes")
+            self.flushes += 1
+
+    async def flush_dir(self, projects_dir: str):
+        for key in [k for k in self.pending if k[0] == projects_dir]:
+            await self.flush(*key)
+
+    async def flush_all(self):
+        keys = list(self.pending)
+        for key in keys:
+            await self.flush(*key)
+        if keys:
+            logger.info(f"Flushed {len(keys)} projects (coalescing ratio {self.coalescing_ratio():.1f})")
+
+    def coalescing_ratio(self) -> float:
+        """Accepted mutations per disk flush."""
+        return self.requests / self.flushes if self.flushes else 0.0
+
+    # --- Disk I/O (worker threads) ---
+
+    @staticmethod
+    def _project_bytes(projects_dir: str, project_id: str) -> int:
+        return (get_path_bytes(project_journal.snapshot_path(projects_dir, project_id))
+                + get_path_bytes(project_journal.journal_path(projects_dir, project_id)))
+
+    @staticmethod
+    def _write_accounted(projects_dir: str, project_id: str, entry: _PendingWrite):
+        """_write, reporting the change of the project files to the user's storage usage."""
+        user_dir = os.path.dirname(projects_dir)
+        size_before = ProjectStore._project_bytes(projects_dir, project_id)
+        try:
+            if ProjectStore._write(projects_dir, project_id, entry):
+                # History objects are shared between projects: measured by the next reconciliation
+                mark_usage_stale(user_dir)
+        finally:
+            record_usage_delta(user_dir, ProjectStore._project_bytes(projects_dir, project_id) - size_before)
+
+    @staticmethod
+    def _write(projects_dir: str, project_id: str, entry: _PendingWrite):
+        """Writes the pending mutations. Returns True if a history version was recorded."""
+        os.makedirs(projects_dir, exist_ok=True)
+        if not entry.rewrite:
+            meta = project_index.get_meta(projects_dir, project_id)
+            if meta is None:
+                logger.warning(f"Dropping patch for missing project {project_id}")
+                return False
+            meta.update(entry.meta)
+            if project_journal.append_patch(projects_dir, project_id, entry.ops, meta.get("updatedAt")):
+                project_journal.compact(projects_dir, project_id)
+            project_index.record_project(projects_dir, project_id, meta)
+            return ProjectStore._record_history(projects_dir, project_id, None)
+
+        if entry.created:
+            project_data = {"meta": {}, "nodes": [], "edges": []}
+        else:
+            project_data = project_journal.load_project(projects_dir, project_id)
+            if project_data is None:
+                project_data = {"meta": {}, "nodes": [], "edges": []}
+        if entry.graph is not None:
+            project_data["nodes"] = entry.graph.get("nodes", [])
+            project_data["edges"] = entry.graph.get("edges", [])
+        else:
+            project_journal.apply_ops(project_data, entry.ops)
+
+        meta = project_data.setdefault("meta", {})
+        meta.update(entry.meta)
+        if "createdAt" not in meta:
+            meta["createdAt"] = meta.get("updatedAt", "")
+        if "name" not in meta:
+            meta["name"] = "Untitled"
+        # Keep meta first in the file, as the editor export does
+        project_data = {"meta": meta, "nodes": project_data["nodes"], "edges": project_data["edges"]}
+
+        write_json_atomic(project_journal.snapshot_path(projects_dir, project_id), project_data, indent=2)
+        project_journal.discard(projects_dir, project_id)
+        project_index.record_project(projects_dir, project_id, meta)
+        return ProjectStore._record_history(projects_dir, project_id, project_data)
+
+    @staticmethod
+    def _record_history(projects_dir: str, project_id: str, project_data) -> bool:
+        # History is best effort: a failure must not requeue an already written project
+        try:
+            return project_history.record_version(projects_dir, project_id, project_data) is not None
+        except Exception as e:
+            logger.warning(f"Could not record history of project {project_id}: {e}")
+            return False
+
+    @staticmethod
+    def _delete_files(projects_dir: str, project_id: str):
+        user_dir = os.path.dirname(projects_dir)
+        record_usage_delta(user_dir, -ProjectStore._project_bytes(projects_dir, project_id))
+        project_path = project_journal.snapshot_path(projects_dir, project_id)
+        if os.path.exists(project_path):
+            os.remove(project_path)
+        project_journal.discard(projects_dir, project_id)
+        project_index.remove_project(projects_dir, project_id)
+        project_history.delete_history(projects_dir, project_id)
+        mark_usage_stale(user_dir)
+
+
+project_store = ProjectStore(PROJECT_FLUSH_DELAY_MS)
@@ -0,0 +1,53 @@
+import math
+
+# Node data values heavier than this (code, long texts) are left out of the skeleton
+SKELETON_MAX_STRING = 256
+HEAVY_DATA_KEYS = {"code"}
+
+
+def _is_light(key: str, value) -> bool:
+    if key in HEAVY_DATA_KEYS:
+        return False
+    if isinstance(value, str):
+        return len(value) <= SKELETON_MAX_STRING
+    return True
+
+
+def node_skeleton(node: dict) -> dict:
+    """Everything needed to lay the node out (position, type, handles...) without its heavy data."""
+    data = node.get("data") or {}
+    skeleton = dict(node)
+    skeleton["data"] = {key: value for key, value in data.items() if _is_light(key, value)}
+    return skeleton
+
+
+def node_body(node: dict) -> dict:
+    return {"id": node.get("id"), "data": node.get("data") or {}}
+
+
+def order_by_viewport(nodes: list, viewport: dict = None) -> list:
+    """
+    Nodes inside 'viewport' ({x, y, width, height} in flow coordinates) first, then
+    the others by distance to its center. Without a viewport the order is unchanged.
+    """
+    if not viewport:
+        return list(nodes)
+    try:
+        left, top = float(viewport["x"]), float(viewport["y"])
+        right, bottom = left + float(viewport["width"]), top + float(viewport["height"])
+    except (KeyError, TypeError, ValueError):
+        return list(nodes)
+    center_x, center_y = (left + right) / 2, (top + bottom) / 2
+
+    def priority(node):
+        position = node.get("position") or {}
+        x, y = position.get("x", 0), position.get("y", 0)
+        inside = left <= x <= right and top <= y <= bottom
+        return (0 if inside else 1, math.hypot(x - center_x, y - center_y))
+
+    return sorted(nodes, key=priority)
+
+
+def iter_chunks(items: list, size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
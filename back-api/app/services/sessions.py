@@ -0,0 +1,94 @@
+import json
+import time
+import secrets
+from collections import deque
+from typing import Dict, Optional
+
+class ResumableSession:
+    """
+    Server side state of a logged-in websocket session, kept for a grace window after
+    a disconnect so a reconnecting client can resume it instead of logging in again.
+    Keeps the last sequenced messages for replay, at most 'outbox_size' of them and
+    'outbox_max_bytes' of JSON: large replies (file reads, project loads) push the
+    oldest messages out, and a client that missed an evicted one logs in again.
+    """
+    def __init__(self, user_id: str, tier: str, outbox_size: int, outbox_max_bytes: Optional[int] = None):
+        self.token = secrets.token_urlsafe(32)
+        self.user_id = user_id
+        self.tier = tier
+        self.outbox_size = outbox_size
+        self.outbox_max_bytes = outbox_max_bytes
+        self.outbox = deque()
+        self.outbox_sizes = deque()
+        self.outbox_bytes = 0
+        # Highest seq evicted from the outbox: clients behind it can't resume
+        self.evicted_seq = 0
+        self.next_seq = 1
+        self.connection = None
+        self.disconnected_at: Optional[float] = None
+        # Project open in the client: it runs the downstream nodes of that project's triggers
+        self.active_project_id: Optional[str] = None
+
+    def record(self, message: dict) -> tuple:
+        """Sequences and keeps 'message'. Returns it with its JSON, measured here and sent as is."""
+        message = dict(message, seq=self.next_seq)
+        self.next_seq += 1
+        encoded = json.dumps(message, default=str)
+        size = len(encoded)
+        self.outbox.append(message)
+        self.outbox_sizes.append(size)
+        self.outbox_bytes += size
+        while self.outbox and (
+            len(self.outbox) > self.outbox_size
+            or (self.outbox_max_bytes is not None and self.outbox_bytes > self.outbox_max_bytes)
+        ):
+            self.evicted_seq = self.outbox.popleft()["seq"]
+            self.outbox_bytes -= self.outbox_sizes.popleft()
+        return message, encoded
+
+    def missed_since(self, last_seq: int) -> Optional[list]:
+        """Messages newer than 'last_seq', or None if some of them were already dropped from the outbox."""
+        if last_seq < self.evicted_seq:
+            return None
+        return [m for m in self.outbox if m["seq"] > last_seq]
+
+    def attach(self, connection):
+        self.connection = connection
+        self.disconnected_at = None
+
+    def detach(self, connection):
+        if self.connection is connection:
+            self.connection = None
+            self.disconnected_at = time.time()
+
+
+class SessionRegistry:
+    def __init__(self, grace_seconds: float, outbox_size: int, outbox_max_bytes: Optional[int] = None):
+        self.grace_seconds = grace_seconds
+        self.outbox_size = outbox_size
+        self.outbox_max_bytes = outbox_max_bytes
+        self.sessions: Dict[str, ResumableSession] = {}
+
+    def create(self, user_id: str, tier: str) -> ResumableSession:
+        # A user has a single live session: a new login supersedes the previous one
+        for token, session in list(self.sessions.items()):
+            if session.user_id == user_id:
+                del self.sessions[token]
+        session = ResumableSession(user_id, tier, self.outbox_size, self.outbox_max_bytes)
+        self.sessions[session.token] = session
+        return session
+
+    def get(self, token: str) -> Optional[ResumableSession]:
+        session = self.sessions.get(token or "")
+        if session is None:
+            return None
+        if session.disconnected_at is not None and time.time() - session.disconnected_at > self.grace_seconds:
+            del self.sessions[session.token]
+            return None
+        return session
+
+    def purge_expired(self):
+        now = time.time()
+        for token, session in list(self.sessions.items()):
+            if session.disconnected_at is not None and now - session.disconnected_at > self.grace_seconds:
+                del self.sessions[token]
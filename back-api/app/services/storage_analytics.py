@@ -0,0 +1,143 @@
+import os
+import heapq
+import time
+from loguru import logger
+from . import project_index
+from . import project_journal
+from ..core.storage_manager import get_usage_version
+
+STATS_TTL_SECONDS = 60
+TOP_FILES = 10
+
+# user_dir -> (computed_at, usage_version, result)
+_cache = {}
+# user_dir -> (checked_at, sizes per category) of the previous analysis, for growth
+_previous = {}
+
+
+def _category_roots(user_dir: str) -> dict:
+    """Root directory -> category. Python environments exist for the kernel and the package manager."""
+    kernel_data_dir = os.path.join(user_dir, "kernel_data")
+    return {
+        os.path.join(kernel_data_dir, "files"): "files",
+        os.path.join(user_dir, "projects"): "projects",
+        os.path.join(kernel_data_dir, ".states"): "states",
+        os.path.join(kernel_data_dir, ".venv"): "environment",
+        os.path.join(user_dir, ".venv"): "environment",
+    }
+
+
+def _scan(user_dir: str, top_n: int):
+    """
+    One scandir pass over the whole user directory. Returns the size/count per
+    category ('other' for anything outside them), the 'top_n' largest user files
+    and the size of each node state file.
+    """
+    roots = _category_roots(user_dir)
+    totals = {name: {"size": 0, "count": 0} for name in list(roots.values()) + ["other"]}
+    top_files = []
+    state_sizes = {}
+
+    stack = [(user_dir, "other")]
+    while stack:
+        current, category = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append((entry.path, roots.get(entry.path, category)))
+                            continue
+                        if not entry.is_file(follow_symlinks=False):
+                            continue
+                        size = entry.stat(follow_symlinks=False).st_size
+                    except OSError:
+                        continue
+                    totals[category]["size"] += size
+                    totals[category]["count"] += 1
+                    if category == "files":
+                        item = (size, entry.path)
+                        if len(top_files) < top_n:
+                            heapq.heappush(top_files, item)
+                        elif item > top_files[0]:
+                            heapq.heapreplace(top_files, item)
+                    elif category == "states" and entry.name.endswith(".pkl"):
+                        state_sizes[entry.name[:-4]] = size
+        except (FileNotFoundError, NotADirectoryError, PermissionError):
+            continue
+
+    files_dir = os.path.join(user_dir, "kernel_data", "files")
+    top = [{"path": os.path.relpath(path, files_dir), "size": size} for size, path in sorted(top_files, reverse=True)]
+    return totals, top, state_sizes
+
+
+def _node_names(projects_dir: str, node_ids: set) -> dict:
+    """node_id -> {project, node} names, for the nodes that have a saved state."""
+    names = {}
+    if not node_ids or not os.path.isdir(projects_dir):
+        return names
+    # Read-only: the project index belongs to the project store
+    for filename in os.listdir(projects_dir):
+        if not filename.endswith(".json") or filename.startswith(".") or filename == project_index.LEGACY_PROJECT_FILE:
+            continue
+        try:
+            project_data = project_journal.load_project(projects_dir, filename[:-5])
+        except Exception as e:
+            logger.debug(f"Skipping unreadable project {filename}: {e}")
+            continue
+        project_name = (project_data or {}).get("meta", {}).get("name", "Untitled")
+        for node in (project_data or {}).get("nodes", []):
+            if node.get("id") in node_ids:
+                names[node["id"]] = {
+                    "project": project_name,
+                    "node": (node.get("data") or {}).get("title") or node.get("type") or node["id"]
+                }
+        if len(names) == len(node_ids):
+            break
+    return names
+
+
+def analyze(user_dir: str, top_n: int = TOP_FILES, ttl: float = STATS_TTL_SECONDS) -> dict:
+    """
+    Storage analytics of a user directory (blocking: run it in a thread). Results are
+    cached for 'ttl' seconds, and dropped as soon as a write changes the directory.
+    """
+    version = get_usage_version(user_dir)
+    cached = _cache.get(user_dir)
+    now = time.time()
+    if cached and cached[1] == version and now - cached[0] < ttl:
+        return dict(cached[2], cached=True)
+
+    totals, top_files, state_sizes = _scan(user_dir, top_n)
+    names = _node_names(os.path.join(user_dir, "projects"), set(state_sizes))
+    node_states = sorted(
+        (
+            {"node_id": node_id, "size": size, **names.get(node_id, {"project": None, "node": None})}
+            for node_id, size in state_sizes.items()
+        ),
+        key=lambda state: state["size"],
+        reverse=True
+    )
+
+    sizes = {name: total["size"] for name, total in totals.items()}
+    previous = _previous.get(user_dir)
+    growth = None
+    if previous:
+        growth = {
+            "since": previous[0],
+            "total": sum(sizes.values()) - sum(previous[1].values()),
+            "categories": {name: size - previous[1].get(name, 0) for name, size in sizes.items()}
+        }
+    _previous[user_dir] = (now, sizes)
+
+    result = {
+        "total_size": sum(sizes.values()),
+        "categories": totals,
+        "top_files": top_files,
+        "node_states": node_states,
+        "growth": growth,
+        "computed_at": now,
+        "cached": False
+    }
+    _cache[user_dir] = (now, version, result)
+    return result
@@ -0,0 +1,180 @@
+"""
+Ranged reads of text files of any size: byte ranges, line ranges and tails. Byte
+ranges and tails only read what they return, so their cost doesn't depend on the
+size of the file.
+
+Line access goes through a sparse index: the number of newlines before each
+INDEX_BLOCK_BYTES block, counted in C with bytes.count. It is built lazily, only as
+far as the lines asked for, and cached per file until its size or mtime changes.
+A line is then found by jumping to its block and scanning that block only.
+"""
+
+import os
+import mmap
+import codecs
+import bisect
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+INDEX_BLOCK_BYTES = 64 * 1024
+MAX_CACHED_INDEXES = 32
+
+
+class _LineIndex:
+    def __init__(self, size: int, mtime_ns: int):
+        self.size = size
+        self.mtime_ns = mtime_ns
+        # newlines_before[i]: newlines in the bytes before block i
+        self.newlines_before = [0]
+        # Whether the file ends with a line that has no newline
+        self.unterminated = False
+        self.lock = threading.Lock()
+
+    @property
+    def complete(self) -> bool:
+        return (len(self.newlines_before) - 1) * INDEX_BLOCK_BYTES >= self.size
+
+    def total_lines(self) -> Optional[int]:
+        """Number of lines, once the whole file is indexed."""
+        if not self.complete:
+            return None
+        return self.newlines_before[-1] + (1 if self.unterminated else 0)
+
+    def extend(self, mm, until_newlines: int):
+        """Indexes blocks until 'until_newlines' newlines are covered or the file ends."""
+        while not self.complete and self.newlines_before[-1] <= until_newlines:
+            start = (len(self.newlines_before) - 1) * INDEX_BLOCK_BYTES
+            block = mm[start:start + INDEX_BLOCK_BYTES]
+            self.newlines_before.append(self.newlines_before[-1] + block.count(b"\n"))
+            if self.complete:
+                self.unterminated = not block.endswith(b"\n")
+
+
+_indexes: "OrderedDict[str, _LineIndex]" = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def _get_index(path: str, stat) -> _LineIndex:
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is None or index.size != stat.st_size or index.mtime_ns != stat.st_mtime_ns:
+            index = _LineIndex(stat.st_size, stat.st_mtime_ns)
+            _indexes[path] = index
+        _indexes.move_to_end(path)
+        while len(_indexes) > MAX_CACHED_INDEXES:
+            _indexes.popitem(last=False)
+        return index
+
+
+def _decode(data: bytes, final: bool):
+    """Decodes UTF-8 without cutting a character in half. Returns (text, bytes consumed)."""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    text = decoder.decode(data, final=final)
+    return text, len(data) - len(decoder.getstate()[0])
+
+
+def read_bytes(path: str, offset: int, length: int) -> dict:
+    size = os.path.getsize(path)
+    offset = max(0, min(offset, size))
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read(length)
+    text, consumed = _decode(data, final=offset + len(data) >= size)
+    return {"content": text, "offset": offset, "next_offset": offset + consumed, "size": size, "eof": offset + consumed >= size}
+
+
+def _line_start(mm, index: _LineIndex, line: int) -> Optional[int]:
+    """Byte offset of 'line' (0-based), or None past the end of the file."""
+    if line == 0:
+        return 0
+    with index.lock:
+        index.extend(mm, line)
+        blocks = index.newlines_before
+        if blocks[-1] < line:
+            return None
+        # Last block starting before the line-th newline
+        block = bisect.bisect_left(blocks, line) - 1
+        remaining = line - blocks[block]
+    position = block * INDEX_BLOCK_BYTES - 1
+    for _ in range(remaining):
+        position = mm.find(b"\n", position + 1)
+    return position + 1 if position + 1 < index.size else None
+
+
+def read_lines(path: str, start_line: int, count: int, max_bytes: int) -> dict:
+    stat = os.stat(path)
+    size = stat.st_size
+    start_line = max(0, start_line)
+    if size == 0:
+        return {"lines": [], "start_line": start_line, "size": 0, "eof": True, "truncated": False, "total_lines": 0}
+
+    index = _get_index(path, stat)
+    lines = []
+    truncated = False
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        start = _line_start(mm, index, start_line)
+        position = start
+        while position is not None and position < size and len(lines) < count:
+            limit = min(size, position + max_bytes)
+            end = mm.find(b"\n", position, limit)
+            if end == -1 and limit < size:
+                # The line doesn't fit in 'max_bytes': it ends the page, cut if it is alone
+                if not lines:
+                    lines.append(_decode(mm[position:limit], final=True)[0])
+                    truncated = True
+                break
+            line_end = size if end == -1 else end
+            if lines and line_end - start > max_bytes:
+                break
+            lines.append(_decode(mm[position:line_end], final=True)[0].rstrip("\r"))
+            position = line_end + 1
+    with index.lock:
+        total_lines = index.total_lines()
+    return {
+        "lines": lines,
+        "start_line": start_line,
+        "size": size,
+        "eof": not truncated and (position is None or position >= size),
+        "truncated": truncated,
+        "total_lines": total_lines
+    }
+
+
+def read_tail(path: str, count: int, max_bytes: int) -> dict:
+    """The last 'count' lines, read backwards from the end of the file."""
+    size = os.path.getsize(path)
+    if size == 0:
+        # No lines, as read_lines counts them
+        return {"lines": [], "offset": 0, "size": 0}
+    with open(path, "rb") as f:
+        end = size
+        # A trailing newline ends the last line, it doesn't start a new one
+        if size:
+            f.seek(size - 1)
+            if f.read(1) == b"\n":
+                end -= 1
+        start = end
+        newlines = 0
+        # One newline more than the lines asked for bounds the first of them
+        while start > 0 and newlines <= count and end - start < max_bytes:
+            step = min(INDEX_BLOCK_BYTES, start)
+            f.seek(start - step)
+            newlines += f.read(step).count(b"\n")
+            start -= step
+        f.seek(start)
+        data = f.read(end - start)
+
+    parts = data.split(b"\n")
+    if start > 0 and len(parts) > 1:
+        # Partial first line
+        parts = parts[1:]
+    parts = parts[-count:] if count > 0 else []
+    while len(parts) > 1 and sum(len(part) + 1 for part in parts) > max_bytes:
+        parts.pop(0)
+    first_offset = end - (sum(len(part) for part in parts) + len(parts) - 1) if parts else end
+    return {
+        "lines": [_decode(part, final=True)[0].rstrip("\r") for part in parts],
+        "offset": first_offset,
+        "size": size
+    }
@@ -0,0 +1,259 @@
+"""
+Chunked, resumable transfers between clients and their files directory.
+
+Uploads go to <user_dir>/.transfers/<id>.part, next to a small <id>.json manifest,
+so they outlive reconnects and restarts: a client resuming a transfer asks for the
+offset already on disk and sends the missing chunks. Finished uploads are moved
+into place with os.replace. Downloads are pulled chunk by chunk by the client,
+which resumes by asking for its next offset again.
+Chunks carry a sha256 checksum and are never assembled in memory.
+
+An upload reserves its size against the user's quota when it starts (see
+storage_manager.reserve_usage), its chunks use up the reservation, and what is left
+is released when it finishes or is cancelled.
+"""
+
+import os
+import json
+import time
+import base64
+import asyncio
+import hashlib
+import secrets
+from typing import Dict, Optional
+from loguru import logger
+from .project_index import write_json_atomic
+from ..core.config import TRANSFER_CHUNK_BYTES, TRANSFER_TTL
+from ..core.storage_manager import record_usage_delta, reserve_usage, use_reservation, release_usage
+
+QUOTA_ERROR = "STORAGE_QUOTA_EXCEEDED"
+
+TRANSFERS_DIRNAME = ".transfers"
+
+
+class TransferError(Exception):
+    """A transfer request that can't be served. 'offset' tells the client where to resume."""
+    def __init__(self, message: str, offset: Optional[int] = None):
+        super().__init__(message)
+        self.offset = offset
+
+
+def chunk_checksum(chunk: bytes) -> str:
+    return hashlib.sha256(chunk).hexdigest()
+
+
+def _check_id(transfer_id) -> str:
+    if not isinstance(transfer_id, str) or len(transfer_id) != 32 or not all(c in "0123456789abcdef" for c in transfer_id):
+        raise TransferError("Invalid transfer id")
+    return transfer_id
+
+
+class _Download:
+    def __init__(self, user_dir: str, path: str, target: str, size: int, mtime_ns: int):
+        self.user_dir = user_dir
+        self.path = path
+        self.target = target
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.last_used = time.time()
+
+
+class TransferManager:
+    def __init__(self, chunk_bytes: int = TRANSFER_CHUNK_BYTES):
+        self.chunk_bytes = chunk_bytes
+        self.downloads: Dict[str, _Download] = {}
+
+    @staticmethod
+    def _paths(user_dir: str, transfer_id: str):
+        transfers_dir = os.path.join(user_dir, TRANSFERS_DIRNAME)
+        return os.path.join(transfers_dir, f"{transfer_id}.part"), os.path.join(transfers_dir, f"{transfer_id}.json")
+
+    def _manifest(self, user_dir: str, transfer_id: str) -> dict:
+        _, manifest_path = self._paths(user_dir, _check_id(transfer_id))
+        try:
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            raise TransferError("Unknown transfer")
+
+    # --- Uploads ---
+
+    def _start_upload(self, user_dir: str, path: str, size: int, transfer_id: Optional[str],
+                      reserve_bytes: Optional[int] = None, limit_bytes: Optional[int] = None) -> dict:
+        if transfer_id:
+            manifest = self._manifest(user_dir, transfer_id)
+            if manifest["path"] != path or manifest["size"] != size:
+                raise TransferError("Transfer does not match this file")
+            part_path, _ = self._paths(user_dir, transfer_id)
+            offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+            # Reservations don't survive restarts: the rest of the upload is reserved again,
+            # its chunks are still checked against the quota
+            reserve_usage(user_dir, transfer_id, size - offset)
+            return {"transfer_id": transfer_id, "offset": offset, "chunk_size": self.chunk_bytes}
+
+        transfer_id = secrets.token_hex(16)
+        if not reserve_usage(user_dir, transfer_id, size if reserve_bytes is None else reserve_bytes, limit_bytes):
+            raise TransferError(QUOTA_ERROR)
+        part_path, manifest_path = self._paths(user_dir, transfer_id)
+        try:
+            os.makedirs(os.path.dirname(part_path), exist_ok=True)
+            open(part_path, "wb").close()
+            write_json_atomic(manifest_path, {"path": path, "size": size, "created_at": time.time()})
+        except OSError:
+            release_usage(user_dir, transfer_id)
+            raise
+        return {"transfer_id": transfer_id, "offset": 0, "chunk_size": self.chunk_bytes}
+
+    def _write_chunk(self, user_dir: str, transfer_id: str, offset: int, data: str, checksum: str,
+                     limit_bytes: Optional[int] = None) -> int:
+        manifest = self._manifest(user_dir, transfer_id)
+        part_path, _ = self._paths(user_dir, transfer_id)
+        try:
+            received = os.path.getsize(part_path)
+        except FileNotFoundError:
+            raise TransferError("Unknown transfer")
+        if offset != received:
+            raise TransferError(f"Expected offset {received}", offset=received)
+
+        chunk = base64.b64decode(data)
+        if len(chunk) > self.chunk_bytes:
+            raise TransferError(f"Chunk larger than {self.chunk_bytes} bytes", offset=received)
+        if received + len(chunk) > manifest["size"]:
+            raise TransferError("Chunk goes past the announced size", offset=received)
+        if chunk_checksum(chunk) != checksum:
+            raise TransferError("Checksum mismatch", offset=received)
+        if not use_reservation(user_dir, transfer_id, len(chunk), limit_bytes):
+            # No offset: retrying can't help
+            raise TransferError(QUOTA_ERROR)
+
+        try:
+            with open(part_path, "ab") as f:
+                f.write(chunk)
+        except OSError:
+            record_usage_delta(user_dir, -len(chunk))
+            raise
+        return received + len(chunk)
+
+    def _finish_upload(self, user_dir: str, transfer_id: str, target: str) -> int:
+        manifest = self._manifest(user_dir, transfer_id)
+        part_path, manifest_path = self._paths(user_dir, transfer_id)
+        received = os.path.getsize(part_path)
+        if received != manifest["size"]:
+            raise TransferError(f"Incomplete transfer ({received}/{manifest['size']} bytes)", offset=received)
+
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(part_path, target)
+        os.remove(manifest_path)
+        release_usage(user_dir, transfer_id)
+        # The bytes left the transfers directory: the files directory accounts for them now
+        record_usage_delta(user_dir, -received)
+        return received
+
+    def _cancel_upload(self, user_dir: str, transfer_id: str):
+        part_path, manifest_path = self._paths(user_dir, _check_id(transfer_id))
+        try:
+            freed_bytes = os.path.getsize(part_path)
+            os.remove(part_path)
+        except FileNotFoundError:
+            freed_bytes = 0
+        try:
+            os.remove(manifest_path)
+        except FileNotFoundError:
+            pass
+        release_usage(user_dir, transfer_id)
+        record_usage_delta(user_dir, -freed_bytes)
+
+    async def start_upload(self, user_dir: str, path: str, size: int, transfer_id: Optional[str] = None,
+                           reserve_bytes: Optional[int] = None, limit_bytes: Optional[int] = None) -> dict:
+        """
+        Starts an upload of 'size' bytes to 'path', or tells where to resume 'transfer_id'.
+        A new upload reserves 'reserve_bytes' (default: 'size') and fails if that goes over 'limit_bytes'.
+        """
+        return await asyncio.to_thread(self._start_upload, user_dir, path, size, transfer_id, reserve_bytes, limit_bytes)
+
+    async def write_chunk(self, user_dir: str, transfer_id: str, offset: int, data: str, checksum: str,
+                          limit_bytes: Optional[int] = None) -> int:
+        """Appends a base64 chunk that must start at the current end of the upload. Returns the new offset."""
+        return await asyncio.to_thread(self._write_chunk, user_dir, transfer_id, offset, data, checksum, limit_bytes)
+
+    async def finish_upload(self, user_dir: str, transfer_id: str, target: str) -> int:
+        """Moves a complete upload to its resolved 'target'. Returns the file size."""
+        return await asyncio.to_thread(self._finish_upload, user_dir, transfer_id, target)
+
+    async def cancel_upload(self, user_dir: str, transfer_id: str):
+        await asyncio.to_thread(self._cancel_upload, user_dir, transfer_id)
+
+    def upload_path(self, user_dir: str, transfer_id: str) -> str:
+        """Destination path (relative to the files directory) of an upload."""
+        return self._manifest(user_dir, transfer_id)["path"]
+
+    # --- Downloads ---
+
+    def start_download(self, user_dir: str, path: str, target: str) -> dict:
+        if not os.path.isfile(target):
+            raise TransferError("Not a file")
+        stat = os.stat(target)
+        transfer_id = secrets.token_hex(16)
+        self.downloads[transfer_id] = _Download(user_dir, path, target, stat.st_size, stat.st_mtime_ns)
+        return {"transfer_id": transfer_id, "path": path, "size": stat.st_size, "chunk_size": self.chunk_bytes}
+
+    def _read_chunk(self, download: _Download, offset: int) -> dict:
+        try:
+            stat = os.stat(download.target)
+        except FileNotFoundError:
+            raise TransferError("File was deleted")
+        if stat.st_size != download.size or stat.st_mtime_ns != download.mtime_ns:
+            raise TransferError("File changed since the download started")
+        if offset < 0 or offset > download.size:
+            raise TransferError("Invalid offset")
+
+        with open(download.target, "rb") as f:
+            f.seek(offset)
+            chunk = f.read(self.chunk_bytes)
+        return {
+            "offset": offset,
+            "data": base64.b64encode(chunk).decode("ascii"),
+            "checksum": chunk_checksum(chunk),
+            "eof": offset + len(chunk) >= download.size
+        }
+
+    async def read_chunk(self, user_dir: str, transfer_id: str, offset: int) -> dict:
+        """The chunk starting at 'offset' of a download. Kept until it expires, so the last chunk can be asked again."""
+        download = self.downloads.get(transfer_id)
+        if download is None or download.user_dir != user_dir:
+            raise TransferError("Unknown transfer")
+        download.last_used = time.time()
+        return await asyncio.to_thread(self._read_chunk, download, offset)
+
+    # --- Cleanup ---
+
+    def purge_expired(self, user_dirs: list, ttl: float = TRANSFER_TTL) -> int:
+        """Drops downloads and partial uploads untouched for 'ttl' seconds (blocking: run it in a thread)."""
+        now = time.time()
+        purged = 0
+        for transfer_id, download in list(self.downloads.items()):
+            if now - download.last_used > ttl:
+                del self.downloads[transfer_id]
+                purged += 1
+
+        for user_dir in user_dirs:
+            transfers_dir = os.path.join(user_dir, TRANSFERS_DIRNAME)
+            try:
+                names = os.listdir(transfers_dir)
+            except FileNotFoundError:
+                continue
+            for name in names:
+                if not name.endswith(".part"):
+                    continue
+                try:
+                    # Appends refresh the mtime: an untouched .part is abandoned
+                    if now - os.path.getmtime(os.path.join(transfers_dir, name)) <= ttl:
+                        continue
+                    self._cancel_upload(user_dir, name[:-5])
+                    purged += 1
+                except (OSError, TransferError) as e:
+                    logger.warning(f"Failed to purge transfer {name}: {e}")
+        return purged
+
+
+transfer_manager = TransferManager()
@@ -1,17 +1,77 @@
 import asyncio
+import heapq
+import itertools
 import json
 import os
+import time
+import random
 import cloudpickle as pickle
-from typing import Callable, Dict, Any
+from datetime import datetime, timezone
+from typing import Callable, Dict, Any, Optional
 from loguru import logger
-from ..core.config import STORAGE_DIR
+from sqlalchemy import bindparam
+from ..core.config import STORAGE_DIR, TRIGGER_MISFIRE_POLICY, TRIGGER_MISFIRE_MAX_FIRES, TRIGGER_MISFIRE_SPACING, TRIGGER_STARTUP_JITTER
 from ..core.database import SessionLocal
+from ..core.metrics import metrics
 from ..models.trigger import Trigger
+from .trigger_runner import trigger_runner
+
+# Due timers fired together per batch
+FIRE_BATCH_SIZE = 256
+# Longest sleep of the scheduler, so wall clock jumps are caught up on
+MAX_SCHEDULER_SLEEP = 60.0
+MISFIRE_POLICIES = ("skip", "fire_once", "fire_all")
+
+def _to_datetime(timestamp: Optional[float]) -> Optional[datetime]:
+    return datetime.fromtimestamp(timestamp, timezone.utc) if timestamp is not None else None
+
+def _to_timestamp(value: Optional[datetime]) -> Optional[float]:
+    if value is None:
+        return None
+    # SQLite gives back naive datetimes: they are UTC
+    return (value if value.tzinfo else value.replace(tzinfo=timezone.utc)).timestamp()
+
+class _Timer:
+    def __init__(self, user_id: str, project_id: str, node_type: str, config: dict, scheduler):
+        self.user_id = user_id
+        self.project_id = project_id
+        self.node_type = node_type
+        self.config = config
+        self.scheduler = scheduler
+        self.next_fire: Optional[float] = None
+        self.last_fired: Optional[float] = None
+        # Missed fires still to replay after the current one
+        self.catchup = 0
+        # Heap entries of an older generation are stale and skipped
+        self.generation = 0
+        # Deleted or replaced: a fire already due is dropped
+        self.cancelled = False
 
 class TriggerManager:
+    """
+    Runs active triggers. Time-based node types register a scheduler: a function
+    giving the next fire time of a trigger, which a single task serves for all of
+    them from a min-heap, firing what is due in batches. Other node types register
+    a handler, run as one task per trigger.
+
+    Next and last fire times are saved on the Trigger rows, so a restart resumes the
+    schedule. Fires missed while the server was down follow the misfire policy
+    (config 'misfirePolicy' of the trigger, else trigger_misfire_policy): skip them,
+    fire once, or fire each of them up to trigger_misfire_max_fires. Catch-up fires
+    are spread over trigger_startup_jitter_seconds.
+    """
     def __init__(self):
         self.handlers: Dict[str, Callable] = {}
+        self.schedulers: Dict[str, tuple] = {}
         self.active_tasks: Dict[str, asyncio.Task] = {}
+        self.task_owners: Dict[str, str] = {}
+        self.timers: Dict[str, _Timer] = {}
+        self.heap: list = []
+        self.sequence = itertools.count()
+        self.scheduler_task: Optional[asyncio.Task] = None
+        self.wakeup: Optional[asyncio.Event] = None
+        # node_id -> (next_fire, last_fired) not saved yet
+        self.unsaved: Dict[str, tuple] = {}
         self.user_manager = None
 
     def set_user_manager(self, user_manager):
@@ -20,6 +80,13 @@ class TriggerManager:
     def register_handler(self, node_type: str, handler_func: Callable):
         self.handlers[node_type.lower()] = handler_func
 
+    def register_scheduler(self, node_type: str, next_fire: Callable, output: Callable = None):
+        """
+        next_fire(config, after, last_fired) -> UNIX time of the first fire after 'after',
+        or None when the trigger is done. output(config) -> fields added to the fired payload.
+        """
+        self.schedulers[node_type.lower()] = (next_fire, output)
+
     async def initialize(self, user_manager=None):
         if user_manager:
             self.user_manager = user_manager
@@ -28,7 +95,10 @@ class TriggerManager:
         try:
             active_triggers = db.query(Trigger).filter(Trigger.is_active == True).all()
             for trigger in active_triggers:
-                self._schedule_trigger_task(trigger.id, trigger.user_id, trigger.project_id, trigger.node_type, trigger.config)
+                if trigger.node_type.lower() in self.schedulers:
+                    self._restore_timer(trigger)
+                else:
+                    self._schedule_trigger_task(trigger.id, trigger.user_id, trigger.project_id, trigger.node_type, trigger.config)
         except Exception as e:
             logger.error(f"Failed to load active triggers on startup: {e}")
         finally:
@@ -36,7 +106,14 @@ class TriggerManager:
 
     def _schedule_trigger_task(self, node_id: str, user_id: str, project_id: str, node_type: str, config: dict):
         self._cancel_trigger_task(node_id)
-        
+
+        scheduler = self.schedulers.get(node_type.lower())
+        if scheduler:
+            timer = _Timer(user_id, project_id, node_type, config, scheduler)
+            self.timers[node_id] = timer
+            self._plan(node_id, timer, time.time())
+            return
+
         handler = self.handlers.get(node_type.lower())
         if not handler:
             return
@@ -50,13 +127,206 @@ class TriggerManager:
                 logger.error(f"Error in trigger task for node {node_id}: {e}")
 
         self.active_tasks[node_id] = asyncio.create_task(run_wrapper())
+        self.task_owners[node_id] = user_id
+
+    def _restore_timer(self, trigger: Trigger):
+        """Schedules a saved timer from its saved fire times, catching up on missed fires."""
+        config = trigger.config
+        timer = _Timer(trigger.user_id, trigger.project_id, trigger.node_type, config, self.schedulers[trigger.node_type.lower()])
+        timer.last_fired = _to_timestamp(trigger.last_fired_at)
+        self.timers[trigger.id] = timer
+        now = time.time()
+        next_fire = _to_timestamp(trigger.next_fire_at)
+        if next_fire is None:
+            self._plan(trigger.id, timer, now)
+            return
+        if next_fire > now:
+            self._push(trigger.id, timer, next_fire)
+            return
+
+        policy = config.get("misfirePolicy") or TRIGGER_MISFIRE_POLICY
+        if policy not in MISFIRE_POLICIES:
+            policy = "fire_once"
+        missed = self._count_missed(timer, next_fire, now) if policy == "fire_all" else 1
+        logger.info(f"Trigger {trigger.id} missed its fire at {trigger.next_fire_at} (policy {policy})")
+        metrics.increment("triggers.misfired")
+        if policy == "skip":
+            self._plan(trigger.id, timer, now)
+            return
+        timer.catchup = missed - 1
+        # Spread out so a restart doesn't fire every overdue trigger at once
+        self._push(trigger.id, timer, now + random.uniform(0, TRIGGER_STARTUP_JITTER))
+
+    @staticmethod
+    def _count_missed(timer: _Timer, first: float, now: float) -> int:
+        next_fire, _ = timer.scheduler
+        missed = 0
+        fire_at = first
+        while fire_at is not None and fire_at <= now and missed < TRIGGER_MISFIRE_MAX_FIRES:
+            missed += 1
+            try:
+                fire_at = next_fire(timer.config, fire_at, fire_at)
+            except Exception:
+                break
+        return max(missed, 1)
 
     def _cancel_trigger_task(self, node_id: str):
+        # Its heap entry is skipped once the timer is gone
+        timer = self.timers.pop(node_id, None)
+        if timer:
+            timer.cancelled = True
+        self.task_owners.pop(node_id, None)
         task = self.active_tasks.pop(node_id, None)
         if task and not task.done():
             task.cancel()
 
+    # --- Timer scheduling ---
+
+    def _plan(self, node_id: str, timer: _Timer, after: float):
+        """Pushes the next fire of 'timer', or drops it if its scheduler says it is done."""
+        next_fire, _ = timer.scheduler
+        try:
+            timer.next_fire = next_fire(timer.config, after, timer.last_fired)
+        except Exception as e:
+            logger.error(f"Failed to compute the next fire time of trigger {node_id}: {e}")
+            timer.next_fire = None
+        if timer.next_fire is None:
+            self.timers.pop(node_id, None)
+            self.unsaved[node_id] = (None, timer.last_fired)
+            self._ensure_scheduler()
+            self.wakeup.set()
+            return
+        self._push(node_id, timer, timer.next_fire)
+
+    def _push(self, node_id: str, timer: _Timer, fire_at: float):
+        timer.next_fire = fire_at
+        timer.generation += 1
+        self.unsaved[node_id] = (fire_at, timer.last_fired)
+        if len(self.heap) > 2 * len(self.timers) + 64:
+            self._compact()
+        was_first = not self.heap or fire_at < self.heap[0][0]
+        heapq.heappush(self.heap, (fire_at, next(self.sequence), node_id, timer.generation))
+        self._ensure_scheduler()
+        if was_first:
+            self.wakeup.set()
+
+    def _compact(self):
+        """Rebuilds the heap without the entries of cancelled or rescheduled timers."""
+        self.heap = [entry for entry in self.heap if self._is_current(entry)]
+        heapq.heapify(self.heap)
+
+    def _is_current(self, entry: tuple) -> bool:
+        timer = self.timers.get(entry[2])
+        return timer is not None and timer.generation == entry[3]
+
+    def _ensure_scheduler(self):
+        loop = asyncio.get_running_loop()
+        if self.scheduler_task is None or self.scheduler_task.done() or self.scheduler_task.get_loop() is not loop:
+            self.wakeup = asyncio.Event()
+            self.scheduler_task = asyncio.create_task(self._scheduler_loop())
+
+    def _save_fire_times(self, unsaved: dict):
+        """Writes next/last fire times in one statement (blocking: run it in a thread)."""
+        table = Trigger.__table__
+        statement = table.update().where(table.c.id == bindparam("node_id")).values(
+            next_fire_at=bindparam("next_fire"),
+            last_fired_at=bindparam("last_fired"),
+            # Scheduling isn't an update of the trigger
+            updated_at=table.c.updated_at
+        )
+        rows = [
+            {"node_id": node_id, "next_fire": _to_datetime(next_fire), "last_fired": _to_datetime(last_fired)}
+            for node_id, (next_fire, last_fired) in unsaved.items()
+        ]
+        db = SessionLocal()
+        try:
+            db.execute(statement, rows)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Failed to save the fire times of {len(rows)} triggers: {e}")
+        finally:
+            db.close()
+
+    async def _flush_fire_times(self):
+        if self.unsaved:
+            unsaved, self.unsaved = self.unsaved, {}
+            await asyncio.to_thread(self._save_fire_times, unsaved)
+
+    async def _scheduler_loop(self):
+        while True:
+            await self._flush_fire_times()
+            while self.heap and not self._is_current(self.heap[0]):
+                heapq.heappop(self.heap)
+            if not self.heap:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+
+            delay = self.heap[0][0] - time.time()
+            if delay > 0:
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout=min(delay, MAX_SCHEDULER_SLEEP))
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            now = time.time()
+            due = []
+            while self.heap and self.heap[0][0] <= now and len(due) < FIRE_BATCH_SIZE:
+                entry = heapq.heappop(self.heap)
+                if self._is_current(entry):
+                    due.append((entry[2], self.timers[entry[2]]))
+            for node_id, timer in due:
+                timer.last_fired = now
+                if timer.catchup > 0:
+                    timer.catchup -= 1
+                    self._push(node_id, timer, now + TRIGGER_MISFIRE_SPACING)
+                else:
+                    self._plan(node_id, timer, max(timer.next_fire, now))
+            metrics.increment("triggers.fired", len(due))
+            await asyncio.gather(*(self._fire_timer(node_id, timer) for node_id, timer in due))
+
+    async def _fire_timer(self, node_id: str, timer: _Timer):
+        if timer.cancelled:
+            return
+        _, output = timer.scheduler
+        try:
+            payload = {"timestamp": datetime.now(timezone.utc).isoformat()}
+            if output:
+                payload.update(output(timer.config))
+            await self.fire_trigger(timer.user_id, timer.project_id, node_id, payload)
+        except Exception as e:
+            logger.error(f"Error firing trigger {node_id}: {e}")
+
+    async def stop(self):
+        await trigger_runner.stop()
+        if self.scheduler_task and not self.scheduler_task.done():
+            self.scheduler_task.cancel()
+            try:
+                await self.scheduler_task
+            except asyncio.CancelledError:
+                pass
+        self.scheduler_task = None
+        await self._flush_fire_times()
+
+    def has_active_triggers(self, user_id: str) -> bool:
+        if any(timer.user_id == user_id for timer in self.timers.values()):
+            return True
+        for node_id, owner in self.task_owners.items():
+            task = self.active_tasks.get(node_id)
+            if owner == user_id and task and not task.done():
+                return True
+        return False
+
     async def update_trigger(self, user_id: str, project_id: str, node_id: str, node_type: str, is_active: bool, config: dict):
+        timer = self.timers.get(node_id)
+        # Same trigger saved again (e.g. the node was moved): its schedule goes on
+        unchanged = (
+            is_active and timer is not None and timer.config == (config or {})
+            and timer.node_type == node_type and timer.project_id == project_id and timer.user_id == user_id
+        )
         db = SessionLocal()
         try:
             trigger = db.query(Trigger).filter(Trigger.id == node_id).first()
@@ -76,6 +346,9 @@ class TriggerManager:
                 trigger.node_type = node_type
                 trigger.is_active = is_active
                 trigger.config_json = json.dumps(config or {})
+                if not unchanged:
+                    trigger.next_fire_at = None
+                    trigger.last_fired_at = None
             
             db.commit()
         except Exception as e:
@@ -85,6 +358,8 @@ class TriggerManager:
         finally:
             db.close()
 
+        if unchanged:
+            return
         if is_active:
             self._schedule_trigger_task(node_id, user_id, project_id, node_type, config)
         else:
@@ -122,7 +397,8 @@ class TriggerManager:
         output_payload = output_data or {}
         
         try:
-            state_dir = os.path.join(STORAGE_DIR, "users", user_id, ".states")
+            # Where the kernel loads node states from
+            state_dir = os.path.join(STORAGE_DIR, "users", user_id, "kernel_data", ".states")
             os.makedirs(state_dir, exist_ok=True)
             state_file = os.path.join(state_dir, f"{node_id}.pkl")
             
@@ -141,13 +417,18 @@ class TriggerManager:
             return
 
         conn = self.user_manager.active_connections.get(user_id)
-        if conn and conn.is_open():
+        connected = bool(conn and conn.is_open())
+        if connected:
             payload = {
                 "action": "trigger_fired",
                 "project_id": project_id,
                 "node_id": node_id,
                 "output": output_payload
             }
-            await conn.websocket.send_json(payload)
+            await conn.send_json(payload)
+
+        # A client with the project open runs the downstream nodes itself; otherwise the server does
+        if not (connected and conn.session is not None and conn.session.active_project_id == project_id):
+            await trigger_runner.submit(self.user_manager, user_id, project_id, node_id)
 
 trigger_manager = TriggerManager()
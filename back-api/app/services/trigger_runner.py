@@ -0,0 +1,329 @@
+"""
+Runs the nodes downstream of a fired trigger on the server, in the user's kernel,
+when no browser has the trigger's project open (an open project runs them itself,
+from its FlowContext queue).
+
+The run follows the browser's rules: the targets of the trigger run, then the
+auto-triggered targets of every node that finished, once all their inputs are
+ready. An input is ready when its node finished in this run, or when it isn't
+part of the run and has a saved state. Each node runs at most once per run.
+
+Every run writes a log, with the status, output and error of each node, to
+<user_dir>/trigger_runs/<run_id>.json; the last TRIGGER_RUN_LOG_KEEP are kept.
+"""
+
+import os
+import json
+import time
+import asyncio
+import secrets
+from collections import defaultdict, deque
+from datetime import datetime, timezone
+from typing import Dict, Optional
+from loguru import logger
+from .project_store import project_store
+from .project_index import write_json_atomic
+from ..core.config import TRIGGER_RUNNER_MAX_CONCURRENT, TRIGGER_RUN_LOG_KEEP
+from ..core.database import SessionLocal
+from ..core.metrics import metrics
+from ..core.node_registry import node_registry
+from ..core.tier_manager import get_tier_config
+from ..core.storage_manager import check_user_quota_async, get_user_dir, mark_usage_stale
+from ..models.user import User
+
+RUN_LOG_DIRNAME = "trigger_runs"
+MAX_LOGGED_OUTPUT = 4096
+
+
+def execution_timeout(node_type: str, tier: str) -> Optional[float]:
+    """Timeout of a node run: the node type's own, capped by the tier's execution_timeout."""
+    timeout = node_registry.get_timeout(node_type)
+    tier_timeout = get_tier_config(tier).get("execution_timeout")
+    if tier_timeout is not None and (timeout is None or tier_timeout < timeout):
+        timeout = tier_timeout
+    return timeout
+
+
+def build_variables(node: dict, edges: list, nodes: dict) -> list:
+    """Variables of a node run, from its incoming edges (same mapping as the browser's buildVariables)."""
+    variables = []
+    inputs = node.get("data", {}).get("inputs") or []
+    for edge in edges:
+        if edge.get("target") != node["id"]:
+            continue
+        source = nodes.get(edge.get("source"))
+        if source is None:
+            continue
+        target_input = next((i for i in inputs if i.get("id") == edge.get("targetHandle")), None)
+        if target_input is None:
+            continue
+        outputs = source.get("data", {}).get("outputs") or []
+        output = next((o for o in outputs if o.get("id") == edge.get("sourceHandle")), None)
+        if output is None and len(outputs) == 1:
+            output = outputs[0]
+        if output is not None:
+            variables.append({"source": source["id"], "name": output.get("name"), "target": target_input.get("name")})
+    return variables
+
+
+def _node_code(node: dict, nodes: dict) -> Optional[str]:
+    data = node.get("data", {})
+    master = nodes.get(data.get("masterId")) if data.get("masterId") else None
+    if master is not None:
+        return master.get("data", {}).get("code") or ""
+    return data.get("code")
+
+
+def _is_auto_trigger(node: dict) -> bool:
+    auto_trigger = node.get("data", {}).get("autoTrigger")
+    if auto_trigger is not None:
+        return bool(auto_trigger)
+    return node_registry.is_auto_trigger(node.get("type"))
+
+
+def _db_user_tier(user_id: str) -> str:
+    """Tier of a user from the database (blocking: run it in a thread)."""
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.id == user_id).first()
+        return user.tier if user else "default"
+    finally:
+        db.close()
+
+
+async def _user_tier(user_manager, user_id: str) -> str:
+    proxy = user_manager.users.get(user_id)
+    if proxy is not None:
+        return proxy.tier
+    return await asyncio.to_thread(_db_user_tier, user_id)
+
+
+def _new_run_id() -> str:
+    # Sortable by start time
+    return f"{int(time.time() * 1000):013d}-{secrets.token_hex(4)}"
+
+
+class _Graph:
+    def __init__(self, project: dict, trigger_id: str):
+        self.nodes = {node["id"]: node for node in project.get("nodes", []) if "id" in node}
+        self.edges = [edge for edge in project.get("edges", []) if edge.get("source") in self.nodes and edge.get("target") in self.nodes]
+        self.trigger_id = trigger_id
+        self.targets = defaultdict(list)
+        self.sources = defaultdict(set)
+        for edge in self.edges:
+            if edge["target"] not in self.targets[edge["source"]]:
+                self.targets[edge["source"]].append(edge["target"])
+            self.sources[edge["target"]].add(edge["source"])
+
+        # Nodes the run may reach: targets of the trigger, then auto-triggered targets
+        self.reachable = set()
+        pending = deque(self.targets[trigger_id])
+        while pending:
+            node_id = pending.popleft()
+            if node_id in self.reachable or node_id == trigger_id:
+                continue
+            self.reachable.add(node_id)
+            pending.extend(t for t in self.targets[node_id] if _is_auto_trigger(self.nodes[t]))
+
+    def eligible(self, source_id: str, target_id: str) -> bool:
+        return source_id == self.trigger_id or _is_auto_trigger(self.nodes[target_id])
+
+
+class TriggerRunner:
+    def __init__(self, max_concurrent: int = TRIGGER_RUNNER_MAX_CONCURRENT):
+        self.max_concurrent = max_concurrent
+        self.slots: Optional[asyncio.Semaphore] = None
+        self.slots_loop = None
+        # user_id -> runs in progress
+        self.running: Dict[str, int] = {}
+        self.tasks = set()
+
+    def _slots(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self.slots is None or self.slots_loop is not loop:
+            self.slots = asyncio.Semaphore(self.max_concurrent)
+            self.slots_loop = loop
+        return self.slots
+
+    async def submit(self, user_manager, user_id: str, project_id: str, trigger_id: str) -> Optional[str]:
+        """
+        Starts a run of what is downstream of 'trigger_id'. Returns its id, or None when
+        the user already has as many runs in progress as their tier allows.
+        """
+        tier = await _user_tier(user_manager, user_id)
+        # No await from the check to the count: concurrent submits can't both pass the cap
+        max_runs = get_tier_config(tier).get("max_headless_runs", 1)
+        if max_runs is not None and self.running.get(user_id, 0) >= max_runs:
+            logger.warning(f"Skipping headless run of trigger {trigger_id} for user {user_id}: {max_runs} run(s) already in progress")
+            metrics.increment("trigger_runs.skipped")
+            return None
+
+        run_id = _new_run_id()
+        self.running[user_id] = self.running.get(user_id, 0) + 1
+
+        async def counted_run():
+            try:
+                await self.run(user_manager, user_id, tier, project_id, trigger_id, run_id)
+            finally:
+                self.running[user_id] -= 1
+                if not self.running[user_id]:
+                    del self.running[user_id]
+
+        task = asyncio.create_task(counted_run())
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return run_id
+
+    async def run(self, user_manager, user_id: str, tier: str, project_id: str, trigger_id: str, run_id: str) -> dict:
+        log = {
+            "run_id": run_id,
+            "project_id": project_id,
+            "trigger_id": trigger_id,
+            "status": "running",
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "nodes": []
+        }
+        try:
+            async with self._slots():
+                proxy = user_manager.get_user(user_id, tier)
+                project = await project_store.load(proxy.projects_dir, project_id)
+                if project is None:
+                    raise ValueError("Project not found")
+                await self._run_graph(proxy, tier, _Graph(project, trigger_id), log)
+            log["status"] = "error" if any(node["status"] != "finished" for node in log["nodes"]) else "finished"
+        except asyncio.CancelledError:
+            log["status"] = "cancelled"
+            raise
+        except Exception as e:
+            logger.error(f"Headless run {run_id} of trigger {trigger_id} failed: {e}")
+            log["status"] = "error"
+            log["error"] = str(e)
+        finally:
+            log["finished_at"] = datetime.now(timezone.utc).isoformat()
+            metrics.increment(f"trigger_runs.{log['status']}")
+            try:
+                self._write_log(get_user_dir(user_id), log)
+            except OSError as e:
+                logger.error(f"Failed to write the log of run {run_id}: {e}")
+        return log
+
+    async def _run_graph(self, proxy, tier: str, graph: _Graph, log: dict):
+        states_dir = os.path.join(proxy.kernel_data_dir, ".states")
+        done = {graph.trigger_id}
+
+        def ready(node_id: str) -> bool:
+            return all(
+                source in done or (source not in graph.reachable and os.path.exists(os.path.join(states_dir, f"{source}.pkl")))
+                for source in graph.sources[node_id]
+            )
+
+        queue = deque()
+        queued = set()
+
+        def enqueue_targets(source_id: str):
+            for target in graph.targets[source_id]:
+                if target not in queued and graph.eligible(source_id, target) and ready(target):
+                    queue.append(target)
+                    queued.add(target)
+
+        enqueue_targets(graph.trigger_id)
+        while queue:
+            node_id = queue.popleft()
+            node = graph.nodes[node_id]
+            code = _node_code(node, graph.nodes)
+            if code is None:
+                # Nothing to run (e.g. a group): passes through
+                done.add(node_id)
+                enqueue_targets(node_id)
+                continue
+
+            if not await check_user_quota_async(proxy.user_id, tier=tier):
+                log["nodes"].append({"node_id": node_id, "status": "error", "error": "STORAGE_QUOTA_EXCEEDED"})
+                return
+
+            started = time.monotonic()
+            try:
+                response = await proxy.send_request({
+                    "action": "run_node",
+                    "node": node_id,
+                    "code": code,
+                    "variables": build_variables(node, graph.edges, graph.nodes),
+                    "timeout": execution_timeout(node.get("type"), tier),
+                    "inputs": [i.get("name") for i in node.get("data", {}).get("inputs") or []]
+                })
+            except Exception as e:
+                response = {"status": "error", "error": str(e)}
+            # Node states and files written by the code: the next reconciliation measures them
+            mark_usage_stale(get_user_dir(proxy.user_id))
+
+            status = response.get("status")
+            log["nodes"].append({
+                "node_id": node_id,
+                "type": node.get("type"),
+                "status": status,
+                "output": (response.get("output") or "")[-MAX_LOGGED_OUTPUT:],
+                "error": response.get("error") or "",
+                "duration": round(time.monotonic() - started, 3)
+            })
+            if status == "finished":
+                done.add(node_id)
+                enqueue_targets(node_id)
+
+    # --- Run logs ---
+
+    @staticmethod
+    def _write_log(user_dir: str, log: dict):
+        runs_dir = os.path.join(user_dir, RUN_LOG_DIRNAME)
+        os.makedirs(runs_dir, exist_ok=True)
+        write_json_atomic(os.path.join(runs_dir, f"{log['run_id']}.json"), log)
+        names = sorted(name for name in os.listdir(runs_dir) if name.endswith(".json"))
+        for name in names[:-TRIGGER_RUN_LOG_KEEP]:
+            try:
+                os.remove(os.path.join(runs_dir, name))
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def list_runs(user_dir: str, project_id: str = None, limit: int = 20) -> list:
+        """Summaries of the latest runs, newest first (blocking: run it in a thread)."""
+        runs_dir = os.path.join(user_dir, RUN_LOG_DIRNAME)
+        try:
+            names = sorted((name for name in os.listdir(runs_dir) if name.endswith(".json")), reverse=True)
+        except FileNotFoundError:
+            return []
+        runs = []
+        for name in names:
+            try:
+                with open(os.path.join(runs_dir, name), "r", encoding="utf-8") as f:
+                    log = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                continue
+            if project_id and log.get("project_id") != project_id:
+                continue
+            nodes = log.pop("nodes", [])
+            log["node_count"] = len(nodes)
+            log["failed_nodes"] = sum(1 for node in nodes if node.get("status") != "finished")
+            runs.append(log)
+            if len(runs) >= limit:
+                break
+        return runs
+
+    @staticmethod
+    def read_run(user_dir: str, run_id: str) -> Optional[dict]:
+        """Full log of a run, or None (blocking: run it in a thread)."""
+        if not isinstance(run_id, str) or not all(c in "0123456789abcdef-" for c in run_id):
+            return None
+        try:
+            with open(os.path.join(user_dir, RUN_LOG_DIRNAME, f"{run_id}.json"), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    async def stop(self):
+        for task in list(self.tasks):
+            task.cancel()
+        if self.tasks:
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+
+
+trigger_runner = TriggerRunner()
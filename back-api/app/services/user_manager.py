@@ -2,16 +2,32 @@ from .user_proxy import UserKernelProxy
 import asyncio
 import time
 from loguru import logger
+from ..core.config import KERNEL_BACKEND, IDLE_CHECK_INTERVAL, MEMORY_PRESSURE_MIN_AVAILABLE_MB, KERNEL_BUDGET, SESSION_RESUME_GRACE, SESSION_OUTBOX_SIZE, SESSION_OUTBOX_MAX_BYTES, STORAGE_RECONCILE_INTERVAL
+from ..core.tier_manager import get_tier_config, parse_mem_limit
+from ..core.host_metrics import is_under_memory_pressure
+from ..core.metrics import metrics
+from ..core.storage_manager import reconcile_usage, get_user_dir
+from .transfers import transfer_manager
+from .file_watcher import file_watcher
+from .trigger_manager import trigger_manager
+from .kernel_backends import get_backend_class
+from .sessions import SessionRegistry
 
 class UserManager:
     def __init__(self):
         self.users = {}
         self.active_connections = {}
+        self.sessions = SessionRegistry(SESSION_RESUME_GRACE, SESSION_OUTBOX_SIZE, SESSION_OUTBOX_MAX_BYTES)
         self.cleanup_task = None
+        # Proxies given a kernel slot whose kernel is still booting
+        self.starting = set()
+        self.budget_lock = asyncio.Lock()
 
     def get_user(self, user_id, tier: str = "default") -> UserKernelProxy:
         if user_id not in self.users:
-            self.users[user_id] = UserKernelProxy(user_id, tier)
+            self.users[user_id] = UserKernelProxy(
+                user_id, tier, on_before_start=self.reserve_kernel_slot, on_after_start=self.release_kernel_slot
+            )
         else:
             # Update tier if it changed
             self.users[user_id].tier = tier
@@ -23,40 +39,145 @@ class UserManager:
         
         async def loop():
             while True:
-                await asyncio.sleep(60)  # Check every minute
-                now = time.time()
-                for user_id, proxy in list(self.users.items()):
-                    # Check if the kernel container is running
-                    is_running = proxy.container is not None
-                    if is_running and (now - proxy.last_activity) > 600:
-                        logger.info(f"Idle timeout (10m) for user {user_id}. Stopping kernel.")
-                        await proxy.stop()
+                await asyncio.sleep(IDLE_CHECK_INTERVAL)
+                try:
+                    self.sessions.purge_expired()
+                    await file_watcher.prune(set(self.sessions.sessions))
+                    await self.enforce_idle_policy()
+                except Exception as e:
+                    logger.error(f"Error while enforcing idle policy: {e}")
+                try:
+                    await asyncio.to_thread(reconcile_usage, STORAGE_RECONCILE_INTERVAL)
+                except Exception as e:
+                    logger.error(f"Error while reconciling storage usage: {e}")
+                try:
+                    user_dirs = [get_user_dir(user_id) for user_id in self.users]
+                    await asyncio.to_thread(transfer_manager.purge_expired, user_dirs)
+                except Exception as e:
+                    logger.error(f"Error while purging expired transfers: {e}")
         
         self.cleanup_task = asyncio.create_task(loop())
 
+    async def enforce_idle_policy(self):
+        """
+        Two-stage idle policy: kernels idle for 'idle_pause_seconds' are paused (kept in memory,
+        no CPU), kernels idle for 'idle_stop_seconds' are stopped. Thresholds come from the user's tier.
+        """
+        now = time.time()
+        for user_id, proxy in list(self.users.items()):
+            # Skip stopped kernels and kernels currently executing code
+            if not proxy.is_running() or not proxy.can_run_code():
+                continue
+            config = get_tier_config(proxy.tier)
+            idle = now - proxy.last_activity
+            pause_after = config.get("idle_pause_seconds", 120)
+            stop_after = config.get("idle_stop_seconds", 600)
+            if stop_after and idle > stop_after:
+                logger.info(f"Idle timeout ({int(idle)}s) for user {user_id}. Stopping kernel.")
+                await proxy.stop()
+            elif pause_after and idle > pause_after and not proxy.paused:
+                logger.info(f"User {user_id} idle for {int(idle)}s. Pausing kernel.")
+                await proxy.pause()
+
+        # Paused kernels still hold memory: stop them early when the host runs low
+        paused = [p for p in self.users.values() if p.is_running() and p.paused]
+        paused.sort(key=lambda p: p.last_activity)
+        for proxy in paused:
+            if not is_under_memory_pressure(MEMORY_PRESSURE_MIN_AVAILABLE_MB):
+                break
+            logger.warning(f"Host memory pressure. Stopping paused kernel of user {proxy.user_id}.")
+            await proxy.stop()
+
+        # Still under pressure: fall back to LRU eviction of the remaining idle kernels
+        for proxy in self.eviction_order(self.running_kernels()):
+            if not is_under_memory_pressure(MEMORY_PRESSURE_MIN_AVAILABLE_MB):
+                break
+            await self._evict(proxy, "host memory pressure")
+
+    def running_kernels(self, exclude: UserKernelProxy = None) -> list:
+        return [p for p in self.users.values() if p.is_running() and p is not exclude]
+
+    def _has_open_websocket(self, user_id: str) -> bool:
+        conn = self.active_connections.get(user_id)
+        return conn is not None and conn.is_open()
+
+    def eviction_order(self, proxies: list) -> list:
+        """
+        Orders evictable kernels from best to worst eviction candidate: users without an open
+        websocket first, then users without a running trigger, then least recently active.
+        Kernels currently executing code are never evicted.
+        """
+        candidates = [p for p in proxies if p.can_run_code()]
+        candidates.sort(key=lambda p: (
+            self._has_open_websocket(p.user_id),
+            trigger_manager.has_active_triggers(p.user_id),
+            p.last_activity
+        ))
+        return candidates
+
+    async def _evict(self, proxy: UserKernelProxy, reason: str):
+        idle = int(time.time() - proxy.last_activity)
+        logger.info(
+            f"Evicting kernel of user {proxy.user_id} ({reason}): idle {idle}s, "
+            f"websocket={self._has_open_websocket(proxy.user_id)}, "
+            f"triggers={trigger_manager.has_active_triggers(proxy.user_id)}, paused={proxy.paused}"
+        )
+        await proxy.stop()
+
+    def _budget_overrun(self, running: list, requester: UserKernelProxy):
+        """Returns the reason why starting 'requester' next to 'running' exceeds the budget, or None."""
+        max_kernels = KERNEL_BUDGET.get("max_kernels")
+        if max_kernels and len(running) + 1 > max_kernels:
+            return f"kernel count {len(running) + 1} > {max_kernels}"
+
+        max_memory_mb = KERNEL_BUDGET.get("max_memory_mb")
+        if max_memory_mb:
+            total = 0
+            for proxy in running + [requester]:
+                total += parse_mem_limit(get_tier_config(proxy.tier).get("mem_limit")) or 0
+            if total > max_memory_mb * 1024 * 1024:
+                return f"kernel memory {total // (1024 * 1024)}MB > {max_memory_mb}MB"
+        return None
+
+    async def reserve_kernel_slot(self, requester: UserKernelProxy):
+        """
+        Makes room for 'requester' in the global kernel budget (count and summed mem_limit)
+        by evicting the least valuable running kernels. Raises if no room can be made.
+        The slot is held until release_kernel_slot(), once the kernel runs or failed to start.
+        """
+        # One check at a time: concurrent starts must see each other's slots
+        async with self.budget_lock:
+            running = self.running_kernels(exclude=requester)
+            # Kernels still booting count against the budget, but can't be evicted
+            starting = [p for p in self.starting if p is not requester and p not in running]
+            reason = self._budget_overrun(running + starting, requester)
+            if reason is not None:
+                for victim in self.eviction_order(running):
+                    await self._evict(victim, f"budget exceeded, {reason}, starting kernel for {requester.user_id}")
+                    running.remove(victim)
+                    reason = self._budget_overrun(running + starting, requester)
+                    if reason is None:
+                        break
+            if reason is not None:
+                logger.warning(f"Kernel budget exhausted ({reason}). Refusing kernel start for user {requester.user_id}.")
+                raise RuntimeError("Server kernel capacity reached, please retry later")
+            self.starting.add(requester)
+
+    def release_kernel_slot(self, requester: UserKernelProxy):
+        """The kernel of 'requester' is running (counted as such from now on) or failed to start."""
+        self.starting.discard(requester)
+
     async def cleanup_orphans(self):
-        def do_cleanup():
-            import os
-            try:
-                import docker
-                client = docker.from_env()
-                containers = client.containers.list(all=True)
-                for container in containers:
-                    if container.name.startswith("nodalpy_kernel_"):
-                        logger.info(f"Found orphaned kernel container '{container.name}'. Stopping & removing...")
-                        try:
-                            container.stop(timeout=2)
-                            container.remove()
-                        except Exception:
-                            pass
-            except Exception as e:
-                    logger.warning(f"Docker connection error during startup cleanup: {e}")
-        
-        await asyncio.to_thread(do_cleanup)
+        await get_backend_class(KERNEL_BACKEND).cleanup_orphans()
 
     async def stop_all_kernels(self):
         logger.info("Shutting down all user kernels...")
-        for user_id, proxy in list(self.users.items()):
-            await proxy.stop()
+        proxies = [p for p in self.users.values() if p.is_running()]
+        with metrics.timer("kernel.stop_all"):
+            results = await asyncio.gather(*(proxy.stop() for proxy in proxies), return_exceptions=True)
+        for proxy, result in zip(proxies, results):
+            if isinstance(result, Exception):
+                logger.warning(f"Error stopping kernel of user {proxy.user_id}: {result}")
+        logger.info(f"Stopped {len(proxies)} kernels. Lifecycle timings: {metrics.snapshot()['timings']}")
         if self.cleanup_task:
-            self.cleanup_task.cancel()
\ No newline at end of file
+            self.cleanup_task.cancel()
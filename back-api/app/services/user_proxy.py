@@ -2,14 +2,27 @@ import os
 import asyncio
 import time
 import json
-import docker
+import secrets
 from loguru import logger
-from ..core.config import STORAGE_DIR
+from ..core.config import STORAGE_DIR, KERNEL_BACKEND, KERNEL_START_TIMEOUT
+from .kernel_backends import get_backend_class, kernel_start_semaphore
+from ..core.metrics import metrics
+from kernel.handshake import KERNEL_VERSION, read_ready_file, remove_ready_file
+
+READY_POLL_INITIAL_DELAY = 0.01
+READY_POLL_MAX_DELAY = 0.5
+# Backend liveness checks may cost an API round trip (Docker): keep them sparse
+LIVENESS_CHECK_INTERVAL = 1.0
+HELLO_TIMEOUT = 5
 
 class UserKernelProxy:
-    def __init__(self, user_id: str, tier: str = "default"):
+    def __init__(self, user_id: str, tier: str = "default", on_before_start=None, on_after_start=None, backend: str = None):
         self.user_id = user_id
         self.tier = tier
+        # Awaited with this proxy right before a new kernel is spawned (capacity checks)
+        self.on_before_start = on_before_start
+        # Called with this proxy once that spawn succeeded or failed
+        self.on_after_start = on_after_start
         
         self.local_storage_dir = os.path.join(STORAGE_DIR, "users", str(user_id))
         self.projects_dir = os.path.join(self.local_storage_dir, "projects")
@@ -18,125 +31,174 @@ class UserKernelProxy:
         self.files_dir = os.path.join(self.kernel_data_dir, "files")
         self.nodes_dir = os.path.join(self.kernel_data_dir, "nodes")
         
-        self.container_name = f"nodalpy_kernel_{user_id}"
-        self.image_name = os.getenv("NODAL_KERNEL_IMAGE", "nodalpy_server:latest")
-        self.network_name = os.getenv("NODAL_DOCKER_NETWORK", "nodalpy_network")
-        self.host_storage_path = os.getenv("HOST_STORAGE_PATH", os.path.join(os.getcwd(), "storage"))
-        self.user_host_kernel_data_path = os.path.join(self.host_storage_path, "users", str(user_id), "kernel_data")
-        self.container = None
-        self.docker_client = None
+        self.backend = get_backend_class(backend or KERNEL_BACKEND)(self)
+        self.paused = False
 
         self.reader = None
         self.writer = None
+        self.kernel_info = None
         self.last_activity = time.time()
         self.lock = asyncio.Lock()
 
     def can_run_code(self) -> bool:
         return not self.lock.locked()
 
+    def is_running(self) -> bool:
+        return self.backend.is_running()
+
     async def start(self):
         async with self.lock:
             os.makedirs(self.projects_dir, exist_ok=True)
             os.makedirs(self.kernel_data_dir, exist_ok=True)
             os.makedirs(self.files_dir, exist_ok=True)
             os.makedirs(self.nodes_dir, exist_ok=True)
-            await self._start_docker()
+            if self.paused:
+                await self._unpause_kernel()
+            await self._start_kernel()
 
-    async def _start_docker(self):
-        if self.container is not None:
+    async def _start_kernel(self):
+        if self.backend.is_running():
             return
 
-        logger.info(f"Spawning kernel container '{self.container_name}' using image '{self.image_name}'...")
-        
-        try:
-            self.docker_client = docker.from_env()
-        except Exception as e:
-            logger.error(f"Failed to connect to Docker daemon: {e}")
-            raise RuntimeError(f"Failed to connect to Docker daemon: {e}")
-
-        os.makedirs(self.files_dir, exist_ok=True)
-
-        try:
-            stale = self.docker_client.containers.get(self.container_name)
-            logger.info(f"Found stale container '{self.container_name}'. Stopping and removing it...")
-            stale.stop(timeout=2)
-            stale.remove()
-        except docker.errors.NotFound:
-            pass
+        if self.on_before_start:
+            await self.on_before_start(self)
 
         from ..core.tier_manager import get_tier_config
         config = get_tier_config(self.tier)
-        
-        try:
-            self.container = self.docker_client.containers.run(
-                image=self.image_name,
-                command=[
-                    "python",
-                    "-m",
-                    "kernel.main",
-                    "--user-id",
-                    self.user_id,
-                    "--host",
-                    "0.0.0.0",
-                    "--port",
-                    "8000",
-                    "--storage-dir",
-                    "/app/storage"
-                ],
-                name=self.container_name,
-                network=self.network_name,
-                volumes={
-                    self.user_host_kernel_data_path: {
-                        "bind": "/app/storage",
-                        "mode": "rw"
-                    }
-                },
-                mem_limit=config.get("mem_limit"),
-                cpu_quota=config.get("cpu_quota"),
-                detach=True,
-                auto_remove=True
-            )
-        except Exception as e:
-            logger.error(f"Failed to run Docker container '{self.container_name}': {e}")
-            self.container = None
-            raise e
-
-        connected = False
-        for _ in range(50):
-            self.container.reload()
-            if self.container.status == "exited":
-                logs = self.container.logs().decode('utf-8')
-                logger.error(f"Kernel container '{self.container_name}' exited immediately. Logs:\n{logs}")
-                self.container = None
-                raise RuntimeError("Kernel container exited immediately after launch")
 
-            try:
-                self.reader, self.writer = await asyncio.open_connection(self.container_name, 8000)
-                connected = True
-                break
-            except Exception:
-                await asyncio.sleep(0.1)
+        try:
+            # Bounds how many kernels boot at once (login storms, deploy restarts)
+            async with kernel_start_semaphore:
+                with metrics.timer("kernel.start"):
+                    await self._launch_and_connect(config)
+        finally:
+            if self.on_after_start:
+                self.on_after_start(self)
+
+    async def _launch_and_connect(self, config: dict):
+        remove_ready_file(self.kernel_data_dir)
+        launch_token = secrets.token_hex(16)
+        with metrics.timer("kernel.launch"):
+            host, port = await self.backend.start(config, launch_token)
+        description = self.backend.describe()
 
-        if not connected:
-            logger.error(f"Failed to connect to kernel container '{self.container_name}' after 5 seconds.")
+        try:
+            with metrics.timer("kernel.ready"):
+                await self._wait_until_ready(description, launch_token)
+            await self._connect(host, port, launch_token)
+        except Exception:
             try:
-                self.container.stop(timeout=2)
+                await self.backend.stop()
             except Exception:
                 pass
-            self.container = None
-            raise RuntimeError("Failed to connect to spawned user kernel container")
+            raise
+
+        logger.info(f"Connected to user {description} (kernel v{self.kernel_info.get('version')})")
+
+    def _is_ready(self, launch_token: str) -> bool:
+        ready = read_ready_file(self.kernel_data_dir)
+        # A ready file of another launch (a kernel that outlived a restart) doesn't count
+        return ready is not None and ready.get("token") == launch_token
+
+    async def _wait_until_ready(self, description: str, launch_token: str):
+        """
+        Waits for the ready file written by this launch of the kernel once it accepts
+        connections, with exponential backoff and a hard deadline.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + KERNEL_START_TIMEOUT
+        next_liveness_check = loop.time() + LIVENESS_CHECK_INTERVAL
+        delay = READY_POLL_INITIAL_DELAY
+        while not self._is_ready(launch_token):
+            now = loop.time()
+            if now >= next_liveness_check:
+                logs = await self.backend.exit_logs()
+                if logs is not None:
+                    logger.error(f"{description} exited immediately. Logs:\n{logs}")
+                    raise RuntimeError("Kernel exited immediately after launch")
+                next_liveness_check = now + LIVENESS_CHECK_INTERVAL
+            if now >= deadline:
+                logger.error(f"{description} not ready after {KERNEL_START_TIMEOUT} seconds.")
+                raise RuntimeError("Spawned user kernel did not become ready in time")
+            await asyncio.sleep(min(delay, deadline - now))
+            delay = min(delay * 2, READY_POLL_MAX_DELAY)
+
+    async def _connect(self, host: str, port: int, launch_token: str):
+        # The kernel is listening: only transient network errors (container DNS) are retried
+        delay = READY_POLL_INITIAL_DELAY
+        for attempt in range(5):
+            try:
+                self.reader, self.writer = await asyncio.open_connection(host, port)
+                break
+            except OSError:
+                if attempt == 4:
+                    raise RuntimeError("Failed to connect to spawned user kernel")
+                await asyncio.sleep(delay)
+                delay *= 4
 
-        logger.info(f"Connected to user kernel container '{self.container_name}'")
+        try:
+            hello_bytes = await asyncio.wait_for(self.reader.readline(), timeout=HELLO_TIMEOUT)
+            hello = json.loads(hello_bytes.decode('utf-8')) if hello_bytes else {}
+        except (asyncio.TimeoutError, ValueError):
+            hello = {}
+        try:
+            if not isinstance(hello, dict) or hello.get("action") != "hello":
+                raise RuntimeError("Kernel handshake failed")
+            if hello.get("token") != launch_token:
+                raise RuntimeError("Kernel handshake failed: launch token mismatch")
+            if hello.get("version") != KERNEL_VERSION:
+                raise RuntimeError(f"Kernel handshake failed: kernel version {hello.get('version')}, expected {KERNEL_VERSION}")
+        except RuntimeError:
+            self.writer.close()
+            self.reader = self.writer = None
+            raise
+        self.kernel_info = hello
 
     async def stop(self):
         async with self.lock:
-            await self._stop_docker()
+            await self._stop_kernel()
+
+    async def pause(self):
+        async with self.lock:
+            await self._pause_kernel()
+
+    async def _pause_kernel(self):
+        if not self.backend.is_running() or self.paused:
+            return
+
+        try:
+            await self.backend.pause()
+            self.paused = True
+            logger.info(f"{self.backend.describe()} paused.")
+        except Exception as e:
+            logger.warning(f"Error pausing {self.backend.describe()}: {e}")
+
+    async def _unpause_kernel(self):
+        if not self.backend.is_running() or not self.paused:
+            return
 
-    async def _stop_docker(self):
-        if self.container is None:
+        try:
+            await self.backend.unpause()
+            self.paused = False
+            logger.info(f"{self.backend.describe()} unpaused.")
+        except Exception as e:
+            # The warm state is lost anyway, fall back to a cold start
+            logger.warning(f"Error unpausing {self.backend.describe()}: {e}. Restarting...")
+            await self._stop_kernel()
+
+    async def _stop_kernel(self):
+        if not self.backend.is_running():
             return
 
-        logger.info(f"Stopping kernel container '{self.container_name}'...")
+        description = self.backend.describe()
+        logger.info(f"Stopping {description}...")
+        if self.paused:
+            try:
+                await self.backend.unpause()
+            except Exception:
+                pass
+            self.paused = False
+
         try:
             if self.writer:
                 self.writer.write(json.dumps({"action": "shutdown"}).encode('utf-8') + b"\n")
@@ -144,20 +206,19 @@ class UserKernelProxy:
         except Exception:
             pass
 
-        try:
-            self.container.stop(timeout=2)
-        except Exception as e:
-            logger.warning(f"Error stopping container: {e}")
+        with metrics.timer("kernel.stop"):
+            await self.backend.stop()
 
-        self.container = None
         self.reader = None
         self.writer = None
-        logger.info(f"Kernel container '{self.container_name}' stopped.")
+        self.kernel_info = None
+        remove_ready_file(self.kernel_data_dir)
+        logger.info(f"{description} stopped.")
 
     async def send_request(self, request: dict) -> dict:
         self.last_activity = time.time()
         
-        if self.container is None:
+        if not self.backend.is_running() or self.paused:
             await self.start()
             
         async with self.lock:
@@ -173,8 +234,8 @@ class UserKernelProxy:
                 return json.loads(response_bytes.decode('utf-8'))
             except Exception as e:
                 logger.warning(f"Kernel communication error for user {self.user_id}: {e}. Restarting...")
-                await self._stop_docker()
-                await self._start_docker()
+                await self._stop_kernel()
+                await self._start_kernel()
                 payload = json.dumps(request) + "\n"
                 self.writer.write(payload.encode('utf-8'))
                 await self.writer.drain()
@@ -0,0 +1,46 @@
+import os
+import json
+
+KERNEL_VERSION = "1"
+CAPABILITIES = ["run_node", "get_variable", "shutdown"]
+
+# Written in the kernel storage dir once the kernel accepts connections.
+# The host removes it before each launch and waits for it instead of polling the TCP port.
+READY_FILE_NAME = ".kernel_ready"
+
+# The host gives each launch a random token, echoed in the ready file and the hello
+# frame: a stale ready file or another process on the port isn't taken for the kernel.
+
+def hello_message(launch_token: str = None) -> dict:
+    message = {
+        "action": "hello",
+        "version": KERNEL_VERSION,
+        "capabilities": CAPABILITIES
+    }
+    if launch_token:
+        message["token"] = launch_token
+    return message
+
+def write_ready_file(storage_dir: str, host: str, port: int, launch_token: str = None):
+    ready_path = os.path.join(storage_dir, READY_FILE_NAME)
+    tmp_path = f"{ready_path}.tmp"
+    data = hello_message(launch_token)
+    data.update({"pid": os.getpid(), "host": host, "port": port})
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, ready_path)
+
+def read_ready_file(storage_dir: str):
+    """Returns the ready file content, or None if the kernel is not ready yet."""
+    ready_path = os.path.join(storage_dir, READY_FILE_NAME)
+    try:
+        with open(ready_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def remove_ready_file(storage_dir: str):
+    try:
+        os.remove(os.path.join(storage_dir, READY_FILE_NAME))
+    except OSError:
+        pass
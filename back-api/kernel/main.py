@@ -6,10 +6,14 @@ import os
 import venv
 from loguru import logger
 from .runner import KernelRunner
+from .handshake import hello_message, write_ready_file
 
-async def handle_client(reader, writer, runner):
+async def handle_client(reader, writer, runner, launch_token=None):
     logger.info("Host connected to kernel.")
     try:
+        writer.write((json.dumps(hello_message(launch_token)) + "\n").encode('utf-8'))
+        await writer.drain()
+
         while True:
             data = await reader.readline()
             if not data:
@@ -113,6 +117,7 @@ async def main():
     parser.add_argument("--host", default="127.0.0.1", help="Host IP to bind to")
     parser.add_argument("--port", type=int, required=True, help="TCP port to listen on")
     parser.add_argument("--storage-dir", required=True, help="Path to persist user files and states")
+    parser.add_argument("--launch-token", default=None, help="Token of this launch, echoed in the handshake")
     args = parser.parse_args()
 
     venv_dir = os.path.join(args.storage_dir, ".venv")
@@ -127,7 +132,7 @@ async def main():
     runner = KernelRunner(user_id=args.user_id, storage_dir=args.storage_dir)
 
     server = await asyncio.start_server(
-        lambda r, w: handle_client(r, w, runner),
+        lambda r, w: handle_client(r, w, runner, args.launch_token),
         args.host,
         args.port
     )
@@ -135,6 +140,7 @@ async def main():
     addr = server.sockets[0].getsockname()
     logger.info(f"Kernel started for user {args.user_id} on {addr[0]}:{addr[1]}")
     logger.info(f"Storage path set to: {args.storage_dir}")
+    write_ready_file(args.storage_dir, addr[0], addr[1], args.launch_token)
 
     async with server:
         await server.serve_forever()
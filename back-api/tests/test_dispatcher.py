@@ -0,0 +1,94 @@
+import asyncio
+import unittest
+from app.api.dispatcher import ActionDispatcher
+from app.core.registry import ActionSpec, CONCURRENT, EXCLUSIVE
+
+class TestActionDispatcher(unittest.TestCase):
+    def test_concurrent_action_is_not_blocked_by_slow_serial_action(self):
+        async def run_test():
+            dispatcher = ActionDispatcher()
+            events = []
+
+            async def slow(session, data):
+                await asyncio.sleep(0.05)
+                events.append("slow")
+
+            async def ping(session, data):
+                events.append("ping")
+
+            dispatcher.dispatch("install", slow, ActionSpec(resource="packages"), None, {})
+            dispatcher.dispatch("ping", ping, ActionSpec(CONCURRENT), None, {})
+            await dispatcher.wait_all()
+            self.assertEqual(events, ["ping", "slow"])
+
+        asyncio.run(run_test())
+
+    def test_serial_actions_keep_order_per_resource(self):
+        async def run_test():
+            dispatcher = ActionDispatcher()
+            events = []
+
+            async def save(session, data):
+                await asyncio.sleep(data["delay"])
+                events.append(data["project_id"] + data["step"])
+
+            spec = ActionSpec(resource="project", resource_arg="project_id")
+            dispatcher.dispatch("save", save, spec, None, {"project_id": "a", "step": "1", "delay": 0.05})
+            dispatcher.dispatch("save", save, spec, None, {"project_id": "a", "step": "2", "delay": 0})
+            dispatcher.dispatch("save", save, spec, None, {"project_id": "b", "step": "1", "delay": 0})
+            await dispatcher.wait_all()
+            self.assertEqual(events, ["b1", "a1", "a2"])
+
+        asyncio.run(run_test())
+
+    def test_exclusive_action_waits_for_running_actions(self):
+        async def run_test():
+            dispatcher = ActionDispatcher()
+            events = []
+
+            async def slow(session, data):
+                await asyncio.sleep(0.05)
+                events.append("slow")
+
+            async def reset(session, data):
+                events.append("reset")
+
+            async def ping(session, data):
+                events.append("ping")
+
+            dispatcher.dispatch("list", slow, ActionSpec(CONCURRENT), None, {})
+            await asyncio.sleep(0)
+            dispatcher.dispatch("reset", reset, ActionSpec(EXCLUSIVE), None, {})
+            dispatcher.dispatch("ping", ping, ActionSpec(CONCURRENT), None, {})
+            await dispatcher.wait_all()
+            self.assertEqual(events, ["slow", "reset", "ping"])
+
+        asyncio.run(run_test())
+
+    def test_shutdown_lets_short_actions_finish_and_cancels_the_rest(self):
+        async def run_test():
+            dispatcher = ActionDispatcher()
+            events = []
+
+            async def save(session, data):
+                await asyncio.sleep(0.01)
+                events.append("saved")
+
+            async def stuck(session, data):
+                try:
+                    await asyncio.sleep(10)
+                except asyncio.CancelledError:
+                    events.append("cancelled")
+                    raise
+
+            dispatcher.dispatch("save", save, ActionSpec(resource="project"), None, {})
+            dispatcher.dispatch("install", stuck, ActionSpec(CONCURRENT), None, {})
+            await asyncio.sleep(0)
+            await dispatcher.shutdown(0.1)
+            self.assertEqual(events, ["saved", "cancelled"])
+            self.assertEqual(dispatcher.tasks, set())
+
+        asyncio.run(run_test())
+
+if __name__ == "__main__":
+    unittest.main()
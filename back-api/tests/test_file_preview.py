@@ -0,0 +1,150 @@
+import os
+import csv
+import json
+import random
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+import numpy as np
+from app.services import file_preview
+
+class TestFilePreview(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        file_preview._cache.clear()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _path(self, name):
+        return os.path.join(self.dir, name)
+
+    def test_csv_schema_rows_and_stats(self):
+        path = self._path("data.csv")
+        with open(path, "w") as f:
+            f.write("id,score,label\n")
+            for i in range(50):
+                f.write(f"{i},{i / 2},{'a' if i % 2 else ''}\n")
+
+        preview = file_preview.preview(path, rows=3, sample_rows=10)
+        self.assertEqual([c["name"] for c in preview["columns"]], ["id", "score", "label"])
+        self.assertEqual([c["type"] for c in preview["columns"]], ["integer", "float", "string"])
+        self.assertEqual(preview["rows"][0], ["0", "0.0", ""])
+        self.assertEqual(len(preview["sample"]), 10)
+        self.assertEqual(preview["row_count"], 50)
+        self.assertTrue(preview["row_count_exact"])
+        self.assertEqual(preview["columns"][0]["stats"]["max"], 49)
+        self.assertEqual(preview["columns"][2]["stats"]["nulls"], 25)
+
+        self.assertTrue(file_preview.preview(path, rows=3, sample_rows=10)["cached"])
+
+    def test_csv_quoted_newlines_stay_in_their_row(self):
+        path = self._path("notes.csv")
+        with open(path, "w", newline="") as f:
+            f.write('id,"long\nname"\n')
+            for i in range(400):
+                f.write(f'{i},"line one\nline two, {i}"\n')
+
+        preview = file_preview.preview(path, rows=2, sample_rows=5)
+        self.assertEqual([c["name"] for c in preview["columns"]], ["id", "long\nname"])
+        self.assertEqual(preview["rows"], [["0", "line one\nline two, 0"], ["1", "line one\nline two, 1"]])
+        self.assertEqual(preview["row_count"], 400)
+        self.assertEqual(preview["columns"][0]["type"], "integer")
+
+        # Sampled at random offsets: an offset inside a row resumes at the next full row
+        file_preview._cache.clear()
+        with patch("app.services.file_preview.PREVIEW_SCAN_BYTES", 1024):
+            preview = file_preview.preview(path, rows=2, sample_rows=20)
+        self.assertFalse(preview["row_count_exact"])
+        self.assertEqual(preview["rows"][1], ["1", "line one\nline two, 1"])
+        self.assertTrue(preview["sample"])
+        for row in preview["sample"]:
+            self.assertEqual(len(row), 2)
+        self.assertTrue(300 < preview["row_count"] < 500)
+
+    def test_sampled_record_cut_by_the_read_limit_is_dropped(self):
+        path = self._path("wide.csv")
+        with open(path, "w", newline="") as f:
+            f.write("a,b\n0,short\n")
+            f.write('1,"' + "x\n" * 100 + '"\n')
+            f.write("2,short\n")
+        rng = random.Random(0)
+
+        # Lands in the header: skips "0,short", then reads the long record
+        with patch.object(rng, "randrange", return_value=0):
+            records = file_preview._records_at_random_offsets(path, 0, 1, rng, csv.reader)
+            self.assertEqual(records[0][0], ["1", "x\n" * 100])
+            with patch("app.services.file_preview.MAX_SAMPLED_RECORD_BYTES", 50):
+                records = file_preview._records_at_random_offsets(path, 0, 1, rng, csv.reader)
+        self.assertEqual(records, [])
+
+    def test_large_text_files_are_sampled(self):
+        path = self._path("events.jsonl")
+        with open(path, "w") as f:
+            for i in range(2000):
+                f.write(json.dumps({"n": i, "tag": "x"}) + "\n")
+
+        with patch("app.services.file_preview.PREVIEW_SCAN_BYTES", 1024):
+            preview = file_preview.preview(path, rows=5, sample_rows=20)
+        self.assertEqual(preview["format"], "jsonl")
+        self.assertEqual(preview["rows"][4], [4, "x"])
+        self.assertFalse(preview["row_count_exact"])
+        self.assertEqual(preview["stats_from"], "sample")
+        self.assertTrue(1500 < preview["row_count"] < 2500)
+
+    def test_npy_and_npz_are_memory_mapped(self):
+        array = np.arange(20, dtype=np.float64).reshape(10, 2)
+        array[3, 1] = np.nan
+        np.save(self._path("a.npy"), array)
+        preview = file_preview.preview(self._path("a.npy"), rows=2, sample_rows=4)
+        self.assertEqual(preview["shape"], [10, 2])
+        self.assertEqual(preview["rows"], [[0.0, 1.0], [2.0, 3.0]])
+        self.assertEqual(preview["columns"][1]["stats"]["nulls"], 1)
+        self.assertEqual(preview["columns"][0]["stats"]["max"], 18.0)
+
+        np.savez(self._path("b.npz"), first=np.arange(5), second=array)
+        with patch("app.services.file_preview.np.lib.format.read_array", side_effect=AssertionError("loaded")):
+            preview = file_preview.preview(self._path("b.npz"), rows=2, sample_rows=2, array_name="second")
+        self.assertEqual(preview["array"], "second")
+        self.assertEqual([a["name"] for a in preview["arrays"]], ["first", "second"])
+        self.assertEqual(preview["rows"][1], [2.0, 3.0])
+
+    def test_malformed_head_line_is_skipped_when_sampling(self):
+        path = self._path("events.jsonl")
+        with open(path, "w") as f:
+            f.write("{not json\n")
+            for i in range(2000):
+                f.write(json.dumps({"n": i}) + "\n")
+
+        with patch("app.services.file_preview.PREVIEW_SCAN_BYTES", 1024):
+            preview = file_preview.preview(path, rows=3, sample_rows=10)
+        self.assertFalse(preview["row_count_exact"])
+        self.assertEqual(preview["rows"], [[0], [1], [2]])
+
+    def test_empty_arrays_preview_as_empty_tables(self):
+        np.save(self._path("empty.npy"), np.zeros((0, 3)))
+        preview = file_preview.preview(self._path("empty.npy"), rows=2, sample_rows=4)
+        self.assertEqual(preview["shape"], [0, 3])
+        self.assertEqual(preview["rows"], [])
+        self.assertEqual(preview["row_count"], 0)
+        self.assertEqual(len(preview["columns"]), 3)
+
+        np.savez(self._path("empty.npz"), rows=np.zeros((0, 2)), flat=np.array([]))
+        preview = file_preview.preview(self._path("empty.npz"), rows=2, sample_rows=4, array_name="flat")
+        self.assertEqual(preview["array"], "flat")
+        self.assertEqual(preview["sample"], [])
+        self.assertEqual(file_preview.preview(self._path("empty.npz"), rows=2, sample_rows=4)["row_count"], 0)
+
+    @unittest.skipIf(file_preview.pq is None, "pyarrow is not installed")
+    def test_parquet_stats_come_from_metadata(self):
+        import pyarrow as pa
+        path = self._path("t.parquet")
+        file_preview.pq.write_table(pa.table({"x": list(range(100))}), path, row_group_size=30)
+        preview = file_preview.preview(path, rows=2, sample_rows=5)
+        self.assertEqual(preview["row_count"], 100)
+        self.assertEqual(preview["columns"][0]["stats"]["max"], 99)
+        self.assertEqual(len(preview["sample"]), 5)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+import os
+import shutil
+import asyncio
+import tempfile
+import unittest
+import importlib.util
+from types import SimpleNamespace
+from unittest.mock import patch
+from app.services import file_watcher as watcher_module
+from app.services.file_watcher import FileWatcher, _diff, _scan
+
+FILE_EXPLORER_BACKEND = os.path.join(os.path.dirname(__file__), "..", "..", "plugins", "fileExplorer", "backend.py")
+
+def _load_file_explorer():
+    spec = importlib.util.spec_from_file_location("file_explorer_backend", FILE_EXPLORER_BACKEND)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+class TestFileWatcher(unittest.TestCase):
+    def setUp(self):
+        self.user_dir = tempfile.mkdtemp()
+        self.files_dir = os.path.join(self.user_dir, "files")
+        os.makedirs(os.path.join(self.files_dir, "old"))
+        with open(os.path.join(self.files_dir, "old", "a.txt"), "w") as f:
+            f.write("abc")
+
+    def tearDown(self):
+        shutil.rmtree(self.user_dir)
+
+    def test_diff_reports_top_most_changes_and_usage(self):
+        before = _scan(self.files_dir)
+        shutil.rmtree(os.path.join(self.files_dir, "old"))
+        os.makedirs(os.path.join(self.files_dir, "new", "deep"))
+        with open(os.path.join(self.files_dir, "new", "deep", "b.bin"), "wb") as f:
+            f.write(b"x" * 10)
+
+        changes, delta_bytes = _diff(self.files_dir, before, _scan(self.files_dir))
+        self.assertEqual(changes[0], {"type": "removed", "path": "old"})
+        self.assertEqual(changes[1]["type"], "added")
+        self.assertEqual(changes[1]["entry"]["path"], "new")
+        self.assertEqual(len(changes), 2)
+        self.assertEqual(delta_bytes, 7)
+
+    def test_poller_pushes_changes(self):
+        pushed = []
+        deltas = []
+
+        async def push(message):
+            pushed.append(message)
+
+        async def scenario():
+            watcher = FileWatcher(backend="poll", poll_seconds=0.05)
+            watcher.watch(self.files_dir, self.user_dir, "token", push)
+            await asyncio.sleep(0.1)
+            with open(os.path.join(self.files_dir, "old", "a.txt"), "w") as f:
+                f.write("abcdef")
+            await asyncio.sleep(0.2)
+            self.assertTrue(watcher.is_watching(self.files_dir))
+            await watcher.prune({"another-token"})
+            self.assertFalse(watcher.is_watching(self.files_dir))
+
+        with patch.object(watcher_module, "record_usage_delta", lambda user_dir, delta: deltas.append(delta)):
+            asyncio.run(scenario())
+
+        self.assertEqual(len(pushed), 1)
+        self.assertEqual(pushed[0]["action"], "fs_changed")
+        self.assertEqual(pushed[0]["changes"], [{"type": "resized", "path": os.path.join("old", "a.txt"), "size": 6}])
+        self.assertEqual(deltas, [3])
+
+    def test_changes_reported_by_handlers_are_not_sent_again(self):
+        pushed = []
+
+        async def push(message):
+            pushed.append(message)
+
+        async def scenario():
+            watcher = FileWatcher(backend="poll", poll_seconds=0.05)
+            watcher.watch(self.files_dir, self.user_dir, "token", push)
+            await asyncio.sleep(0.1)
+            os.makedirs(os.path.join(self.files_dir, "made_by_handler"))
+            shutil.rmtree(os.path.join(self.files_dir, "old"))
+            watcher.note_reported(self.files_dir, [
+                {"type": "added", "entry": {"path": "made_by_handler", "name": "made_by_handler", "type": "directory"}},
+                {"type": "removed", "path": "old"}
+            ])
+            # Made by node code: still reported
+            with open(os.path.join(self.files_dir, "from_code.txt"), "w") as f:
+                f.write("x")
+            await asyncio.sleep(0.2)
+            await watcher.stop_all()
+
+        with patch.object(watcher_module, "record_usage_delta", lambda user_dir, delta: None):
+            asyncio.run(scenario())
+
+        changes = [change for message in pushed for change in message["changes"]]
+        self.assertEqual(len(changes), 1)
+        self.assertEqual(changes[0]["entry"]["path"], "from_code.txt")
+
+    @unittest.skipUnless(os.path.exists(FILE_EXPLORER_BACKEND), "needs the fileExplorer plugin")
+    def test_rename_sent_by_handler_is_not_sent_again(self):
+        file_explorer = _load_file_explorer()
+        pushed = []
+        sent = []
+
+        async def push(message):
+            pushed.append(message)
+
+        async def send_json(message):
+            sent.append(message)
+
+        session = SimpleNamespace(user=SimpleNamespace(files_dir=self.files_dir), send_json=send_json)
+
+        async def scenario():
+            watcher = FileWatcher(backend="poll", poll_seconds=0.05)
+            watcher.watch(self.files_dir, self.user_dir, "token", push)
+            await asyncio.sleep(0.1)
+            os.rename(os.path.join(self.files_dir, "old"), os.path.join(self.files_dir, "new"))
+            with patch.object(file_explorer, "file_watcher", watcher):
+                await file_explorer.send_changes(session, [{
+                    "type": "renamed", "old_path": "old", "new_path": "new",
+                    "entry": {"path": "new", "name": "new", "type": "directory"}
+                }])
+            await asyncio.sleep(0.2)
+            await watcher.stop_all()
+
+        with patch.object(watcher_module, "record_usage_delta", lambda user_dir, delta: None):
+            asyncio.run(scenario())
+
+        self.assertEqual(len(sent), 1)
+        self.assertEqual(sent[0]["changes"][0]["type"], "renamed")
+        self.assertEqual(pushed, [])
+
+if __name__ == '__main__':
+    unittest.main()
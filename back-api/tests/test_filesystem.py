@@ -0,0 +1,113 @@
+import os
+import shutil
+import asyncio
+import tempfile
+import unittest
+from app.services import filesystem as fs
+
+class TestFilesystemListing(unittest.TestCase):
+    def setUp(self):
+        self.files_dir = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.files_dir, "data", "raw"))
+        for i in range(5):
+            with open(os.path.join(self.files_dir, "data", f"f{i}.csv"), "w") as f:
+                f.write("x" * i)
+        with open(os.path.join(self.files_dir, "readme.md"), "w") as f:
+            f.write("hello")
+
+    def tearDown(self):
+        shutil.rmtree(self.files_dir)
+
+    def test_pages_and_depth(self):
+        root = asyncio.run(fs.fs_list(self.files_dir))
+        self.assertEqual(root["total"], 2)
+        self.assertEqual([e["path"] for e in root["entries"]], ["data", "readme.md"])
+        self.assertNotIn("children", root["entries"][0])
+
+        page = asyncio.run(fs.fs_list(self.files_dir, "data", offset=2, limit=2))
+        self.assertEqual(page["total"], 6)
+        self.assertEqual([e["name"] for e in page["entries"]], ["f1.csv", "f2.csv"])
+        self.assertEqual(page["entries"][1]["size"], 2)
+
+        nested = asyncio.run(fs.fs_list(self.files_dir, depth=2, limit=1))
+        self.assertEqual(nested["entries"][0]["children"][0]["path"], os.path.join("data", "raw"))
+        self.assertEqual(nested["entries"][0]["total"], 6)
+
+    def test_listing_outside_files_dir_is_rejected(self):
+        result = asyncio.run(fs.fs_list(self.files_dir, "../.."))
+        self.assertEqual(result["status"], "error")
+
+    def test_change_tracking(self):
+        self.assertIsNone(fs.first_missing(self.files_dir, "readme.md"))
+        self.assertEqual(fs.first_missing(self.files_dir, "new/sub/file.txt"), "new")
+        self.assertEqual(fs.normalize_path(self.files_dir, "data//./f1.csv"), os.path.join("data", "f1.csv"))
+
+        first = fs.record_changes(self.files_dir, [{"type": "removed", "path": "readme.md"}])
+        second = fs.record_changes(self.files_dir, [])
+        self.assertEqual(second["version"], first["version"] + 1)
+        self.assertEqual(asyncio.run(fs.fs_list(self.files_dir))["version"], second["version"])
+
+class TestFilesystemBatch(unittest.TestCase):
+    def setUp(self):
+        self.files_dir = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.files_dir, "data"))
+        for i in range(4):
+            with open(os.path.join(self.files_dir, "data", f"f{i}.csv"), "w") as f:
+                f.write("x" * 10)
+
+    def tearDown(self):
+        shutil.rmtree(self.files_dir)
+
+    def test_operations_and_aggregated_changes(self):
+        operations = [
+            {"op": "delete", "path": "data/f0.csv"},
+            {"op": "move", "path": "data/f1.csv", "dest": "archive/2024/f1.csv"},
+            {"op": "move", "path": "data/f2.csv", "dest": "archive/2024/f2.csv"},
+            {"op": "copy", "path": "data/f3.csv", "dest": "data/copy.csv"},
+            {"op": "copy", "path": "data", "dest": "data/inside"},
+            {"op": "delete", "path": "missing.txt"},
+            {"op": "mkdir", "path": "empty"},
+            {"op": "chmod", "path": "data"}
+        ]
+        reply, changes, delta = asyncio.run(fs.fs_batch(self.files_dir, operations, batch_id="b1"))
+
+        self.assertEqual(reply["batch_id"], "b1")
+        self.assertEqual([r["status"] for r in reply["results"]],
+                         ["success"] * 4 + ["error", "error", "success", "error"])
+        self.assertEqual((reply["succeeded"], reply["failed"]), (5, 3))
+        self.assertTrue(os.path.isfile(os.path.join(self.files_dir, "archive", "2024", "f2.csv")))
+        self.assertEqual(delta, 0)  # one file deleted, one copied
+
+        by_path = {c.get("path") or c["entry"]["path"]: c["type"] for c in changes}
+        self.assertEqual(by_path, {
+            "archive": "added",
+            "empty": "added",
+            os.path.join("data", "copy.csv"): "added",
+            os.path.join("data", "f0.csv"): "removed",
+            os.path.join("data", "f1.csv"): "removed",
+            os.path.join("data", "f2.csv"): "removed"
+        })
+
+    def test_progress_and_limits(self):
+        events = []
+
+        async def on_progress(event):
+            events.append(event)
+
+        operations = [{"op": "mkdir", "path": f"d{i}"} for i in range(3)]
+        original = fs.BATCH_SLICE_SECONDS
+        fs.BATCH_SLICE_SECONDS = 0
+        try:
+            reply, _, _ = asyncio.run(fs.fs_batch(self.files_dir, operations, on_progress=on_progress))
+        finally:
+            fs.BATCH_SLICE_SECONDS = original
+        self.assertEqual(reply["succeeded"], 3)
+        self.assertTrue(events)
+        self.assertEqual(events[-1]["total"], 3)
+
+        reply, _, _ = asyncio.run(fs.fs_batch(self.files_dir, "data"))
+        self.assertEqual(reply["status"], "error")
+        self.assertEqual(asyncio.run(fs.batch_incoming_bytes(self.files_dir, [{"op": "copy", "path": "data"}])), 40)
+
+if __name__ == '__main__':
+    unittest.main()
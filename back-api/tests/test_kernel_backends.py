@@ -0,0 +1,109 @@
+import os
+import sys
+import shutil
+import asyncio
+import tempfile
+import unittest
+from unittest.mock import patch
+from app.services import kernel_backends
+from app.services.kernel_backends import LocalProcessBackend
+from app.services.user_proxy import UserKernelProxy
+
+class FakeProxy:
+    def __init__(self, storage_dir):
+        self.user_id = "local_user"
+        self.local_storage_dir = storage_dir
+        self.kernel_data_dir = os.path.join(storage_dir, "kernel_data")
+
+def _max_data_size(pid: int):
+    with open(f"/proc/{pid}/limits", "r") as f:
+        for line in f:
+            if line.startswith("Max data size"):
+                return line.split()[3]
+    return None
+
+class TestLocalProcessBackend(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    @unittest.skipUnless(sys.platform.startswith("linux"), "needs /proc")
+    def test_local_kernel_runs_a_node_and_stops(self):
+        async def run_test():
+            with patch("app.services.user_proxy.STORAGE_DIR", self.dir), \
+                 patch("app.services.kernel_backends._cgroup_available", return_value=False):
+                proxy = UserKernelProxy("local_user", backend="local")
+                # An existing venv skips its creation (and pip install) at kernel startup
+                os.makedirs(os.path.join(proxy.kernel_data_dir, ".venv"), exist_ok=True)
+                try:
+                    await proxy.start()
+                    backend = proxy.backend
+                    pid = backend.process.pid
+                    self.assertTrue(os.path.exists(backend.pid_path))
+                    self.assertEqual(proxy.kernel_info["action"], "hello")
+                    # Tier memory limit applied with an rlimit when there is no cgroup
+                    self.assertEqual(_max_data_size(pid), str(512 * 1024 * 1024))
+
+                    response = await proxy.send_request({
+                        "action": "run_node", "node": "n1", "code": "x = 20 + 22\nprint(x)", "variables": [], "timeout": 10
+                    })
+                    self.assertEqual(response["status"], "finished", response)
+                    self.assertIn("42", response["output"])
+                finally:
+                    await proxy.stop()
+
+                self.assertFalse(proxy.is_running())
+                self.assertFalse(os.path.exists(backend.pid_path))
+                with self.assertRaises(ProcessLookupError):
+                    os.kill(pid, 0)
+
+        asyncio.run(run_test())
+
+    def test_rlimit_fallback_without_cgroup(self):
+        backend = LocalProcessBackend(FakeProxy(self.dir))
+        preexec = backend._make_preexec({"mem_limit": "256m", "cpu_quota": 50000}, None)
+        with patch("resource.setrlimit") as setrlimit, patch("os.nice") as nice:
+            preexec()
+        import resource
+        setrlimit.assert_called_once_with(resource.RLIMIT_DATA, (256 * 1024 * 1024, 256 * 1024 * 1024))
+        nice.assert_called_once_with(10)
+
+        # A full CPU share needs no lower priority
+        with patch("resource.setrlimit"), patch("os.nice") as nice:
+            backend._make_preexec({"mem_limit": None, "cpu_quota": kernel_backends.CPU_PERIOD}, None)()
+        nice.assert_not_called()
+
+    def test_cgroup_limits_and_cleanup(self):
+        cgroup_root = os.path.join(self.dir, "cgroup")
+        os.makedirs(cgroup_root)
+        open(os.path.join(cgroup_root, "cgroup.controllers"), "w").close()
+        backend = LocalProcessBackend(FakeProxy(self.dir))
+
+        with patch("app.services.kernel_backends.CGROUP_ROOT", cgroup_root):
+            cgroup_dir = backend._setup_cgroup({"mem_limit": "1g", "cpu_quota": 25000})
+        self.assertEqual(cgroup_dir, os.path.join(cgroup_root, "nodalpy", "local_user"))
+        with open(os.path.join(cgroup_dir, "memory.max")) as f:
+            self.assertEqual(f.read(), str(1024 ** 3))
+        with open(os.path.join(cgroup_dir, "cpu.max")) as f:
+            self.assertEqual(f.read(), f"25000 {kernel_backends.CPU_PERIOD}")
+
+        # The child joins the group instead of taking rlimits
+        with patch("resource.setrlimit") as setrlimit, patch("os.nice") as nice:
+            backend._make_preexec({"mem_limit": "1g", "cpu_quota": 25000}, cgroup_dir)()
+        with open(os.path.join(cgroup_dir, "cgroup.procs")) as f:
+            self.assertEqual(f.read(), str(os.getpid()))
+        setrlimit.assert_not_called()
+        nice.assert_not_called()
+
+        # Stopping removes the group (an empty one, as the kernel left it)
+        for name in os.listdir(cgroup_dir):
+            os.remove(os.path.join(cgroup_dir, name))
+        backend.cgroup_dir = cgroup_dir
+        backend._cleanup()
+        self.assertFalse(os.path.exists(cgroup_dir))
+        self.assertIsNone(backend.cgroup_dir)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,149 @@
+import asyncio
+import json
+import zlib
+import unittest
+from unittest.mock import patch
+from app.api.outbound import OutboundQueue
+from app.services.sessions import ResumableSession
+
+class FakeWebSocket:
+    def __init__(self, delay=0, close_delay=0):
+        self.frames = []
+        self.delay = delay
+        self.close_delay = close_delay
+        self.close_code = None
+
+    async def send_text(self, data):
+        await asyncio.sleep(self.delay)
+        self.frames.append(json.loads(data))
+
+    async def send_bytes(self, data):
+        await asyncio.sleep(self.delay)
+        self.frames.append(json.loads(zlib.decompress(data).decode('utf-8')))
+
+    async def close(self, code=1000, reason=None):
+        await asyncio.sleep(self.close_delay)
+        self.close_code = code
+
+    def messages(self):
+        result = []
+        for frame in self.frames:
+            result.extend(frame["messages"] if frame.get("action") == "batch" else [frame])
+        return result
+
+def make_queue(ws, **kwargs):
+    options = {"interval_ms": 20, "max_messages": 100, "max_bytes": 100000, "compress_threshold": 0}
+    options.update(kwargs)
+    return OutboundQueue(ws, **options)
+
+class TestOutboundQueue(unittest.TestCase):
+    def test_messages_are_coalesced_within_interval(self):
+        async def run_test():
+            ws = FakeWebSocket()
+            queue = make_queue(ws)
+            for i in range(3):
+                await queue.send({"action": "notification", "message": str(i)})
+            self.assertEqual(ws.frames, [])
+            await asyncio.sleep(0.05)
+            self.assertEqual(len(ws.frames), 1)
+            self.assertEqual(ws.frames[0]["action"], "batch")
+            self.assertEqual([m["message"] for m in ws.frames[0]["messages"]], ["0", "1", "2"])
+            await queue.close()
+
+        asyncio.run(run_test())
+
+    def test_bypass_actions_flush_pending_first(self):
+        async def run_test():
+            ws = FakeWebSocket()
+            queue = make_queue(ws, interval_ms=1000)
+            await queue.send({"action": "notification"})
+            await queue.send({"action": "pong"})
+            await asyncio.sleep(0.01)
+            self.assertEqual([m["action"] for m in ws.messages()], ["notification", "pong"])
+            await queue.close()
+
+        asyncio.run(run_test())
+
+    def test_size_split_and_compression(self):
+        async def run_test():
+            ws = FakeWebSocket()
+            queue = make_queue(ws, max_messages=2, compress_threshold=10)
+            for i in range(3):
+                await queue.send({"action": "notification", "message": "x" * 50})
+            await asyncio.sleep(0.05)
+            self.assertEqual([len(f.get("messages", [f])) for f in ws.frames], [2, 1])
+            await queue.close()
+
+        asyncio.run(run_test())
+
+    def test_latest_status_wins_and_logs_merge(self):
+        async def run_test():
+            ws = FakeWebSocket()
+            queue = make_queue(ws)
+            await queue.send({"action": "run_code", "node": "a", "status": "running"})
+            await queue.send({"action": "package_manager:log", "type": "stdout", "line": "one"})
+            await queue.send({"action": "package_manager:log", "type": "stdout", "line": "two"})
+            await queue.send({"action": "run_code", "node": "a", "status": "finished"})
+            await asyncio.sleep(0.05)
+            messages = ws.messages()
+            self.assertEqual(len(messages), 2)
+            self.assertEqual(messages[0]["line"], "one\ntwo")
+            self.assertEqual(messages[1]["status"], "finished")
+            await queue.close()
+
+        asyncio.run(run_test())
+
+    def test_recorded_encoding_is_sent_as_is(self):
+        async def run_test():
+            ws = FakeWebSocket()
+            queue = make_queue(ws)
+            session = ResumableSession("user", "default", outbox_size=10)
+            message, encoded = session.record({"action": "notification", "message": "hi"})
+            with patch("app.api.outbound.json.dumps", side_effect=AssertionError("encoded twice")):
+                await queue.send(message, encoded)
+                await asyncio.sleep(0.05)
+            self.assertEqual(ws.messages(), [{"action": "notification", "message": "hi", "seq": 1}])
+            self.assertEqual(session.outbox_bytes, len(encoded))
+            await queue.close()
+
+        asyncio.run(run_test())
+
+    def test_slow_consumer_is_disconnected(self):
+        async def run_test():
+            ws = FakeWebSocket(delay=1)
+            queue = make_queue(ws, interval_ms=0, send_timeout=0.05)
+            await queue.send({"action": "notification"})
+            await asyncio.sleep(0.1)
+            self.assertEqual(ws.close_code, 1013)
+            await queue.send({"action": "notification"})
+            self.assertEqual(len(queue.pending), 0)
+            await queue.close()
+
+        asyncio.run(run_test())
+
+    def test_stalled_close_handshake_is_dropped(self):
+        async def run_test():
+            ws = FakeWebSocket(delay=10, close_delay=10)
+            queue = make_queue(ws, interval_ms=0, send_timeout=0.05)
+            await queue.send({"action": "notification"})
+            await asyncio.wait_for(queue.writer_task, timeout=1)
+            self.assertTrue(queue.closed)
+            self.assertIsNone(ws.close_code)
+            self.assertEqual(len(queue.pending), 0)
+            await queue.close()
+
+        asyncio.run(run_test())
+
+    def test_queue_bound_disconnects(self):
+        async def run_test():
+            ws = FakeWebSocket()
+            queue = make_queue(ws, interval_ms=1000, max_queue=3)
+            for i in range(4):
+                await queue.send({"action": "notification"})
+            self.assertEqual(ws.close_code, 1013)
+            await queue.close()
+
+        asyncio.run(run_test())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import os
+import uuid
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+from app.services import project_history
+
+def _project(nodes, edges=()):
+    return {"meta": {"name": "P"}, "nodes": list(nodes), "edges": list(edges)}
+
+class TestProjectHistory(unittest.TestCase):
+    def setUp(self):
+        self.projects_dir = tempfile.mkdtemp()
+        project_history._last_recorded.clear()
+
+    def tearDown(self):
+        shutil.rmtree(self.projects_dir)
+
+    def _object_count(self):
+        root = os.path.join(self.projects_dir, ".history", "objects")
+        return sum(len(files) for _, _, files in os.walk(root))
+
+    def _record(self, project_data, at):
+        with patch("app.services.project_history.time.time", return_value=at):
+            return project_history.record_version(self.projects_dir, "p", project_data)
+
+    def test_versions_share_unchanged_bodies(self):
+        a, b = {"id": "a", "code": "1"}, {"id": "b", "code": "2"}
+        v1 = self._record(_project([a, b]), 1000)
+        v2 = self._record(_project([a, {"id": "b", "code": "3"}, {"id": "c"}]), 2000)
+
+        # a is stored once for both versions
+        self.assertEqual(self._object_count(), 4)
+        self.assertEqual([v["version"] for v in project_history.list_versions(self.projects_dir, "p")], [v2, v1])
+        self.assertEqual(project_history.load_version(self.projects_dir, "p", v1)["nodes"], [a, b])
+
+        diff = project_history.diff_versions(self.projects_dir, "p", v1, v2)
+        self.assertEqual(diff["nodes"], {"added": ["c"], "removed": [], "changed": ["b"]})
+
+    def test_throttled_and_unchanged_saves_are_skipped(self):
+        nodes = [{"id": "a"}]
+        self.assertIsNotNone(self._record(_project(nodes), 1000))
+        self.assertIsNone(self._record(_project([{"id": "b"}]), 1010))
+        self.assertIsNone(self._record(_project(nodes), 5000))
+        self.assertEqual(len(project_history.list_versions(self.projects_dir, "p")), 1)
+
+    def test_retention_collects_unreferenced_objects(self):
+        with patch("app.services.project_history.PROJECT_HISTORY_MAX_VERSIONS", 2):
+            for i in range(4):
+                self._record(_project([{"id": "a", "v": i}]), 1000 * (i + 1))
+
+        self.assertEqual(len(project_history.list_versions(self.projects_dir, "p")), 2)
+        self.assertEqual(self._object_count(), 2)
+
+        project_history.delete_history(self.projects_dir, "p")
+        self.assertEqual(self._object_count(), 0)
+
+    def test_invalid_version_is_rejected(self):
+        with self.assertRaises(ValueError):
+            project_history.load_version(self.projects_dir, "p", "../../secret")
+
+    def test_invalid_project_id_is_rejected(self):
+        for project_id in ["../../victim", "a/b", "..", "", None]:
+            with self.assertRaises(ValueError):
+                project_history.delete_history(self.projects_dir, project_id)
+            with self.assertRaises(ValueError):
+                project_history.record_version(self.projects_dir, project_id, _project([]), force=True)
+            with self.assertRaises(ValueError):
+                project_history.list_versions(self.projects_dir, project_id)
+        self.assertEqual(project_history.list_versions(self.projects_dir, str(uuid.uuid4())), [])
+
+    def test_symlinked_versions_dir_is_rejected(self):
+        outside = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, outside)
+        open(os.path.join(outside, "data.txt"), "w").close()
+        versions_root = os.path.join(self.projects_dir, ".history", "versions")
+        os.makedirs(versions_root)
+        os.symlink(outside, os.path.join(versions_root, "p"))
+        with self.assertRaises(ValueError):
+            project_history.delete_history(self.projects_dir, "p")
+        self.assertTrue(os.path.exists(os.path.join(outside, "data.txt")))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+from app.services import project_index
+
+class TestProjectIndex(unittest.TestCase):
+    def setUp(self):
+        self.projects_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.projects_dir)
+
+    def _write_project(self, project_id, name, updated_at):
+        meta = {"name": name, "createdAt": updated_at, "updatedAt": updated_at}
+        with open(os.path.join(self.projects_dir, f"{project_id}.json"), "w", encoding="utf-8") as f:
+            json.dump({"meta": meta, "nodes": [], "edges": []}, f)
+        return meta
+
+    def test_list_uses_index_without_parsing_projects(self):
+        meta = self._write_project("a", "First", "2024-01-01")
+        project_index.record_project(self.projects_dir, "a", meta)
+        meta = self._write_project("b", "Second", "2024-02-01")
+        project_index.record_project(self.projects_dir, "b", meta)
+
+        with patch("app.services.project_index._read_entry") as read_entry:
+            projects = project_index.list_projects(self.projects_dir)
+            read_entry.assert_not_called()
+
+        self.assertEqual([p["id"] for p in projects], ["b", "a"])
+        self.assertEqual(project_index.count_projects(self.projects_dir), 2)
+
+    def test_heals_stray_and_deleted_files(self):
+        meta = self._write_project("a", "First", "2024-01-01")
+        project_index.record_project(self.projects_dir, "a", meta)
+
+        # Written without going through the index, then 'a' removed behind its back
+        self._write_project("stray", "Stray", "2024-03-01")
+        os.remove(os.path.join(self.projects_dir, "a.json"))
+        with open(os.path.join(self.projects_dir, "broken.json"), "w") as f:
+            f.write("{not json")
+
+        projects = project_index.list_projects(self.projects_dir)
+        self.assertEqual([p["id"] for p in projects], ["stray"])
+        self.assertEqual(projects[0]["name"], "Stray")
+
+    def test_rename_outside_index_is_detected(self):
+        meta = self._write_project("a", "First", "2024-01-01")
+        project_index.record_project(self.projects_dir, "a", meta)
+        self._write_project("a", "Renamed elsewhere", "2024-05-01")
+        os.utime(os.path.join(self.projects_dir, "a.json"), ns=(1, 1))
+
+        self.assertEqual(project_index.get_meta(self.projects_dir, "a")["name"], "Renamed elsewhere")
+
+    def test_remove_project(self):
+        meta = self._write_project("a", "First", "2024-01-01")
+        project_index.record_project(self.projects_dir, "a", meta)
+        os.remove(os.path.join(self.projects_dir, "a.json"))
+        project_index.remove_project(self.projects_dir, "a")
+
+        self.assertIsNone(project_index.get_meta(self.projects_dir, "a"))
+        self.assertEqual(project_index.list_projects(self.projects_dir), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+from app.services import project_journal
+
+class TestProjectJournal(unittest.TestCase):
+    def setUp(self):
+        self.projects_dir = tempfile.mkdtemp()
+        project_journal._entry_counts.clear()
+        snapshot = {
+            "meta": {"name": "P", "createdAt": "t0", "updatedAt": "t0"},
+            "nodes": [{"id": "a", "x": 1}, {"id": "b", "x": 2}],
+            "edges": [{"id": "e1", "source": "a", "target": "b"}]
+        }
+        with open(project_journal.snapshot_path(self.projects_dir, "p"), "w", encoding="utf-8") as f:
+            json.dump(snapshot, f)
+
+    def tearDown(self):
+        shutil.rmtree(self.projects_dir)
+
+    def test_load_replays_journal(self):
+        project_journal.append_patch(self.projects_dir, "p", [
+            {"op": "upsert", "collection": "nodes", "id": "a", "value": {"x": 10}},
+            {"op": "upsert", "collection": "nodes", "id": "c", "value": {"x": 3}},
+        ], "t1")
+        project_journal.append_patch(self.projects_dir, "p", [
+            {"op": "remove", "collection": "edges", "id": "e1"},
+            {"op": "order", "collection": "nodes", "ids": ["c", "a", "b"]},
+        ], "t2")
+
+        data = project_journal.load_project(self.projects_dir, "p")
+        self.assertEqual(data["nodes"], [{"id": "c", "x": 3}, {"id": "a", "x": 10}, {"id": "b", "x": 2}])
+        self.assertEqual(data["edges"], [])
+        self.assertEqual(data["meta"]["updatedAt"], "t2")
+
+    def test_torn_last_line_is_ignored(self):
+        project_journal.append_patch(self.projects_dir, "p", [
+            {"op": "remove", "collection": "nodes", "id": "b"},
+        ], "t1")
+        with open(project_journal.journal_path(self.projects_dir, "p"), "a", encoding="utf-8") as f:
+            f.write('{"updatedAt": "t2", "ops": [')
+
+        data = project_journal.load_project(self.projects_dir, "p")
+        self.assertEqual([n["id"] for n in data["nodes"]], ["a"])
+
+    def test_compaction_folds_journal_into_snapshot(self):
+        ops = [{"op": "upsert", "collection": "nodes", "id": "a", "value": {"x": 5}}]
+        with patch("app.services.project_journal.PROJECT_JOURNAL_MAX_ENTRIES", 2):
+            self.assertFalse(project_journal.append_patch(self.projects_dir, "p", ops, "t1"))
+            self.assertTrue(project_journal.append_patch(self.projects_dir, "p", ops, "t2"))
+
+        project_journal.compact(self.projects_dir, "p")
+        self.assertFalse(os.path.exists(project_journal.journal_path(self.projects_dir, "p")))
+        with open(project_journal.snapshot_path(self.projects_dir, "p"), "r", encoding="utf-8") as f:
+            snapshot = json.load(f)
+        self.assertEqual(snapshot["nodes"][0], {"id": "a", "x": 5})
+        self.assertEqual(snapshot["meta"]["updatedAt"], "t2")
+
+    def test_invalid_ops_are_rejected(self):
+        for ops in ({"op": "upsert"}, [{"op": "move", "collection": "nodes", "id": "a"}],
+                    [{"op": "upsert", "collection": "nodes", "id": "a"}]):
+            with self.assertRaises(ValueError):
+                project_journal.validate_ops(ops)
+
+if __name__ == '__main__':
+    unittest.main()
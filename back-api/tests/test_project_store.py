@@ -0,0 +1,102 @@
+import os
+import json
+import shutil
+import asyncio
+import tempfile
+import unittest
+from unittest.mock import patch
+from app.services import project_journal
+from app.services.project_store import ProjectStore
+
+class TestProjectStore(unittest.TestCase):
+    def setUp(self):
+        self.projects_dir = tempfile.mkdtemp()
+        project_journal._entry_counts.clear()
+
+    def tearDown(self):
+        shutil.rmtree(self.projects_dir)
+
+    def _read_snapshot(self, project_id):
+        with open(project_journal.snapshot_path(self.projects_dir, project_id), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def test_saves_are_coalesced(self):
+        async def scenario():
+            store = ProjectStore(delay_ms=20)
+            store.create(self.projects_dir, "p", {"name": "P", "createdAt": "t0", "updatedAt": "t0"})
+            for i in range(5):
+                store.save_graph(self.projects_dir, "p", [{"id": "a", "x": i}], [], f"t{i + 1}")
+            store.rename(self.projects_dir, "p", "Renamed", "t9")
+            self.assertFalse(os.path.exists(project_journal.snapshot_path(self.projects_dir, "p")))
+            await asyncio.sleep(0.1)
+            return store
+
+        store = asyncio.run(scenario())
+        snapshot = self._read_snapshot("p")
+        self.assertEqual(snapshot["nodes"], [{"id": "a", "x": 4}])
+        self.assertEqual(snapshot["meta"], {"name": "Renamed", "createdAt": "t0", "updatedAt": "t9"})
+        self.assertEqual(store.flushes, 1)
+        self.assertEqual(store.coalescing_ratio(), 7.0)
+
+    def test_patches_are_journaled_once_per_flush(self):
+        async def scenario():
+            store = ProjectStore(delay_ms=1000)
+            store.create(self.projects_dir, "p", {"name": "P", "createdAt": "t0", "updatedAt": "t0"})
+            await store.flush_all()
+            store.apply_patch(self.projects_dir, "p", [
+                {"op": "upsert", "collection": "nodes", "id": "a", "value": {"x": 1}}
+            ], "t1")
+            store.apply_patch(self.projects_dir, "p", [
+                {"op": "upsert", "collection": "nodes", "id": "b", "value": {"x": 2}}
+            ], "t2")
+            # Reads flush first
+            return await store.load(self.projects_dir, "p")
+
+        data = asyncio.run(scenario())
+        self.assertEqual([n["id"] for n in data["nodes"]], ["a", "b"])
+        self.assertEqual(data["meta"]["updatedAt"], "t2")
+        with open(project_journal.journal_path(self.projects_dir, "p"), "r", encoding="utf-8") as f:
+            self.assertEqual(len(f.readlines()), 1)
+
+    def test_failed_flush_keeps_mutations(self):
+        async def scenario():
+            store = ProjectStore(delay_ms=1000)
+            store.create(self.projects_dir, "p", {"name": "P", "createdAt": "t0", "updatedAt": "t0"})
+            with patch("app.services.project_store.write_json_atomic", side_effect=OSError(28, "No space left")):
+                await store.flush_all()
+            self.assertTrue(await store.exists(self.projects_dir, "p"))
+            await store.flush_all()
+            return await store.list_projects(self.projects_dir)
+
+        projects = asyncio.run(scenario())
+        self.assertEqual([p["id"] for p in projects], ["p"])
+
+    def test_delete_drops_pending_writes(self):
+        async def scenario():
+            store = ProjectStore(delay_ms=1000)
+            store.create(self.projects_dir, "p", {"name": "P", "createdAt": "t0", "updatedAt": "t0"})
+            await store.delete(self.projects_dir, "p")
+            await store.flush_all()
+            return await store.exists(self.projects_dir, "p")
+
+        self.assertFalse(asyncio.run(scenario()))
+
+    def test_traversal_project_id_is_rejected(self):
+        # versions/<project_id> resolved to a directory next to the user's projects dir
+        victim_dir = os.path.join(self.projects_dir, "victim")
+        projects_dir = os.path.join(self.projects_dir, "users", "me", "projects")
+        os.makedirs(victim_dir)
+        os.makedirs(projects_dir)
+        open(os.path.join(victim_dir, "data.txt"), "w").close()
+        store = ProjectStore(delay_ms=1000)
+
+        with self.assertRaisesRegex(ValueError, "Invalid project id"):
+            asyncio.run(store.delete(projects_dir, "../../../../victim"))
+        with self.assertRaises(ValueError):
+            asyncio.run(store.load(projects_dir, "../victim"))
+        with self.assertRaises(ValueError):
+            store.create(projects_dir, "a/b", {})
+        self.assertTrue(os.path.exists(os.path.join(victim_dir, "data.txt")))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,34 @@
+import unittest
+from app.services import project_streaming
+
+class TestProjectStreaming(unittest.TestCase):
+    def test_skeleton_drops_heavy_data(self):
+        node = {
+            "id": "a",
+            "type": "custom",
+            "position": {"x": 1, "y": 2},
+            "data": {"title": "Load", "code": "print(1)", "notes": "x" * 1000, "inputs": []}
+        }
+        skeleton = project_streaming.node_skeleton(node)
+        self.assertEqual(skeleton["data"], {"title": "Load", "inputs": []})
+        self.assertEqual(skeleton["position"], {"x": 1, "y": 2})
+        self.assertIn("code", node["data"])
+        self.assertEqual(project_streaming.node_body(node), {"id": "a", "data": node["data"]})
+
+    def test_visible_nodes_come_first(self):
+        nodes = [
+            {"id": "far", "position": {"x": 5000, "y": 0}},
+            {"id": "near", "position": {"x": 900, "y": 100}},
+            {"id": "visible", "position": {"x": 50, "y": 50}},
+        ]
+        viewport = {"x": 0, "y": 0, "width": 800, "height": 600}
+        ordered = project_streaming.order_by_viewport(nodes, viewport)
+        self.assertEqual([n["id"] for n in ordered], ["visible", "near", "far"])
+        self.assertEqual(project_streaming.order_by_viewport(nodes, None), nodes)
+
+    def test_chunks(self):
+        chunks = list(project_streaming.iter_chunks(list(range(5)), 2))
+        self.assertEqual(chunks, [[0, 1], [2, 3], [4]])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+from unittest.mock import patch
+from app.services.sessions import SessionRegistry
+
+class TestSessions(unittest.TestCase):
+    def setUp(self):
+        self.registry = SessionRegistry(grace_seconds=60, outbox_size=3)
+
+    def test_missed_since_replays_newer_messages(self):
+        session = self.registry.create("alice", "default")
+        for i in range(3):
+            session.record({"action": "run_code", "i": i})
+
+        missed = session.missed_since(1)
+        self.assertEqual([m["seq"] for m in missed], [2, 3])
+        self.assertEqual(session.missed_since(3), [])
+
+    def test_missed_since_detects_gap(self):
+        session = self.registry.create("alice", "default")
+        for i in range(5):
+            session.record({"action": "run_code", "i": i})
+
+        # Messages 1 and 2 were dropped from the outbox
+        self.assertIsNone(session.missed_since(0))
+        self.assertEqual([m["seq"] for m in session.missed_since(2)], [3, 4, 5])
+
+    def test_outbox_is_bounded_in_bytes(self):
+        registry = SessionRegistry(grace_seconds=60, outbox_size=100, outbox_max_bytes=1000)
+        session = registry.create("alice", "default")
+        session.record({"action": "run_code", "i": 0})
+        session.record({"action": "fs_read", "content": "x" * 600})
+        session.record({"action": "fs_read", "content": "y" * 600})
+        self.assertLessEqual(session.outbox_bytes, 1000)
+        self.assertEqual([m["seq"] for m in session.outbox], [3])
+        self.assertIsNone(session.missed_since(1))
+        self.assertEqual([m["seq"] for m in session.missed_since(2)], [3])
+
+        # A message over the whole budget isn't kept either, and still counts as missed
+        session.record({"action": "load_project", "content": "z" * 2000})
+        self.assertEqual(len(session.outbox), 0)
+        self.assertEqual(session.outbox_bytes, 0)
+        self.assertIsNone(session.missed_since(3))
+        self.assertEqual(session.missed_since(4), [])
+
+    def test_new_login_supersedes_previous_session(self):
+        first = self.registry.create("alice", "default")
+        second = self.registry.create("alice", "default")
+        self.assertIsNone(self.registry.get(first.token))
+        self.assertIs(self.registry.get(second.token), second)
+
+    def test_session_expires_after_grace(self):
+        session = self.registry.create("alice", "default")
+        conn = object()
+        session.attach(conn)
+        with patch("app.services.sessions.time.time", return_value=1000.0):
+            session.detach(conn)
+        with patch("app.services.sessions.time.time", return_value=1030.0):
+            self.assertIs(self.registry.get(session.token), session)
+        with patch("app.services.sessions.time.time", return_value=1100.0):
+            self.assertIsNone(self.registry.get(session.token))
+
+if __name__ == '__main__':
+    unittest.main()
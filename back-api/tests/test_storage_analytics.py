@@ -0,0 +1,55 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from app.core import storage_manager
+from app.services import storage_analytics
+
+class TestStorageAnalytics(unittest.TestCase):
+    def setUp(self):
+        self.user_dir = tempfile.mkdtemp()
+        storage_analytics._cache.clear()
+        storage_analytics._previous.clear()
+        self._write("kernel_data/files/small.txt", 10)
+        self._write("kernel_data/files/data/big.csv", 1000)
+        self._write("kernel_data/.states/node-1.pkl", 300)
+        self._write("kernel_data/.states/orphan.pkl", 50)
+        self._write("kernel.log", 5)
+        project = {"meta": {"name": "Demo"}, "nodes": [{"id": "node-1", "data": {"title": "Loader"}}], "edges": []}
+        os.makedirs(os.path.join(self.user_dir, "projects"))
+        with open(os.path.join(self.user_dir, "projects", "p.json"), "w", encoding="utf-8") as f:
+            json.dump(project, f)
+
+    def tearDown(self):
+        shutil.rmtree(self.user_dir)
+
+    def _write(self, relative_path, size):
+        path = os.path.join(self.user_dir, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(b"x" * size)
+
+    def test_single_pass_analytics(self):
+        stats = storage_analytics.analyze(self.user_dir, top_n=1)
+        self.assertEqual(stats["categories"]["files"], {"size": 1010, "count": 2})
+        self.assertEqual(stats["categories"]["states"], {"size": 350, "count": 2})
+        self.assertEqual(stats["categories"]["other"], {"size": 5, "count": 1})
+        self.assertEqual(stats["top_files"], [{"path": os.path.join("data", "big.csv"), "size": 1000}])
+        self.assertEqual(stats["node_states"][0], {"node_id": "node-1", "size": 300, "project": "Demo", "node": "Loader"})
+        self.assertIsNone(stats["node_states"][1]["node"])
+        self.assertIsNone(stats["growth"])
+
+    def test_cache_is_invalidated_by_writes(self):
+        storage_analytics.analyze(self.user_dir)
+        self.assertTrue(storage_analytics.analyze(self.user_dir)["cached"])
+
+        self._write("kernel_data/files/new.bin", 500)
+        storage_manager.record_usage_delta(self.user_dir, 500)
+        stats = storage_analytics.analyze(self.user_dir)
+        self.assertFalse(stats["cached"])
+        self.assertEqual(stats["growth"]["total"], 500)
+        self.assertEqual(stats["growth"]["categories"]["files"], 500)
+
+if __name__ == '__main__':
+    unittest.main()
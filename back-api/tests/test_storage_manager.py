@@ -1,4 +1,6 @@
 import os
+import asyncio
+import threading
 import shutil
 import tempfile
 import unittest
@@ -47,5 +49,55 @@ class TestStorageManager(unittest.TestCase):
             is_valid = storage_manager.check_user_quota(self.user_id, incoming_bytes=0)
             self.assertFalse(is_valid)
 
+    def test_quota_check_uses_usage_counter(self):
+        file_path = os.path.join(self.user_storage, "sample.txt")
+        with open(file_path, "wb") as f:
+            f.write(b"x" * 1024)
+
+        with patch("app.core.storage_manager.STORAGE_DIR", self.temp_dir), \
+             patch("app.core.storage_manager.get_tier_config", return_value={"max_disk_mb": 1}):
+            self.assertTrue(storage_manager.check_user_quota(self.user_id))
+            user_dir = storage_manager.get_user_dir(self.user_id)
+
+            # Later checks don't scan the tree: they read the counter kept by the write paths
+            with patch("app.core.storage_manager._scan_bytes") as scan:
+                storage_manager.record_usage_delta(user_dir, 2 * 1024 * 1024)
+                self.assertFalse(storage_manager.check_user_quota(self.user_id))
+                scan.assert_not_called()
+
+    def test_async_quota_check_scans_cold_usage_off_the_loop(self):
+        with open(os.path.join(self.user_storage, "sample.txt"), "wb") as f:
+            f.write(b"x" * (2 * 1024 * 1024))
+        scan_threads = []
+        scan_bytes = storage_manager._scan_bytes
+
+        def scan(path):
+            scan_threads.append(threading.current_thread())
+            return scan_bytes(path)
+
+        with patch("app.core.storage_manager.STORAGE_DIR", self.temp_dir), \
+             patch("app.core.storage_manager.get_tier_config", return_value={"max_disk_mb": 1}), \
+             patch("app.core.storage_manager._scan_bytes", side_effect=scan):
+            self.assertFalse(asyncio.run(storage_manager.check_user_quota_async(self.user_id)))
+            # Warm: the counter is read, nothing is scanned again
+            self.assertFalse(asyncio.run(storage_manager.check_user_quota_async(self.user_id)))
+        self.assertEqual(len(scan_threads), 1)
+        self.assertIsNot(scan_threads[0], threading.main_thread())
+
+    def test_reconcile_corrects_drift(self):
+        with patch("app.core.storage_manager.STORAGE_DIR", self.temp_dir):
+            user_dir = storage_manager.get_user_dir(self.user_id)
+            self.assertEqual(storage_manager.get_cached_usage(user_dir), 0)
+
+            # Written behind our back (e.g. by the kernel)
+            with open(os.path.join(self.user_storage, "state.pkl"), "wb") as f:
+                f.write(b"x" * 2048)
+            self.assertEqual(storage_manager.reconcile_usage(3600, [user_dir]), 0)
+            self.assertEqual(storage_manager.get_cached_usage(user_dir), 0)
+
+            storage_manager.mark_usage_stale(user_dir)
+            self.assertEqual(storage_manager.reconcile_usage(3600, [user_dir]), 1)
+            self.assertEqual(storage_manager.get_cached_usage(user_dir), 2048)
+
 if __name__ == "__main__":
     unittest.main()
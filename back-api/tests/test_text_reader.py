@@ -0,0 +1,66 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+from app.services import text_reader
+
+class TestTextReader(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "log.txt")
+        self.lines = [f"line {i} " + "x" * (i % 7) for i in range(500)]
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write("\n".join(self.lines) + "\n")
+        text_reader._indexes.clear()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_line_ranges_use_the_sparse_index(self):
+        with patch("app.services.text_reader.INDEX_BLOCK_BYTES", 64):
+            page = text_reader.read_lines(self.path, 10, 3, 1024)
+            self.assertEqual(page["lines"], self.lines[10:13])
+            self.assertIsNone(page["total_lines"])
+            # Indexed just past the lines asked for
+            self.assertLess(len(text_reader._indexes[self.path].newlines_before), 10)
+
+            self.assertEqual(text_reader.read_lines(self.path, 300, 2, 1024)["lines"], self.lines[300:302])
+            last = text_reader.read_lines(self.path, 498, 10, 1024)
+            self.assertEqual(last["lines"], self.lines[498:])
+            self.assertTrue(last["eof"])
+            self.assertEqual(last["total_lines"], 500)
+            self.assertEqual(text_reader.read_lines(self.path, 500, 10, 1024)["lines"], [])
+
+    def test_pages_are_bounded_by_bytes(self):
+        page = text_reader.read_lines(self.path, 0, 100, 40)
+        self.assertEqual(page["lines"], self.lines[:4])
+        self.assertFalse(page["eof"])
+
+        cut = text_reader.read_lines(self.path, 6, 1, 5)
+        self.assertEqual(cut["lines"], ["line "])
+        self.assertTrue(cut["truncated"])
+
+    def test_tail(self):
+        with patch("app.services.text_reader.INDEX_BLOCK_BYTES", 16):
+            tail = text_reader.read_tail(self.path, 3, 1024)
+        self.assertEqual(tail["lines"], self.lines[-3:])
+        with open(self.path, "rb") as f:
+            f.seek(tail["offset"])
+            self.assertEqual(f.readline().decode().rstrip("\n"), self.lines[-3])
+
+    def test_empty_file_has_no_lines(self):
+        open(self.path, "w").close()
+        self.assertEqual(text_reader.read_tail(self.path, 10, 1024), {"lines": [], "offset": 0, "size": 0})
+        self.assertEqual(text_reader.read_lines(self.path, 0, 10, 1024)["lines"], [])
+
+    def test_byte_ranges_do_not_split_characters(self):
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write("aé")
+        part = text_reader.read_bytes(self.path, 0, 2)
+        self.assertEqual(part["content"], "a")
+        self.assertEqual(part["next_offset"], 1)
+        self.assertEqual(text_reader.read_bytes(self.path, 1, 2)["content"], "é")
+
+if __name__ == '__main__':
+    unittest.main()
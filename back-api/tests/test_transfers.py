@@ -0,0 +1,106 @@
+import os
+import time
+import base64
+import shutil
+import asyncio
+import tempfile
+import unittest
+from app.core import storage_manager
+from app.services.transfers import TransferManager, TransferError, chunk_checksum
+
+def _chunk(data: bytes):
+    return base64.b64encode(data).decode("ascii"), chunk_checksum(data)
+
+class TestTransfers(unittest.TestCase):
+    def setUp(self):
+        self.user_dir = tempfile.mkdtemp()
+        self.manager = TransferManager(chunk_bytes=4)
+
+    def tearDown(self):
+        shutil.rmtree(self.user_dir)
+
+    def test_upload_resumes_from_disk(self):
+        start = asyncio.run(self.manager.start_upload(self.user_dir, "data/a.bin", 6))
+        transfer_id = start["transfer_id"]
+        self.assertEqual(asyncio.run(self.manager.write_chunk(self.user_dir, transfer_id, 0, *_chunk(b"abcd"))), 4)
+
+        # A fresh manager (e.g. after a restart) resumes from what is on disk
+        manager = TransferManager(chunk_bytes=4)
+        resumed = asyncio.run(manager.start_upload(self.user_dir, "data/a.bin", 6, transfer_id))
+        self.assertEqual(resumed["offset"], 4)
+
+        with self.assertRaises(TransferError) as ctx:
+            asyncio.run(manager.write_chunk(self.user_dir, transfer_id, 0, *_chunk(b"ab")))
+        self.assertEqual(ctx.exception.offset, 4)
+        with self.assertRaises(TransferError):
+            asyncio.run(manager.write_chunk(self.user_dir, transfer_id, 4, _chunk(b"ef")[0], chunk_checksum(b"xx")))
+
+        asyncio.run(manager.write_chunk(self.user_dir, transfer_id, 4, *_chunk(b"ef")))
+        target = os.path.join(self.user_dir, "files", "data", "a.bin")
+        self.assertEqual(asyncio.run(manager.finish_upload(self.user_dir, transfer_id, target)), 6)
+        with open(target, "rb") as f:
+            self.assertEqual(f.read(), b"abcdef")
+        self.assertEqual(os.listdir(os.path.join(self.user_dir, ".transfers")), [])
+
+    def test_uploads_reserve_their_size_against_the_quota(self):
+        storage_manager.reconcile_user_dir(self.user_dir)
+        first = asyncio.run(self.manager.start_upload(self.user_dir, "a.bin", 6, limit_bytes=10))["transfer_id"]
+        # Nothing written yet, but the first upload holds 6 of the 10 bytes
+        with self.assertRaises(TransferError) as ctx:
+            asyncio.run(self.manager.start_upload(self.user_dir, "b.bin", 6, limit_bytes=10))
+        self.assertEqual(str(ctx.exception), "STORAGE_QUOTA_EXCEEDED")
+        self.assertEqual(sorted(os.listdir(os.path.join(self.user_dir, ".transfers"))), [f"{first}.json", f"{first}.part"])
+
+        second = asyncio.run(self.manager.start_upload(self.user_dir, "b.bin", 4, limit_bytes=10))["transfer_id"]
+        asyncio.run(self.manager.write_chunk(self.user_dir, first, 0, *_chunk(b"abcd"), limit_bytes=10))
+        self.assertEqual(storage_manager.get_cached_usage(self.user_dir), 4)
+
+        # Chunks past the reservation are checked against the quota
+        storage_manager.reserve_usage(self.user_dir, second, 0)
+        storage_manager.reserve_usage(self.user_dir, "other", 6)
+        with self.assertRaises(TransferError) as ctx:
+            asyncio.run(self.manager.write_chunk(self.user_dir, second, 0, *_chunk(b"wxyz"), limit_bytes=10))
+        self.assertIsNone(ctx.exception.offset)
+        storage_manager.release_usage(self.user_dir, "other")
+
+        # Finishing or cancelling releases what is left
+        asyncio.run(self.manager.cancel_upload(self.user_dir, second))
+        asyncio.run(self.manager.write_chunk(self.user_dir, first, 4, *_chunk(b"ef"), limit_bytes=10))
+        asyncio.run(self.manager.finish_upload(self.user_dir, first, os.path.join(self.user_dir, "files", "a.bin")))
+        self.assertTrue(storage_manager.reserve_usage(self.user_dir, "next", 10, limit_bytes=10))
+        self.assertFalse(storage_manager.reserve_usage(self.user_dir, "more", 1, limit_bytes=10))
+        storage_manager.release_usage(self.user_dir, "next")
+
+    def test_download_in_chunks(self):
+        target = os.path.join(self.user_dir, "big.bin")
+        with open(target, "wb") as f:
+            f.write(b"0123456789")
+        transfer_id = self.manager.start_download(self.user_dir, "big.bin", target)["transfer_id"]
+
+        data, offset = b"", 0
+        while True:
+            chunk = asyncio.run(self.manager.read_chunk(self.user_dir, transfer_id, offset))
+            part = base64.b64decode(chunk["data"])
+            self.assertEqual(chunk_checksum(part), chunk["checksum"])
+            data += part
+            offset += len(part)
+            if chunk["eof"]:
+                break
+        self.assertEqual(data, b"0123456789")
+
+        with open(target, "ab") as f:
+            f.write(b"!")
+        with self.assertRaises(TransferError):
+            asyncio.run(self.manager.read_chunk(self.user_dir, transfer_id, 0))
+
+    def test_abandoned_uploads_are_purged(self):
+        transfer_id = asyncio.run(self.manager.start_upload(self.user_dir, "a.bin", 10))["transfer_id"]
+        self.assertEqual(self.manager.purge_expired([self.user_dir], ttl=60), 0)
+        part_path = os.path.join(self.user_dir, ".transfers", f"{transfer_id}.part")
+        os.utime(part_path, (time.time() - 120, time.time() - 120))
+        self.assertEqual(self.manager.purge_expired([self.user_dir], ttl=60), 1)
+        with self.assertRaises(TransferError):
+            self.manager.upload_path(self.user_dir, transfer_id)
+
+if __name__ == '__main__':
+    unittest.main()
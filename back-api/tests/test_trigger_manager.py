@@ -1,15 +1,19 @@
+import time
 import unittest
 import asyncio
+from datetime import datetime, timezone
 from unittest.mock import patch
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.orm import sessionmaker
-from app.core.database import Base
+from sqlalchemy.pool import StaticPool
+from app.core.database import Base, add_missing_columns
 from app.models.trigger import Trigger
 from app.services.trigger_manager import trigger_manager
 
 class TestTriggerManager(unittest.TestCase):
     def setUp(self):
-        self.engine = create_engine("sqlite:///:memory:")
+        # One shared connection: fire times are saved from a worker thread
+        self.engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False}, poolclass=StaticPool)
         self.TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
         Base.metadata.create_all(bind=self.engine)
         self.user_id = "user_test_1"
@@ -86,5 +90,151 @@ class TestTriggerManager(unittest.TestCase):
 
         asyncio.run(run_test())
 
+    def test_fire_due_before_delete_is_dropped(self):
+        fired = []
+
+        async def record_fire(user_id, project_id, node_id, output_data=None):
+            fired.append(node_id)
+
+        trigger_manager.register_scheduler("TestLateNode", lambda config, after, last_fired: after + 60, None)
+
+        async def run_test():
+            with patch("app.services.trigger_manager.SessionLocal", self.TestingSessionLocal), \
+                 patch.object(trigger_manager, "fire_trigger", record_fire):
+                await trigger_manager.update_trigger(self.user_id, self.project_id, "late", "TestLateNode", True, {})
+                # Popped from the heap as due, its fire not run yet when the trigger is deleted
+                timer = trigger_manager.timers["late"]
+                await trigger_manager.delete_trigger("late")
+                await trigger_manager._fire_timer("late", timer)
+                await trigger_manager.stop()
+
+        asyncio.run(run_test())
+        self.assertEqual(fired, [])
+
+    def test_scheduler_fires_due_timers_from_one_task(self):
+        fired = []
+
+        def next_fire(config, after, last_fired):
+            if config.get("once") and last_fired is not None:
+                return None
+            return after + config["every"]
+
+        async def record_fire(user_id, project_id, node_id, output_data=None):
+            fired.append((node_id, output_data["tick"]))
+
+        trigger_manager.register_scheduler("TestTickNode", next_fire, lambda config: {"tick": config["every"]})
+
+        async def run_test():
+            with patch("app.services.trigger_manager.SessionLocal", self.TestingSessionLocal), \
+                 patch.object(trigger_manager, "fire_trigger", record_fire):
+                for i in range(50):
+                    await trigger_manager.update_trigger(
+                        self.user_id, self.project_id, f"tick_{i}", "TestTickNode", True, {"every": 0.05}
+                    )
+                await trigger_manager.update_trigger(
+                    self.user_id, self.project_id, "once", "TestTickNode", True, {"every": 0.01, "once": True}
+                )
+                await asyncio.sleep(0.18)
+                # No task per trigger: the scheduler task serves them all
+                self.assertEqual(trigger_manager.active_tasks, {})
+                self.assertTrue(trigger_manager.has_active_triggers(self.user_id))
+                self.assertNotIn("once", trigger_manager.timers)
+
+                for i in range(50):
+                    await trigger_manager.delete_trigger(f"tick_{i}")
+                self.assertFalse(trigger_manager.has_active_triggers(self.user_id))
+                count = len(fired)
+                await asyncio.sleep(0.1)
+                self.assertEqual(len(fired), count)
+                await trigger_manager.stop()
+
+        asyncio.run(run_test())
+        self.assertEqual(sum(1 for node_id, _ in fired if node_id == "once"), 1)
+        self.assertGreaterEqual(sum(1 for node_id, _ in fired if node_id == "tick_0"), 2)
+        self.assertEqual({tick for _, tick in fired}, {0.05, 0.01})
+
+    def test_add_missing_columns_migrates_old_table(self):
+        engine = create_engine("sqlite:///:memory:", poolclass=StaticPool)
+        with engine.begin() as conn:
+            conn.execute(text(
+                "CREATE TABLE triggers (id VARCHAR(36) PRIMARY KEY, user_id VARCHAR(36) NOT NULL, "
+                "project_id VARCHAR(36) NOT NULL, node_type VARCHAR(64) NOT NULL, is_active BOOLEAN NOT NULL, "
+                "config_json TEXT NOT NULL, created_at DATETIME NOT NULL, updated_at DATETIME NOT NULL)"
+            ))
+        add_missing_columns(engine)
+        columns = {column["name"] for column in inspect(engine).get_columns("triggers")}
+        self.assertIn("next_fire_at", columns)
+        self.assertIn("last_fired_at", columns)
+        # Idempotent
+        add_missing_columns(engine)
+
+    def test_restore_resumes_schedule_and_applies_misfire_policy(self):
+        fired = []
+
+        def next_fire(config, after, last_fired):
+            return after + config["every"]
+
+        async def record_fire(user_id, project_id, node_id, output_data=None):
+            fired.append(node_id)
+
+        trigger_manager.register_scheduler("TestMisfireNode", next_fire)
+        now = time.time()
+
+        def utc(timestamp):
+            return datetime.fromtimestamp(timestamp, timezone.utc).replace(tzinfo=None)
+
+        db = self.TestingSessionLocal()
+        saved = {
+            # Missed 2 fires an hour apart
+            "skip": ({"every": 3600, "misfirePolicy": "skip"}, now - 2 * 3600 + 1),
+            "once": ({"every": 3600, "misfirePolicy": "fire_once"}, now - 2 * 3600 + 1),
+            "all": ({"every": 3600, "misfirePolicy": "fire_all"}, now - 2 * 3600 + 1),
+            "capped": ({"every": 60, "misfirePolicy": "fire_all"}, now - 3600),
+            "future": ({"every": 3600}, now + 1800),
+        }
+        for node_id, (config, next_fire_at) in saved.items():
+            trigger = Trigger(id=node_id, user_id=self.user_id, project_id=self.project_id, node_type="TestMisfireNode", is_active=True)
+            trigger.config = config
+            trigger.next_fire_at = utc(next_fire_at)
+            db.add(trigger)
+        db.commit()
+        db.close()
+
+        async def run_test():
+            with patch("app.services.trigger_manager.SessionLocal", self.TestingSessionLocal), \
+                 patch.object(trigger_manager, "fire_trigger", record_fire), \
+                 patch("app.services.trigger_manager.TRIGGER_STARTUP_JITTER", 0), \
+                 patch("app.services.trigger_manager.TRIGGER_MISFIRE_SPACING", 0.01), \
+                 patch("app.services.trigger_manager.TRIGGER_MISFIRE_MAX_FIRES", 3):
+                await trigger_manager.initialize()
+                self.assertAlmostEqual(trigger_manager.timers["future"].next_fire, now + 1800, delta=1)
+                await asyncio.sleep(0.3)
+
+                # Saving the node again keeps its schedule
+                await trigger_manager.update_trigger(self.user_id, self.project_id, "future", "TestMisfireNode", True, {"every": 3600})
+                self.assertAlmostEqual(trigger_manager.timers["future"].next_fire, now + 1800, delta=1)
+                await trigger_manager.stop()
+
+            db = self.TestingSessionLocal()
+            rows = {trigger.id: trigger for trigger in db.query(Trigger).all()}
+            db.close()
+            for node_id in saved:
+                await trigger_manager.delete_trigger(node_id)
+            return rows
+
+        with patch("app.services.trigger_manager.SessionLocal", self.TestingSessionLocal):
+            rows = asyncio.run(run_test())
+        self.assertEqual(fired.count("skip"), 0)
+        self.assertEqual(fired.count("once"), 1)
+        self.assertEqual(fired.count("all"), 2)
+        self.assertEqual(fired.count("capped"), 3)
+        self.assertEqual(fired.count("future"), 0)
+
+        # Fire times were saved, in the future and after the last fire
+        for node_id in ("skip", "once", "all", "capped"):
+            self.assertGreater(rows[node_id].next_fire_at, datetime.now(timezone.utc).replace(tzinfo=None))
+        self.assertIsNone(rows["skip"].last_fired_at)
+        self.assertIsNotNone(rows["all"].last_fired_at)
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,177 @@
+import os
+import shutil
+import asyncio
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+from app.services.trigger_runner import TriggerRunner, build_variables, _Graph
+from app.services.trigger_manager import trigger_manager
+
+def node(node_id, node_type="ManualNode", inputs=(), outputs=("out",), **data):
+    return {
+        "id": node_id,
+        "type": node_type,
+        "data": {
+            "code": f"# {node_id}",
+            "inputs": [{"id": f"in_{name}", "name": name} for name in inputs],
+            "outputs": [{"id": f"out_{name}", "name": name} for name in outputs],
+            **data
+        }
+    }
+
+def edge(source, target, output="out", input_name="x"):
+    return {"source": source, "target": target, "sourceHandle": f"out_{output}", "targetHandle": f"in_{input_name}"}
+
+class FakeProxy:
+    def __init__(self, user_dir):
+        self.user_id = "user_1"
+        self.tier = "default"
+        self.projects_dir = os.path.join(user_dir, "projects")
+        self.kernel_data_dir = os.path.join(user_dir, "kernel_data")
+        self.requests = []
+
+    async def send_request(self, request):
+        self.requests.append(request)
+        failed = request["node"] == "fails"
+        return {"status": "error" if failed else "finished", "output": "ok", "error": "boom" if failed else ""}
+
+class FakeUserManager:
+    def __init__(self, proxy):
+        self.users = {proxy.user_id: proxy}
+        self.active_connections = {}
+
+    def get_user(self, user_id, tier="default"):
+        return self.users[user_id]
+
+class TestTriggerRunner(unittest.TestCase):
+    def setUp(self):
+        self.user_dir = tempfile.mkdtemp()
+        self.proxy = FakeProxy(self.user_dir)
+        self.user_manager = FakeUserManager(self.proxy)
+        os.makedirs(os.path.join(self.proxy.kernel_data_dir, ".states"))
+        # T -> a (manual) -> b, c (auto) -> d (auto, also fed by b); e isn't auto; f waits on a node without state
+        self.project = {
+            "nodes": [
+                node("T", "TimerNode", outputs=("trigger",)),
+                node("a", inputs=("x",)),
+                node("b", "FastNode", inputs=("x",)),
+                node("c", inputs=("x",), autoTrigger=True),
+                node("d", "FastNode", inputs=("x", "y")),
+                node("e", inputs=("x",)),
+                node("f", "FastNode", inputs=("x", "y")),
+                node("stale")
+            ],
+            "edges": [
+                edge("T", "a", output="trigger"),
+                edge("a", "b"), edge("a", "c"), edge("a", "e"),
+                edge("b", "d"), edge("c", "d", input_name="y"),
+                edge("a", "f"), edge("stale", "f", input_name="y")
+            ]
+        }
+
+    def tearDown(self):
+        shutil.rmtree(self.user_dir)
+
+    def run_graph(self):
+        async def load(projects_dir, project_id):
+            return self.project
+
+        runner = TriggerRunner(max_concurrent=1)
+        with patch("app.services.trigger_runner.project_store.load", load), \
+             patch("app.services.trigger_runner.get_user_dir", lambda user_id: self.user_dir), \
+             patch("app.services.trigger_runner.node_registry.is_auto_trigger", lambda node_type: node_type == "FastNode"):
+            return asyncio.run(runner.run(self.user_manager, "user_1", "default", "p1", "T", "0000000000001-ab")), runner
+
+    def test_runs_downstream_nodes_in_order_once(self):
+        log, runner = self.run_graph()
+        ran = [request["node"] for request in self.proxy.requests]
+        self.assertEqual(ran, ["a", "b", "c", "d"])
+        self.assertEqual(log["status"], "finished")
+        self.assertEqual(self.proxy.requests[0]["variables"], [{"source": "T", "name": "trigger", "target": "x"}])
+
+        runs = runner.list_runs(self.user_dir, "p1")
+        self.assertEqual(runs[0]["node_count"], 4)
+        self.assertEqual(runner.read_run(self.user_dir, "0000000000001-ab")["nodes"][3]["node_id"], "d")
+        self.assertIsNone(runner.read_run(self.user_dir, "../../etc"))
+
+    def test_saved_inputs_are_ready_and_failures_stop_the_branch(self):
+        open(os.path.join(self.proxy.kernel_data_dir, ".states", "stale.pkl"), "wb").close()
+        self.project["nodes"][2]["id"] = "fails"
+        self.project["edges"][1]["target"] = "fails"
+        self.project["edges"][4]["source"] = "fails"
+        log, _ = self.run_graph()
+        self.assertEqual([request["node"] for request in self.proxy.requests], ["a", "fails", "c", "f"])
+        self.assertEqual(log["status"], "error")
+
+    def test_variables_fall_back_to_single_output(self):
+        nodes = {n["id"]: n for n in [node("s", outputs=("only",)), node("t", inputs=("x",))]}
+        variables = build_variables(nodes["t"], [edge("s", "t", output="other")], nodes)
+        self.assertEqual(variables, [{"source": "s", "name": "only", "target": "x"}])
+        with patch("app.services.trigger_runner.node_registry.is_auto_trigger", lambda node_type: node_type == "FastNode"):
+            self.assertEqual(_Graph(self.project, "T").reachable, {"a", "b", "c", "d", "f"})
+
+    def test_fire_runs_headless_unless_the_project_is_open(self):
+        class Connection:
+            def __init__(self, active_project_id):
+                self.session = type("Session", (), {"active_project_id": active_project_id})()
+                self.sent = []
+
+            def is_open(self):
+                return True
+
+            async def send_json(self, message):
+                self.sent.append(message)
+
+        submitted = []
+
+        async def submit(*args):
+            submitted.append(args[2:])
+
+        previous = trigger_manager.user_manager
+        trigger_manager.set_user_manager(self.user_manager)
+        try:
+            with patch("app.services.trigger_manager.STORAGE_DIR", self.user_dir), \
+                 patch("app.services.trigger_manager.trigger_runner.submit", submit):
+                asyncio.run(trigger_manager.fire_trigger("user_1", "p1", "T", {"timestamp": "now"}))
+                self.user_manager.active_connections["user_1"] = Connection("p1")
+                asyncio.run(trigger_manager.fire_trigger("user_1", "p1", "T", {"timestamp": "now"}))
+                self.user_manager.active_connections["user_1"] = Connection("p2")
+                asyncio.run(trigger_manager.fire_trigger("user_1", "p1", "T", {"timestamp": "now"}))
+        finally:
+            trigger_manager.set_user_manager(previous)
+        self.assertEqual(submitted, [("p1", "T"), ("p1", "T")])
+        self.assertTrue(os.path.exists(os.path.join(self.user_dir, "users", "user_1", "kernel_data", ".states", "T.pkl")))
+
+    def test_submit_looks_up_offline_tiers_off_the_loop(self):
+        async def slow_run(*args):
+            await asyncio.sleep(0.05)
+
+        async def run_test():
+            loop_thread = threading.get_ident()
+            runner = TriggerRunner()
+            # Not loaded: its tier comes from the database
+            self.user_manager.users.pop("user_1")
+            lookup_threads = []
+
+            def db_user_tier(user_id):
+                lookup_threads.append(threading.get_ident())
+                return "default"
+
+            with patch("app.services.trigger_runner._db_user_tier", db_user_tier), \
+                 patch("app.services.trigger_runner.get_tier_config", return_value={"max_headless_runs": 1}), \
+                 patch.object(runner, "run", slow_run):
+                run_ids = await asyncio.gather(
+                    runner.submit(self.user_manager, "user_1", "p1", "T"),
+                    runner.submit(self.user_manager, "user_1", "p1", "T")
+                )
+                await runner.stop()
+            self.assertEqual(len(lookup_threads), 2)
+            self.assertNotIn(loop_thread, lookup_threads)
+            # The cap held across the awaited lookups
+            self.assertEqual(sum(1 for run_id in run_ids if run_id), 1)
+
+        asyncio.run(run_test())
+
+if __name__ == "__main__":
+    unittest.main()
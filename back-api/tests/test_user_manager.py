@@ -0,0 +1,102 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+from app.services.user_manager import UserManager
+
+class FakeProxy:
+    def __init__(self, user_id, last_activity, busy=False, tier="default"):
+        self.user_id = user_id
+        self.tier = tier
+        self.container = object()
+        self.paused = False
+        self.last_activity = last_activity
+        self.busy = busy
+
+    def is_running(self):
+        return self.container is not None
+
+    def can_run_code(self):
+        return not self.busy
+
+    async def stop(self):
+        self.container = None
+
+class FakeConnection:
+    def is_open(self):
+        return True
+
+class TestUserManager(unittest.TestCase):
+    def setUp(self):
+        self.manager = UserManager()
+
+    def _add(self, proxy):
+        self.manager.users[proxy.user_id] = proxy
+        return proxy
+
+    def test_eviction_order_prefers_disconnected_and_idle(self):
+        connected = self._add(FakeProxy("connected", last_activity=1))
+        recent = self._add(FakeProxy("recent", last_activity=50))
+        oldest = self._add(FakeProxy("oldest", last_activity=10))
+        busy = self._add(FakeProxy("busy", last_activity=0, busy=True))
+        self.manager.active_connections["connected"] = FakeConnection()
+
+        order = self.manager.eviction_order([connected, recent, oldest, busy])
+        self.assertEqual([p.user_id for p in order], ["oldest", "recent", "connected"])
+
+    def test_reserve_kernel_slot_evicts_lru(self):
+        old = self._add(FakeProxy("old", last_activity=1))
+        new = self._add(FakeProxy("new", last_activity=2))
+        requester = self._add(FakeProxy("requester", last_activity=3))
+        requester.container = None
+
+        with patch("app.services.user_manager.KERNEL_BUDGET", {"max_kernels": 2}):
+            asyncio.run(self.manager.reserve_kernel_slot(requester))
+
+        self.assertIsNone(old.container)
+        self.assertIsNotNone(new.container)
+
+    def test_reserve_kernel_slot_refuses_when_nothing_evictable(self):
+        self._add(FakeProxy("busy", last_activity=1, busy=True))
+        requester = self._add(FakeProxy("requester", last_activity=3))
+        requester.container = None
+
+        with patch("app.services.user_manager.KERNEL_BUDGET", {"max_kernels": 1}):
+            with self.assertRaises(RuntimeError):
+                asyncio.run(self.manager.reserve_kernel_slot(requester))
+
+    def test_memory_budget(self):
+        old = self._add(FakeProxy("old", last_activity=1))
+        requester = self._add(FakeProxy("requester", last_activity=3))
+        requester.container = None
+
+        with patch("app.services.user_manager.KERNEL_BUDGET", {"max_memory_mb": 600}), \
+             patch("app.services.user_manager.get_tier_config", return_value={"mem_limit": "512m"}):
+            asyncio.run(self.manager.reserve_kernel_slot(requester))
+
+        self.assertIsNone(old.container)
+
+    def test_concurrent_starts_share_the_budget(self):
+        first = self._add(FakeProxy("first", last_activity=1))
+        second = self._add(FakeProxy("second", last_activity=2))
+        first.container = second.container = None
+
+        async def scenario():
+            # Neither kernel runs yet: the first slot must still count for the second start
+            return await asyncio.gather(
+                self.manager.reserve_kernel_slot(first),
+                self.manager.reserve_kernel_slot(second),
+                return_exceptions=True
+            )
+
+        with patch("app.services.user_manager.KERNEL_BUDGET", {"max_kernels": 1}):
+            results = asyncio.run(scenario())
+            self.assertIsNone(results[0])
+            self.assertIsInstance(results[1], RuntimeError)
+
+            # A failed (or finished) start gives its slot back
+            self.manager.release_kernel_slot(first)
+            asyncio.run(self.manager.reserve_kernel_slot(second))
+        self.assertEqual(self.manager.starting, {second})
+
+if __name__ == "__main__":
+    unittest.main()
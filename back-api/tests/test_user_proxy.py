@@ -0,0 +1,131 @@
+import json
+import shutil
+import asyncio
+import tempfile
+import unittest
+from unittest.mock import patch
+from kernel.handshake import KERNEL_VERSION, hello_message, read_ready_file, write_ready_file
+from app.services.user_proxy import UserKernelProxy
+
+class FakeBackend:
+    """Launches nothing: a test server plays the kernel, 'on_start' plays its startup."""
+    def __init__(self, proxy, on_start=None, exit_logs=None):
+        self.proxy = proxy
+        self.on_start = on_start
+        self.logs = exit_logs
+        self.address = None
+        self.running = False
+        self.stopped = False
+
+    def describe(self) -> str:
+        return "fake kernel"
+
+    def is_running(self) -> bool:
+        return self.running
+
+    async def start(self, config, launch_token):
+        self.running = True
+        if self.on_start:
+            self.on_start(launch_token)
+        return self.address
+
+    async def exit_logs(self):
+        return self.logs
+
+    async def stop(self):
+        self.running = False
+        self.stopped = True
+
+class TestKernelHandshake(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.storage_patch = patch("app.services.user_proxy.STORAGE_DIR", self.dir)
+        self.storage_patch.start()
+        self.proxy = UserKernelProxy("handshake_user", backend="local")
+
+    def tearDown(self):
+        self.storage_patch.stop()
+        shutil.rmtree(self.dir)
+
+    def _launch(self, hello=None, write_ready=True, exit_logs=None, ready_token=None):
+        """
+        Starts the proxy against a server sending 'hello' (a dict, raw bytes, or nothing
+        when None). The ready file is written with the launch token, or 'ready_token'.
+        """
+        async def run():
+            async def serve(reader, writer):
+                if hello is not None:
+                    writer.write(hello if isinstance(hello, bytes) else (json.dumps(hello) + "\n").encode())
+                    await writer.drain()
+                await reader.read()
+                writer.close()
+
+            server = await asyncio.start_server(serve, "127.0.0.1", 0)
+            backend = FakeBackend(self.proxy, exit_logs=exit_logs)
+
+            def on_start(launch_token):
+                self.launch_token = launch_token
+                if write_ready:
+                    write_ready_file(self.proxy.kernel_data_dir, "127.0.0.1", port, ready_token or launch_token)
+
+            port = server.sockets[0].getsockname()[1]
+            backend.address = ("127.0.0.1", port)
+            backend.on_start = on_start
+            self.proxy.backend = backend
+            try:
+                await self.proxy.start()
+            finally:
+                server.close()
+                if self.proxy.writer:
+                    self.proxy.writer.close()
+            return backend
+
+        return asyncio.run(run())
+
+    def test_handshake_success(self):
+        with patch("app.services.user_proxy.secrets.token_hex", return_value="t" * 32):
+            self._launch(hello=hello_message("t" * 32))
+        self.assertEqual(self.launch_token, "t" * 32)
+        self.assertEqual(self.proxy.kernel_info["version"], KERNEL_VERSION)
+        self.assertEqual(read_ready_file(self.proxy.kernel_data_dir)["token"], "t" * 32)
+
+    def test_wrong_token_fails(self):
+        with self.assertRaisesRegex(RuntimeError, "launch token mismatch"):
+            self._launch(hello=hello_message("not the launch token"))
+        self.assertTrue(self.proxy.backend.stopped)
+        self.assertIsNone(self.proxy.writer)
+
+    def test_wrong_version_fails(self):
+        with patch("app.services.user_proxy.secrets.token_hex", return_value="t" * 32):
+            with self.assertRaisesRegex(RuntimeError, "kernel version 0"):
+                self._launch(hello=dict(hello_message("t" * 32), version="0"))
+        self.assertTrue(self.proxy.backend.stopped)
+
+    def test_malformed_or_missing_hello_fails(self):
+        with self.assertRaisesRegex(RuntimeError, "Kernel handshake failed"):
+            self._launch(hello=b"not json\n")
+        with self.assertRaisesRegex(RuntimeError, "Kernel handshake failed"):
+            self._launch(hello={"action": "something_else"})
+        with patch("app.services.user_proxy.HELLO_TIMEOUT", 0.05):
+            with self.assertRaisesRegex(RuntimeError, "Kernel handshake failed"):
+                self._launch(hello=None)
+
+    def test_missing_ready_file_times_out(self):
+        with patch("app.services.user_proxy.KERNEL_START_TIMEOUT", 0.1):
+            with self.assertRaisesRegex(RuntimeError, "did not become ready in time"):
+                self._launch(hello=None, write_ready=False)
+        self.assertTrue(self.proxy.backend.stopped)
+
+    def test_stale_ready_file_is_ignored(self):
+        # Left by another launch: not a sign this kernel is ready
+        with patch("app.services.user_proxy.KERNEL_START_TIMEOUT", 0.1):
+            with self.assertRaisesRegex(RuntimeError, "did not become ready in time"):
+                self._launch(hello=None, ready_token="previous launch")
+
+    def test_kernel_exiting_during_startup_fails_fast(self):
+        with patch("app.services.user_proxy.LIVENESS_CHECK_INTERVAL", 0.02):
+            with self.assertRaisesRegex(RuntimeError, "exited immediately"):
+                self._launch(hello=None, write_ready=False, exit_logs="Traceback: boom")
+
+if __name__ == "__main__":
+    unittest.main()
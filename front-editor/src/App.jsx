@@ -1,4 +1,4 @@
-import React, { useMemo, useState } from 'react';
+import React, { useCallback, useMemo, useState } from 'react';
 import {
     ReactFlow,
     useNodesState,
@@ -47,6 +47,13 @@ function Flow() {
 
     const { screenToFlowPosition } = useReactFlow();
 
+    // Visible area in flow coordinates, so a streamed project load sends what is on screen first
+    const getViewportRect = useCallback(() => {
+        const topLeft = screenToFlowPosition({ x: 0, y: 0 });
+        const bottomRight = screenToFlowPosition({ x: window.innerWidth, y: window.innerHeight });
+        return { x: topLeft.x, y: topLeft.y, width: bottomRight.x - topLeft.x, height: bottomRight.y - topLeft.y };
+    }, [screenToFlowPosition]);
+
     const wsUrl = import.meta.env.VITE_WS_URL || "ws://127.0.0.1:8000/ws";
 
     const { wsRef, isConnected, sendMessage } = useWebSocket(wsUrl, setNodes, setServerConfig);
@@ -64,7 +71,7 @@ function Flow() {
         saveProjectToFile,
         loadProjectFromFile,
         loadProjectFromData
-    } = useProjectPersistence(nodes, edges, setNodes, setEdges, isConnected, sendMessage);
+    } = useProjectPersistence(nodes, edges, setNodes, setEdges, isConnected, sendMessage, getViewportRect);
     const { addNode } = useNodeFactory(nodes, setNodes);
 
     const { takeSnapshot } = useHistory(nodes, edges, setNodes, setEdges);
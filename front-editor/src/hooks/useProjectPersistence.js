@@ -40,7 +40,37 @@ const validateAndPrepareNodes = (rawNodes) => {
     });
 };
 
-export const useProjectPersistence = (nodes, edges, setNodes, setEdges, isConnected, sendMessage) => {
+const indexById = (items) => {
+    const map = new Map();
+    items.forEach(item => map.set(item.id, JSON.stringify(item)));
+    return map;
+};
+
+// Patch ops turning the last saved state of a collection (id -> serialized item) into 'items'
+const diffCollection = (collection, base, items) => {
+    const ops = [];
+    const current = indexById(items);
+    current.forEach((serialized, id) => {
+        if (base.get(id) !== serialized) {
+            ops.push({ op: "upsert", collection, id, value: JSON.parse(serialized) });
+        }
+    });
+    base.forEach((_, id) => {
+        if (!current.has(id)) {
+            ops.push({ op: "remove", collection, id });
+        }
+    });
+
+    // The server keeps existing items in place and appends new ones: send the order when it differs
+    const ids = [...current.keys()];
+    const expected = [...base.keys()].filter(id => current.has(id)).concat(ids.filter(id => !base.has(id)));
+    if (expected.some((id, i) => id !== ids[i])) {
+        ops.push({ op: "order", collection, ids });
+    }
+    return { ops, snapshot: current };
+};
+
+export const useProjectPersistence = (nodes, edges, setNodes, setEdges, isConnected, sendMessage, getViewportRect) => {
     const [isLoaded, setIsLoaded] = useState(false);
     const [openTabs, setOpenTabs] = useState([]);
     const [activeProjectId, setActiveProjectId] = useState(null);
@@ -50,6 +80,22 @@ export const useProjectPersistence = (nodes, edges, setNodes, setEdges, isConnec
     const nodesRef = useRef(nodes);
     const edgesRef = useRef(edges);
     const projectCacheRef = useRef({});
+    // Last state sent to the server per project, so autosaves only send what changed
+    const savedStateRef = useRef({});
+    // Project whose node bodies are still arriving (streamed load): it must not be saved meanwhile
+    const streamingProjectRef = useRef(null);
+    const getViewportRectRef = useRef(getViewportRect);
+    getViewportRectRef.current = getViewportRect;
+
+    // Large projects are streamed: skeleton first, then node bodies with the visible ones first
+    const requestLoad = useCallback((projectId) => {
+        sendMessage({
+            action: "load_project",
+            project_id: projectId,
+            stream: true,
+            viewport: getViewportRectRef.current ? getViewportRectRef.current() : undefined
+        });
+    }, [sendMessage]);
     const activeProjectIdRef = useRef(null);
 
     useEffect(() => {
@@ -108,12 +154,12 @@ export const useProjectPersistence = (nodes, edges, setNodes, setEdges, isConnec
                                 : updatedTabs[0].id;
                                 
                             setActiveProjectId(targetId);
-                            sendMessage({ action: "load_project", project_id: targetId });
+                            requestLoad(targetId);
                         } else {
                             const first = msg.projects[0];
                             setOpenTabs([{ id: first.id, name: first.name }]);
                             setActiveProjectId(first.id);
-                            sendMessage({ action: "load_project", project_id: first.id });
+                            requestLoad(first.id);
                         }
                     } else {
                         sendMessage({ action: "create_project", name: "My Project" });
@@ -123,7 +169,7 @@ export const useProjectPersistence = (nodes, edges, setNodes, setEdges, isConnec
         };
         window.addEventListener('ws_list_projects', handler);
         return () => window.removeEventListener('ws_list_projects', handler);
-    }, [isLoaded, sendMessage]);
+    }, [isLoaded, requestLoad, sendMessage]);
 
     // Listen for create_project response
     useEffect(() => {
@@ -157,8 +203,10 @@ export const useProjectPersistence = (nodes, edges, setNodes, setEdges, isConnec
     useEffect(() => {
         const handler = (e) => {
             const msg = e.detail;
-            if (msg.status === "success" && msg.project_data) {
+            if ((msg.status === "success" || msg.status === "streaming") && msg.project_data) {
                 const projectData = msg.project_data;
+                delete savedStateRef.current[msg.project_id];
+                streamingProjectRef.current = msg.status === "streaming" ? msg.project_id : null;
                 if (projectData.nodes && projectData.edges) {
                     if (containsCycle(projectData.nodes, projectData.edges)) {
                         toast.error("Project contains loops! Loading empty canvas.");
@@ -191,6 +239,41 @@ export const useProjectPersistence = (nodes, edges, setNodes, setEdges, isConnec
         return () => window.removeEventListener('ws_load_project', handler);
     }, [setNodes, setEdges]);
 
+    // Listen for streamed node bodies
+    useEffect(() => {
+        const chunkHandler = (e) => {
+            const msg = e.detail;
+            if (msg.project_id !== streamingProjectRef.current) return;
+            const bodies = {};
+            msg.nodes.forEach(body => { bodies[body.id] = body.data; });
+            setNodes((currentNodes) =>
+                currentNodes.map(node =>
+                    bodies[node.id]
+                        ? {
+                            ...node,
+                            data: {
+                                ...bodies[node.id],
+                                fromLoad: true,
+                                missingType: node.data?.missingType
+                            }
+                          }
+                        : node
+                )
+            );
+        };
+        const endHandler = (e) => {
+            if (e.detail.project_id === streamingProjectRef.current) {
+                streamingProjectRef.current = null;
+            }
+        };
+        window.addEventListener('ws_load_project_chunk', chunkHandler);
+        window.addEventListener('ws_load_project_end', endHandler);
+        return () => {
+            window.removeEventListener('ws_load_project_chunk', chunkHandler);
+            window.removeEventListener('ws_load_project_end', endHandler);
+        };
+    }, [setNodes]);
+
     // Listen for delete_project response
     useEffect(() => {
         const handler = (e) => {
@@ -198,6 +281,7 @@ export const useProjectPersistence = (nodes, edges, setNodes, setEdges, isConnec
             if (msg.status === "success") {
                 const deletedId = msg.project_id;
                 delete projectCacheRef.current[deletedId];
+                delete savedStateRef.current[deletedId];
                 setAllProjects(prev => prev.filter(p => p.id !== deletedId));
                 setOpenTabs(prev => {
                     const remaining = prev.filter(t => t.id !== deletedId);
@@ -237,15 +321,59 @@ export const useProjectPersistence = (nodes, edges, setNodes, setEdges, isConnec
         return () => window.removeEventListener('ws_rename_project', handler);
     }, []);
 
+    // Listen for save responses
+    useEffect(() => {
+        const handler = (e) => {
+            const msg = e.detail;
+            if (msg.status === "error") {
+                // The server state is unknown: the next save sends the whole project
+                delete savedStateRef.current[msg.project_id];
+                if (msg.error !== "STORAGE_QUOTA_EXCEEDED" && msg.project_id === activeProjectIdRef.current) {
+                    hasUnsavedChanges.current = true;
+                }
+            }
+        };
+        // Full saves don't echo the project id on error: forget every saved state
+        const fullSaveHandler = (e) => {
+            if (e.detail.status === "error") {
+                savedStateRef.current = {};
+            }
+        };
+        window.addEventListener('ws_save_project_patch', handler);
+        window.addEventListener('ws_save_project', fullSaveHandler);
+        return () => {
+            window.removeEventListener('ws_save_project_patch', handler);
+            window.removeEventListener('ws_save_project', fullSaveHandler);
+        };
+    }, []);
+
     // Auto-save active project
     const saveProjectToBackend = useCallback(() => {
         if (!isLoaded || !isConnected || !activeProjectId) return;
+        if (streamingProjectRef.current === activeProjectId) return;
         const sanitizedNodes = sanitizeNodes(nodesRef.current);
+        const saved = savedStateRef.current[activeProjectId];
+
+        if (saved) {
+            const nodesDiff = diffCollection("nodes", saved.nodes, sanitizedNodes);
+            const edgesDiff = diffCollection("edges", saved.edges, edgesRef.current);
+            savedStateRef.current[activeProjectId] = { nodes: nodesDiff.snapshot, edges: edgesDiff.snapshot };
+            const ops = [...nodesDiff.ops, ...edgesDiff.ops];
+            if (ops.length > 0) {
+                sendMessage({ action: "save_project_patch", project_id: activeProjectId, ops });
+            }
+            return;
+        }
+
         sendMessage({
             action: "save_project",
             project_id: activeProjectId,
             project_data: { nodes: sanitizedNodes, edges: edgesRef.current }
         });
+        savedStateRef.current[activeProjectId] = {
+            nodes: indexById(sanitizedNodes),
+            edges: indexById(edgesRef.current)
+        };
     }, [isLoaded, isConnected, sendMessage, activeProjectId]);
 
     // Sync on reconnect
@@ -287,8 +415,11 @@ export const useProjectPersistence = (nodes, edges, setNodes, setEdges, isConnec
     const switchToProject = useCallback((projectId) => {
         if (projectId === activeProjectIdRef.current) return;
 
-        // Save current state before switching
-        if (activeProjectIdRef.current && isLoaded) {
+        // A partially streamed project is neither saved nor cached: it is reloaded next time
+        if (streamingProjectRef.current === activeProjectIdRef.current) {
+            streamingProjectRef.current = null;
+        } else if (activeProjectIdRef.current && isLoaded) {
+            // Save current state before switching
             saveProjectToBackend();
             hasUnsavedChanges.current = false;
             projectCacheRef.current[activeProjectIdRef.current] = {
@@ -307,9 +438,9 @@ export const useProjectPersistence = (nodes, edges, setNodes, setEdges, isConnec
         } else {
             setNodes([]);
             setEdges([]);
-            sendMessage({ action: "load_project", project_id: projectId });
+            requestLoad(projectId);
         }
-    }, [isLoaded, saveProjectToBackend, sendMessage, setNodes, setEdges]);
+    }, [isLoaded, saveProjectToBackend, requestLoad, setNodes, setEdges]);
 
     // Open an existing project in a new tab
     const openProject = useCallback((projectId, projectName) => {
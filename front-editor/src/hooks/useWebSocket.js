@@ -13,6 +13,8 @@ export const useWebSocket = (url, setNodes, setServerConfig) => {
     const connectRef = useRef(null);
     const scheduleReconnectRef = useRef(null);
     const frontVersionRef = useRef(null);
+    const sessionTokenRef = useRef(null);
+    const lastSeqRef = useRef(0);
 
     const WEBSOCKET_ERROR_TOAST_ID = "websocket-error";
     const WEBSOCKET_RECONNECTING_TOAST_ID = "websocket-reconnecting";
@@ -119,6 +121,20 @@ export const useWebSocket = (url, setNodes, setServerConfig) => {
             reconnectAttemptsRef.current = 0;
             setIsConnected(true);
 
+            // Resume the previous server session if any: the server replays what we missed
+            if (sessionTokenRef.current) {
+                socket.send(JSON.stringify({
+                    action: "resume",
+                    session_token: sessionTokenRef.current,
+                    last_seq: lastSeqRef.current
+                }));
+                return;
+            }
+
+            loginAndFlush(socket);
+        };
+
+        const loginAndFlush = (socket) => {
             // Reset any node stuck in "Running" (state 1) back to "Error" (interrupted)
             setNodesRef.current((currentNodes) =>
                 currentNodes.map(node =>
@@ -143,7 +159,10 @@ export const useWebSocket = (url, setNodes, setServerConfig) => {
                 token: token
             }));
 
-            // Flush pending messages
+            flushPending(socket);
+        };
+
+        const flushPending = (socket) => {
             const pending = pendingMessagesRef.current;
             pendingMessagesRef.current = [];
             if (pending.length > 0) {
@@ -156,6 +175,8 @@ export const useWebSocket = (url, setNodes, setServerConfig) => {
 
         socket.onclose = (event) => {
             console.log("❌ WebSocket closed", event.code, event.reason);
+            // A replaced socket closing late must not disturb the current one
+            if (wsRef.current !== socket) return;
             setIsConnected(false);
 
             if (event.code === 1008) {
@@ -170,6 +191,12 @@ export const useWebSocket = (url, setNodes, setServerConfig) => {
                 return;
             }
 
+            if (event.code === 1013) {
+                toast.warning("Connection too slow to keep up with the server. Reconnecting...", {
+                    toastId: "ws_slow_consumer"
+                });
+            }
+
             if (!isManualCloseRef.current) {
                 scheduleReconnectRef.current();
             }
@@ -201,21 +228,61 @@ export const useWebSocket = (url, setNodes, setServerConfig) => {
             }
         };
 
-        socket.onmessage = (event) => {
-            const msg = JSON.parse(event.data);
-            
+        const handleMessage = (msg) => {
             if (msg.action === "auth_error") {
                 localStorage.removeItem('nodal_token');
                 window.location.href = '/login';
                 return;
             }
-            
+
+            // Server-side batches are flattened back into individual messages
+            if (msg.action === "batch") {
+                msg.messages.forEach(handleMessage);
+                return;
+            }
+
+            if (typeof msg.seq === "number") {
+                lastSeqRef.current = Math.max(lastSeqRef.current, msg.seq);
+            }
+
+            if (msg.action === "login" && msg.status === "success" && msg.session_token) {
+                sessionTokenRef.current = msg.session_token;
+                lastSeqRef.current = 0;
+            } else if (msg.action === "resume") {
+                if (msg.status === "success") {
+                    console.log(`🔁 Session resumed (${msg.replayed} missed messages replayed).`);
+                    flushPending(socket);
+                } else {
+                    sessionTokenRef.current = null;
+                    loginAndFlush(socket);
+                }
+                return;
+            }
+
             messageQueue.push(msg);
 
             if (timeoutId) clearTimeout(timeoutId);
             timeoutId = setTimeout(processMessageQueue, 0);
         };
 
+        // Large frames arrive zlib-compressed as binary frames
+        const decodeFrame = async (data) => {
+            if (typeof data === "string") return data;
+            const stream = new Blob([data]).stream().pipeThrough(new DecompressionStream("deflate"));
+            return await new Response(stream).text();
+        };
+
+        // Decoding binary frames is async: chain frames to keep them in order
+        let receiveChain = Promise.resolve();
+        socket.binaryType = "arraybuffer";
+
+        socket.onmessage = (event) => {
+            receiveChain = receiveChain
+                .then(() => decodeFrame(event.data))
+                .then((text) => handleMessage(JSON.parse(text)))
+                .catch((err) => console.error("⚠️ Failed to decode WS frame", err));
+        };
+
         socket.addEventListener('close', () => {
             if (timeoutId) {
                 clearTimeout(timeoutId);
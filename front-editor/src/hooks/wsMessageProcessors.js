@@ -36,8 +36,10 @@ export const processSystemMessage = (msg, setServerConfigRef, frontVersionRef) =
         }
     } else if (msg.action === "fs_list") {
         if (msg.status === "success") {
-            window.dispatchEvent(new CustomEvent('fs_tree_update', { detail: msg.tree }));
+            window.dispatchEvent(new CustomEvent('fs_tree_update', { detail: msg }));
         }
+    } else if (msg.action === "fs_changed") {
+        window.dispatchEvent(new CustomEvent('fs_tree_changed', { detail: msg }));
     } else if (msg.action === "fs_read") {
         window.dispatchEvent(new CustomEvent('fs_read_result', { detail: msg }));
     } else if (msg.action === "notification") {
@@ -3,5 +3,6 @@ from app.core.node_registry import node_registry
 node_registry.register(
     config_schema={
         "timeout": 1.0
-    }
+    },
+    auto_trigger=True
 )
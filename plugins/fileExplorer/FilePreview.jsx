@@ -0,0 +1,57 @@
+import React from 'react';
+
+export const PREVIEW_EXTENSIONS = new Set(['csv', 'tsv', 'jsonl', 'ndjson', 'parquet', 'npy', 'npz']);
+
+const formatStat = (value) => (typeof value === 'number' && !Number.isInteger(value) ? value.toPrecision(4) : String(value));
+
+const FilePreview = ({ preview, onClose }) => {
+    if (preview.status !== 'success') {
+        return (
+            <div className="file-preview">
+                <div className="file-preview-header">
+                    <span>{preview.path}</span>
+                    <button onClick={onClose}>✕</button>
+                </div>
+                <div className="file-preview-error">{preview.error || 'Loading...'}</div>
+            </div>
+        );
+    }
+
+    const rowCount = preview.row_count_exact ? preview.row_count : `~${preview.row_count}`;
+    return (
+        <div className="file-preview">
+            <div className="file-preview-header">
+                <span title={preview.path}>
+                    {preview.path} · {preview.format}{preview.shape ? ` ${preview.dtype} [${preview.shape.join(' × ')}]` : ''}{preview.row_count !== undefined ? ` · ${rowCount} rows` : ""}
+                </span>
+                <button onClick={onClose}>✕</button>
+            </div>
+            <div className="file-preview-body">
+                <table>
+                    <thead>
+                        <tr>
+                            {(preview.columns || []).map((column) => (
+                                <th key={column.name} title={Object.entries(column.stats || {}).map(([k, v]) => `${k}: ${formatStat(v)}`).join('\n')}>
+                                    {column.name}
+                                    <small>{column.type}</small>
+                                </th>
+                            ))}
+                        </tr>
+                    </thead>
+                    <tbody>
+                        {(preview.rows || []).map((row, i) => (
+                            <tr key={i}>
+                                {row.map((cell, j) => <td key={j}>{cell === null ? '' : String(cell)}</td>)}
+                            </tr>
+                        ))}
+                    </tbody>
+                </table>
+                <div className="file-preview-footer">
+                    Column stats from {preview.stats_from === 'all' ? 'every row' : preview.stats_from}, hover a header to see them
+                </div>
+            </div>
+        </div>
+    );
+};
+
+export default FilePreview;
@@ -1,6 +1,9 @@
 import os
-from app.core.registry import ws_registry
+from app.core.registry import ws_registry, CONCURRENT
 from app.services import filesystem as fs
+from app.core.storage_manager import get_user_dir, record_usage_delta, check_user_quota_async, get_quota_bytes
+from app.services.transfers import transfer_manager, TransferError
+from app.services.file_watcher import file_watcher
 
 def verif_args(data: dict, required_args: list[str]) -> bool:
     for arg in required_args:
@@ -8,55 +11,235 @@ def verif_args(data: dict, required_args: list[str]) -> bool:
             return False
     return True
 
-@ws_registry.register("fs_list")
+def record_files_delta(session, delta_bytes: int):
+    """Usage of the user's files: while the file watcher runs, it measures the changes itself."""
+    if not file_watcher.is_watching(session.user.files_dir):
+        record_usage_delta(get_user_dir(session.user.user_id), delta_bytes)
+
+async def send_changes(session, changes: list):
+    """Tells the client what changed in its tree, instead of sending the whole tree again."""
+    if changes:
+        # The file watcher sees the same changes: it won't send them a second time
+        file_watcher.note_reported(session.user.files_dir, changes)
+        await session.send_json(fs.record_changes(session.user.files_dir, changes))
+
+async def added_change(session, created: str):
+    entry = await fs.fs_entry(session.user.files_dir, created)
+    return [{"type": "added", "entry": entry}] if entry else []
+
+@ws_registry.register("fs_list", concurrency=CONCURRENT, limit=2)
 async def handle_fs_list(session, data: dict):
-    result = await fs.fs_list(session.user.files_dir)
-    await session.websocket.send_json(result)
+    result = await fs.fs_list(
+        session.user.files_dir,
+        data.get("path", ""),
+        depth=data.get("depth", 1),
+        offset=data.get("offset", 0),
+        limit=data.get("limit", fs.DEFAULT_PAGE_SIZE)
+    )
+    await session.send_json(result)
 
-@ws_registry.register("fs_read")
+@ws_registry.register("fs_read", concurrency=CONCURRENT, limit=4)
 async def handle_fs_read(session, data: dict):
     if not verif_args(data, ["path"]):
-        await session.websocket.send_json({"action": "fs_read", "status": "error", "error": "missing path"})
+        await session.send_json({"action": "fs_read", "status": "error", "error": "missing path"})
         return
     result = await fs.fs_read(session.user.files_dir, data["path"])
-    await session.websocket.send_json(result)
+    await session.send_json(result)
 
-@ws_registry.register("fs_write")
+@ws_registry.register("fs_read_range", concurrency=CONCURRENT, limit=4)
+async def handle_fs_read_range(session, data: dict):
+    if not verif_args(data, ["path"]):
+        await session.send_json({"action": "fs_read_range", "status": "error", "error": "missing path"})
+        return
+    result = await fs.fs_read_range(
+        session.user.files_dir,
+        data["path"],
+        mode=data.get("mode", "lines"),
+        offset=data.get("offset", 0),
+        length=data.get("length", fs.MAX_TEXT_SIZE),
+        start_line=data.get("start_line", 0),
+        count=data.get("count", fs.DEFAULT_RANGE_LINES)
+    )
+    await session.send_json(result)
+
+@ws_registry.register("fs_preview", concurrency=CONCURRENT, limit=2)
+async def handle_fs_preview(session, data: dict):
+    if not verif_args(data, ["path"]):
+        await session.send_json({"action": "fs_preview", "status": "error", "error": "missing path"})
+        return
+    result = await fs.fs_preview(
+        session.user.files_dir,
+        data["path"],
+        rows=data.get("rows"),
+        sample_rows=data.get("sample_rows"),
+        array=data.get("array")
+    )
+    await session.send_json(result)
+
+@ws_registry.register("fs_write", resource="files")
 async def handle_fs_write(session, data: dict):
     if not verif_args(data, ["path", "content"]):
-        await session.websocket.send_json({"action": "fs_write", "status": "error", "error": "missing path or content"})
+        await session.send_json({"action": "fs_write", "status": "error", "error": "missing path or content"})
         return
+    created = fs.first_missing(session.user.files_dir, data["path"])
+    size_before = await fs.path_bytes(session.user.files_dir, data["path"])
     result = await fs.fs_write(session.user.files_dir, data["path"], data["content"], data.get("encoding", "utf-8"))
-    await session.websocket.send_json(result)
-    tree_result = await fs.fs_list(session.user.files_dir)
-    await session.websocket.send_json(tree_result)
+    changes = []
+    if result["status"] == "success":
+        size_after = await fs.path_bytes(session.user.files_dir, data["path"])
+        record_files_delta(session, size_after - size_before)
+        if created:
+            changes = await added_change(session, created)
+        else:
+            changes = [{"type": "resized", "path": fs.normalize_path(session.user.files_dir, data["path"]), "size": size_after}]
+    await session.send_json(result)
+    await send_changes(session, changes)
 
-@ws_registry.register("fs_delete")
+@ws_registry.register("fs_delete", resource="files")
 async def handle_fs_delete(session, data: dict):
     if not verif_args(data, ["path"]):
-        await session.websocket.send_json({"action": "fs_delete", "status": "error", "error": "missing path"})
+        await session.send_json({"action": "fs_delete", "status": "error", "error": "missing path"})
         return
+    size_before = await fs.path_bytes(session.user.files_dir, data["path"])
     result = await fs.fs_delete(session.user.files_dir, data["path"])
-    await session.websocket.send_json(result)
-    tree_result = await fs.fs_list(session.user.files_dir)
-    await session.websocket.send_json(tree_result)
+    changes = []
+    if result["status"] == "success":
+        record_files_delta(session, -size_before)
+        changes = [{"type": "removed", "path": fs.normalize_path(session.user.files_dir, data["path"])}]
+    await session.send_json(result)
+    await send_changes(session, changes)
 
-@ws_registry.register("fs_mkdir")
+@ws_registry.register("fs_mkdir", resource="files")
 async def handle_fs_mkdir(session, data: dict):
     if not verif_args(data, ["path"]):
-        await session.websocket.send_json({"action": "fs_mkdir", "status": "error", "error": "missing path"})
+        await session.send_json({"action": "fs_mkdir", "status": "error", "error": "missing path"})
         return
+    created = fs.first_missing(session.user.files_dir, data["path"])
     result = await fs.fs_mkdir(session.user.files_dir, data["path"])
-    await session.websocket.send_json(result)
-    tree_result = await fs.fs_list(session.user.files_dir)
-    await session.websocket.send_json(tree_result)
+    changes = []
+    if result["status"] == "success" and created:
+        # Same usage, but the tree changed: outdates storage analytics
+        record_files_delta(session, 0)
+        changes = await added_change(session, created)
+    await session.send_json(result)
+    await send_changes(session, changes)
 
-@ws_registry.register("fs_rename")
+@ws_registry.register("fs_rename", resource="files")
 async def handle_fs_rename(session, data: dict):
     if not verif_args(data, ["old_path", "new_path"]):
-        await session.websocket.send_json({"action": "fs_rename", "status": "error", "error": "missing old_path or new_path"})
+        await session.send_json({"action": "fs_rename", "status": "error", "error": "missing old_path or new_path"})
         return
+    created = fs.first_missing(session.user.files_dir, data["new_path"])
     result = await fs.fs_rename(session.user.files_dir, data["old_path"], data["new_path"])
-    await session.websocket.send_json(result)
-    tree_result = await fs.fs_list(session.user.files_dir)
-    await session.websocket.send_json(tree_result)
+    changes = []
+    if result["status"] == "success":
+        # Same usage, but the tree changed: outdates storage analytics
+        record_files_delta(session, 0)
+        old_path = fs.normalize_path(session.user.files_dir, data["old_path"])
+        new_path = fs.normalize_path(session.user.files_dir, data["new_path"])
+        if created and created != new_path:
+            # Moved into new directories: the top-most one is what appears
+            changes = [{"type": "removed", "path": old_path}] + await added_change(session, created)
+        else:
+            # Clients drop what was at new_path (it got replaced) before inserting the entry
+            entry = await fs.fs_entry(session.user.files_dir, new_path)
+            if entry:
+                changes = [{"type": "renamed", "old_path": old_path, "new_path": new_path, "entry": entry}]
+    await session.send_json(result)
+    await send_changes(session, changes)
+
+@ws_registry.register("fs_batch", resource="files")
+async def handle_fs_batch(session, data: dict):
+    if not verif_args(data, ["operations"]):
+        await session.send_json({"action": "fs_batch", "status": "error", "error": "missing operations"})
+        return
+    # Checked once for the whole batch: only copies add bytes
+    incoming = await fs.batch_incoming_bytes(session.user.files_dir, data["operations"])
+    if incoming and not await check_user_quota_async(session.user.user_id, incoming, tier=session.user.tier):
+        await session.send_json({
+            "action": "fs_batch",
+            "status": "error",
+            "batch_id": data.get("batch_id"),
+            "error": "STORAGE_QUOTA_EXCEEDED"
+        })
+        return
+    result, changes, delta_bytes = await fs.fs_batch(
+        session.user.files_dir, data["operations"], batch_id=data.get("batch_id"), on_progress=session.send_json
+    )
+    if changes or delta_bytes:
+        record_files_delta(session, delta_bytes)
+    await session.send_json(result)
+    await send_changes(session, changes)
+
+@ws_registry.register("fs_upload_start", resource="transfer", resource_arg="transfer_id")
+async def handle_fs_upload_start(session, data: dict):
+    if not verif_args(data, ["path", "size"]):
+        await session.send_json({"action": "fs_upload_start", "status": "error", "error": "missing path or size"})
+        return
+    # A new upload reserves its whole size up front, minus the file it replaces: concurrent
+    # uploads can't overrun the quota together
+    incoming = data["size"] - await fs.path_bytes(session.user.files_dir, data["path"]) if isinstance(data["size"], int) else 0
+    result = await fs.fs_upload_start(
+        session.user.files_dir, get_user_dir(session.user.user_id), data["path"], data["size"], data.get("transfer_id"),
+        reserve_bytes=max(0, incoming), limit_bytes=get_quota_bytes(session.user.tier)
+    )
+    await session.send_json(result)
+
+@ws_registry.register("fs_upload_chunk", resource="transfer", resource_arg="transfer_id")
+async def handle_fs_upload_chunk(session, data: dict):
+    if not verif_args(data, ["transfer_id", "offset", "data", "checksum"]):
+        await session.send_json({"action": "fs_upload_chunk", "status": "error", "error": "missing transfer_id, offset, data or checksum"})
+        return
+    result = await fs.fs_upload_chunk(
+        get_user_dir(session.user.user_id), data["transfer_id"], data["offset"], data["data"], data["checksum"],
+        limit_bytes=get_quota_bytes(session.user.tier)
+    )
+    await session.send_json(result)
+
+@ws_registry.register("fs_upload_finish", resource="files")
+async def handle_fs_upload_finish(session, data: dict):
+    if not verif_args(data, ["transfer_id"]):
+        await session.send_json({"action": "fs_upload_finish", "status": "error", "error": "missing transfer_id"})
+        return
+    user_dir = get_user_dir(session.user.user_id)
+    created, size_before = None, 0
+    try:
+        path = transfer_manager.upload_path(user_dir, data["transfer_id"])
+        created = fs.first_missing(session.user.files_dir, path)
+        size_before = await fs.path_bytes(session.user.files_dir, path)
+    except TransferError:
+        pass
+    result = await fs.fs_upload_finish(session.user.files_dir, user_dir, data["transfer_id"])
+    changes = []
+    if result["status"] == "success":
+        record_files_delta(session, result["size"] - size_before)
+        if created:
+            changes = await added_change(session, created)
+        else:
+            changes = [{"type": "resized", "path": fs.normalize_path(session.user.files_dir, result["path"]), "size": result["size"]}]
+    await session.send_json(result)
+    await send_changes(session, changes)
+
+@ws_registry.register("fs_upload_cancel", resource="transfer", resource_arg="transfer_id")
+async def handle_fs_upload_cancel(session, data: dict):
+    if not verif_args(data, ["transfer_id"]):
+        await session.send_json({"action": "fs_upload_cancel", "status": "error", "error": "missing transfer_id"})
+        return
+    result = await fs.fs_upload_cancel(get_user_dir(session.user.user_id), data["transfer_id"])
+    await session.send_json(result)
+
+@ws_registry.register("fs_download_start", concurrency=CONCURRENT, limit=4)
+async def handle_fs_download_start(session, data: dict):
+    if not verif_args(data, ["path"]):
+        await session.send_json({"action": "fs_download_start", "status": "error", "error": "missing path"})
+        return
+    result = await fs.fs_download_start(session.user.files_dir, get_user_dir(session.user.user_id), data["path"])
+    await session.send_json(result)
+
+@ws_registry.register("fs_download_chunk", concurrency=CONCURRENT, limit=4)
+async def handle_fs_download_chunk(session, data: dict):
+    if not verif_args(data, ["transfer_id", "offset"]):
+        await session.send_json({"action": "fs_download_chunk", "status": "error", "error": "missing transfer_id or offset"})
+        return
+    result = await fs.fs_download_chunk(get_user_dir(session.user.user_id), data["transfer_id"], data["offset"])
+    await session.send_json(result)
@@ -1,5 +1,8 @@
 import React, { useState, useCallback, useEffect, useRef } from 'react';
+import { toast } from 'react-toastify';
 import { uiRegistry } from '../../front-editor/src/core/uiRegistry';
+import { uploadFile, downloadFile } from './transfers';
+import FilePreview, { PREVIEW_EXTENSIONS } from './FilePreview';
 import './FileTree.css';
 
 const FileIcon = ({ name, isDir, isOpen }) => {
@@ -22,6 +25,76 @@ const formatSize = (bytes) => {
     return `${(bytes / (1024 * 1024)).toFixed(1)} MB`;
 };
 
+const PAGE_SIZE = 200;
+
+const parentOf = (path) => (path.includes('/') ? path.slice(0, path.lastIndexOf('/')) : '');
+
+const compareEntries = (a, b) => {
+    if (a.type !== b.type) return a.type === 'directory' ? -1 : 1;
+    return a.name.toLowerCase() < b.name.toLowerCase() ? -1 : 1;
+};
+
+// Applies 'fn' to the directory at 'dirPath' (the root is ''), if it is loaded
+const updateDir = (node, dirPath, fn) => {
+    if (node.path === dirPath) return fn(node);
+    if (!node.children) return node;
+    let changed = false;
+    const children = node.children.map((child) => {
+        if (child.type !== 'directory' || (dirPath !== child.path && !dirPath.startsWith(child.path + '/'))) return child;
+        const next = updateDir(child, dirPath, fn);
+        if (next !== child) changed = true;
+        return next;
+    });
+    return changed ? { ...node, children } : node;
+};
+
+const mergePage = (root, page) => updateDir(root, page.path, (dir) => {
+    const previous = new Map((dir.children || []).map((child) => [child.path, child]));
+    // A re-listed directory keeps the children already loaded below it
+    const entries = page.entries.map((entry) => {
+        const known = previous.get(entry.path);
+        return entry.type === 'directory' && !entry.children && known?.children
+            ? { ...entry, children: known.children, total: known.total }
+            : entry;
+    });
+    const paths = new Set(entries.map((entry) => entry.path));
+    const children = page.offset === 0
+        ? entries
+        : [...(dir.children || []).filter((child) => !paths.has(child.path)), ...entries];
+    return { ...dir, children, total: page.total };
+});
+
+const removeEntry = (root, path) => updateDir(root, parentOf(path), (dir) => {
+    if (!dir.children) return dir;
+    const children = dir.children.filter((child) => child.path !== path);
+    if (children.length === dir.children.length) return dir;
+    return { ...dir, children, total: Math.max(children.length, (dir.total ?? 0) - 1) };
+});
+
+const insertEntry = (root, entry) => updateDir(removeEntry(root, entry.path), parentOf(entry.path), (dir) => {
+    if (!dir.children) return dir;
+    const children = [...dir.children, entry].sort(compareEntries);
+    return { ...dir, children, total: (dir.total ?? dir.children.length) + 1 };
+});
+
+const applyChange = (root, change) => {
+    switch (change.type) {
+        case 'added':
+            return insertEntry(root, change.entry);
+        case 'removed':
+            return removeEntry(root, change.path);
+        case 'renamed':
+            return insertEntry(removeEntry(root, change.old_path), change.entry);
+        case 'resized':
+            return updateDir(root, parentOf(change.path), (dir) => dir.children ? {
+                ...dir,
+                children: dir.children.map((child) => child.path === change.path ? { ...child, size: change.size } : child)
+            } : dir);
+        default:
+            return root;
+    }
+};
+
 const flattenVisible = (nodes, openDirs) => {
     const result = [];
     for (const node of nodes) {
@@ -33,7 +106,17 @@ const flattenVisible = (nodes, openDirs) => {
     return result;
 };
 
-const TreeNode = ({ node, depth, onDelete, onRename, onMove, selected, onSelect, openDirs, toggleDir }) => {
+const LoadMore = ({ dir, depth, onLoadMore }) => (
+    dir.children && dir.total > dir.children.length ? (
+        <div className="tree-empty" style={{ paddingLeft: `${depth * 16 + 8}px` }}>
+            <span className="empty-label" style={{ cursor: 'pointer' }} onClick={(e) => { e.stopPropagation(); onLoadMore(dir); }}>
+                Show more ({dir.children.length} of {dir.total})
+            </span>
+        </div>
+    ) : null
+);
+
+const TreeNode = ({ node, depth, onDelete, onRename, onMove, onDownload, onPreview, selected, onSelect, openDirs, toggleDir, onLoadMore }) => {
     const [isContextMenu, setIsContextMenu] = useState(false);
     const [contextPos, setContextPos] = useState({ x: 0, y: 0 });
     const [isDragOver, setIsDragOver] = useState(false);
@@ -89,15 +172,17 @@ const TreeNode = ({ node, depth, onDelete, onRename, onMove, selected, onSelect,
         const raw = e.dataTransfer.getData('application/filetree-paths');
         if (!raw) return;
         const paths = JSON.parse(raw);
+        const moves = [];
         paths.forEach((srcPath) => {
             if (srcPath === node.path) return;
             if (node.path.startsWith(srcPath + '/')) return;
             const fileName = srcPath.split('/').pop();
             const newPath = node.path + '/' + fileName;
             if (srcPath !== newPath) {
-                onMove(srcPath, newPath);
+                moves.push([srcPath, newPath]);
             }
         });
+        if (moves.length > 0) onMove(moves);
     };
 
     return (
@@ -123,6 +208,11 @@ const TreeNode = ({ node, depth, onDelete, onRename, onMove, selected, onSelect,
                     <span className="file-size">{formatSize(node.size)}</span>
                 )}
             </div>
+            {node.type === 'directory' && isOpen && !node.children && (
+                <div className="tree-empty" style={{ paddingLeft: `${(depth + 1) * 16 + 8}px` }}>
+                    <span className="empty-label">Loading...</span>
+                </div>
+            )}
             {node.type === 'directory' && isOpen && node.children && (
                 <div className="tree-children">
                     {node.children.map((child) => (
@@ -133,12 +223,16 @@ const TreeNode = ({ node, depth, onDelete, onRename, onMove, selected, onSelect,
                             onDelete={onDelete}
                             onRename={onRename}
                             onMove={onMove}
+                            onDownload={onDownload}
+                            onPreview={onPreview}
                             selected={selected}
                             onSelect={onSelect}
                             openDirs={openDirs}
                             toggleDir={toggleDir}
+                            onLoadMore={onLoadMore}
                         />
                     ))}
+                    <LoadMore dir={node} depth={depth + 1} onLoadMore={onLoadMore} />
                     {node.children.length === 0 && (
                         <div className="tree-empty" style={{ paddingLeft: `${(depth + 1) * 16 + 8}px` }}>
                             <span className="empty-label">Empty folder</span>
@@ -159,6 +253,16 @@ const TreeNode = ({ node, depth, onDelete, onRename, onMove, selected, onSelect,
                                 <button onClick={() => { onRename(node.path); closeContextMenu(); }}>
                                     ✏️ Rename
                                 </button>
+                                {node.type === 'file' && (
+                                    <button onClick={() => { onDownload(node.path); closeContextMenu(); }}>
+                                        ⬇️ Download
+                                    </button>
+                                )}
+                                {node.type === 'file' && PREVIEW_EXTENSIONS.has(node.name.split('.').pop().toLowerCase()) && (
+                                    <button onClick={() => { onPreview(node.path); closeContextMenu(); }}>
+                                        🔍 Preview
+                                    </button>
+                                )}
                                 <button className="context-delete" onClick={() => { onDelete([node.path]); closeContextMenu(); }}>
                                     🗑️ Delete
                                 </button>
@@ -172,32 +276,67 @@ const TreeNode = ({ node, depth, onDelete, onRename, onMove, selected, onSelect,
 };
 
 const FileTree = ({ sendMessage }) => {
-    const [tree, setTree] = useState([]);
+    const [root, setRoot] = useState({ path: '', type: 'directory' });
     const [selected, setSelected] = useState(new Set());
     const [openDirs, setOpenDirs] = useState(new Set());
     const lastSelectedRef = useRef(null);
     const fileInputRef = useRef(null);
+    const openDirsRef = useRef(openDirs);
+    // Tree version of the last listing/delta applied: a jump means a missed fs_changed event
+    const versionRef = useRef(null);
+    const tree = root.children || [];
 
-    useEffect(() => {
-        const handleTreeUpdate = (e) => setTree(e.detail || []);
-        window.addEventListener('fs_tree_update', handleTreeUpdate);
-        return () => window.removeEventListener('fs_tree_update', handleTreeUpdate);
-    }, []);
+    openDirsRef.current = openDirs;
 
-    const refreshTree = useCallback(() => {
-        sendMessage({ action: "fs_list" });
+    const listDir = useCallback((path, offset = 0) => {
+        sendMessage({ action: "fs_list", path, offset, limit: PAGE_SIZE });
     }, [sendMessage]);
 
-    useEffect(() => { refreshTree(); }, [refreshTree]);
+    const refreshTree = useCallback(() => {
+        listDir('');
+        openDirsRef.current.forEach((path) => listDir(path));
+    }, [listDir]);
+
+    useEffect(() => {
+        const handleTreeUpdate = (e) => {
+            const page = e.detail;
+            versionRef.current = Math.max(versionRef.current ?? 0, page.version);
+            setRoot((prev) => mergePage(prev, page));
+        };
+        const handleTreeChanged = (e) => {
+            const msg = e.detail;
+            if (versionRef.current !== null && msg.version !== versionRef.current + 1) {
+                versionRef.current = msg.version;
+                refreshTree();
+                return;
+            }
+            versionRef.current = msg.version;
+            setRoot((prev) => msg.changes.reduce(applyChange, prev));
+        };
+        window.addEventListener('fs_tree_update', handleTreeUpdate);
+        window.addEventListener('fs_tree_changed', handleTreeChanged);
+        return () => {
+            window.removeEventListener('fs_tree_update', handleTreeUpdate);
+            window.removeEventListener('fs_tree_changed', handleTreeChanged);
+        };
+    }, [refreshTree]);
+
+    useEffect(() => { listDir(''); }, [listDir]);
 
     const toggleDir = useCallback((path) => {
+        const opening = !openDirsRef.current.has(path);
         setOpenDirs((prev) => {
             const next = new Set(prev);
             if (next.has(path)) next.delete(path);
             else next.add(path);
             return next;
         });
-    }, []);
+        if (opening) listDir(path);
+    }, [listDir]);
+
+    const handleLoadMore = useCallback((dir) => {
+        listDir(dir.path, dir.children.length);
+    }, [listDir]);
 
     const handleSelect = useCallback((path, e) => {
         if (e.ctrlKey || e.metaKey) {
@@ -228,13 +367,44 @@ const FileTree = ({ sendMessage }) => {
         }
     }, [tree, openDirs]);
 
+    // Many paths go in one fs_batch request: one round trip and one tree delta
+    const runBatch = useCallback((operations, label) => {
+        const batchId = `${Date.now()}-${Math.random().toString(16).slice(2)}`;
+        const toastId = operations.length > 1 ? toast.loading(`${label}...`) : null;
+        const handleProgress = (e) => {
+            if (toastId === null || e.detail.batch_id !== batchId) return;
+            toast.update(toastId, { render: `${label}... ${e.detail.done}/${e.detail.total}` });
+        };
+        const handleDone = (e) => {
+            if (e.detail.batch_id !== batchId) return;
+            window.removeEventListener('ws_fs_batch_progress', handleProgress);
+            window.removeEventListener('ws_fs_batch', handleDone);
+            const failed = e.detail.status === 'success'
+                ? e.detail.results.filter((result) => result.status !== 'success')
+                : [{ error: e.detail.error }];
+            if (failed.length > 0) {
+                const message = `${label}: ${failed.length} failed (${failed[0].error})`;
+                if (toastId !== null) {
+                    toast.update(toastId, { render: message, type: "error", isLoading: false, autoClose: 5000 });
+                } else {
+                    toast.error(message);
+                }
+            } else if (toastId !== null) {
+                toast.update(toastId, { render: `${label}: done`, type: "success", isLoading: false, autoClose: 2000 });
+            }
+        };
+        window.addEventListener('ws_fs_batch_progress', handleProgress);
+        window.addEventListener('ws_fs_batch', handleDone);
+        sendMessage({ action: "fs_batch", batch_id: batchId, operations });
+    }, [sendMessage]);
+
     const handleDelete = useCallback((paths) => {
         const label = paths.length === 1 ? `"${paths[0]}"` : `${paths.length} items`;
         if (window.confirm(`Delete ${label}?`)) {
-            paths.forEach((path) => sendMessage({ action: "fs_delete", path }));
+            runBatch(paths.map((path) => ({ op: "delete", path })), `Deleting ${label}`);
             setSelected(new Set());
         }
-    }, [sendMessage]);
+    }, [runBatch]);
 
     const handleRename = useCallback((path) => {
         const oldName = path.split('/').pop();
@@ -246,9 +416,10 @@ const FileTree = ({ sendMessage }) => {
         }
     }, [sendMessage]);
 
-    const handleMove = useCallback((oldPath, newPath) => {
-        sendMessage({ action: "fs_rename", old_path: oldPath, new_path: newPath });
-    }, [sendMessage]);
+    const handleMove = useCallback((moves) => {
+        const label = moves.length === 1 ? `"${moves[0][0]}"` : `${moves.length} items`;
+        runBatch(moves.map(([path, dest]) => ({ op: "move", path, dest })), `Moving ${label}`);
+    }, [runBatch]);
 
     const handleNewFolder = useCallback(() => {
         const name = window.prompt("Folder name:");
@@ -262,21 +433,43 @@ const FileTree = ({ sendMessage }) => {
     const handleFileUpload = useCallback((e) => {
         const files = e.target.files;
         if (!files || files.length === 0) return;
-        Array.from(files).forEach((file) => {
-            const reader = new FileReader();
-            reader.onload = () => {
-                sendMessage({
-                    action: "fs_write",
-                    path: file.name,
-                    content: reader.result.split(',')[1],
-                    encoding: "base64"
+        Array.from(files).forEach(async (file) => {
+            const toastId = toast.loading(`Uploading ${file.name}...`);
+            try {
+                await uploadFile(sendMessage, file, file.name, (sent, total) => {
+                    toast.update(toastId, { render: `Uploading ${file.name}... ${Math.floor(100 * sent / total)}%` });
                 });
-            };
-            reader.readAsDataURL(file);
+                toast.update(toastId, { render: `${file.name} uploaded`, type: "success", isLoading: false, autoClose: 2000 });
+            } catch (err) {
+                toast.update(toastId, { render: `Upload of ${file.name} failed: ${err.message}`, type: "error", isLoading: false, autoClose: 5000 });
+            }
         });
         e.target.value = '';
     }, [sendMessage]);
 
+    const [preview, setPreview] = useState(null);
+
+    useEffect(() => {
+        const handlePreview = (e) => {
+            setPreview((current) => (current && current.path === e.detail.path ? e.detail : current));
+        };
+        window.addEventListener('ws_fs_preview', handlePreview);
+        return () => window.removeEventListener('ws_fs_preview', handlePreview);
+    }, []);
+
+    const handlePreview = useCallback((path) => {
+        setPreview({ path, status: 'loading' });
+        sendMessage({ action: "fs_preview", path });
+    }, [sendMessage]);
+
+    const handleDownload = useCallback(async (path) => {
+        try {
+            await downloadFile(sendMessage, path);
+        } catch (err) {
+            toast.error(`Download of ${path} failed: ${err.message}`);
+        }
+    }, [sendMessage]);
+
     const [rootDragOver, setRootDragOver] = useState(false);
 
     const handleRootDragOver = (e) => {
@@ -295,12 +488,10 @@ const FileTree = ({ sendMessage }) => {
         const raw = e.dataTransfer.getData('application/filetree-paths');
         if (!raw) return;
         const paths = JSON.parse(raw);
-        paths.forEach((srcPath) => {
-            const fileName = srcPath.split('/').pop();
-            if (srcPath !== fileName) {
-                handleMove(srcPath, fileName);
-            }
-        });
+        const moves = paths
+            .map((srcPath) => [srcPath, srcPath.split('/').pop()])
+            .filter(([srcPath, fileName]) => srcPath !== fileName);
+        if (moves.length > 0) handleMove(moves);
     };
 
     const handleBackgroundClick = (e) => {
@@ -367,13 +558,17 @@ const FileTree = ({ sendMessage }) => {
                             onDelete={handleDelete}
                             onRename={handleRename}
                             onMove={handleMove}
+                            onDownload={handleDownload}
+                            onPreview={handlePreview}
                             selected={selected}
                             onSelect={handleSelect}
                             openDirs={openDirs}
                             toggleDir={toggleDir}
+                            onLoadMore={handleLoadMore}
                         />
                     ))
                 )}
+                <LoadMore dir={root} depth={0} onLoadMore={handleLoadMore} />
                 <div
                     className={`root-drop-zone${rootDragOver ? ' drag-over' : ''}`}
                     onDragOver={handleRootDragOver}
@@ -383,6 +578,7 @@ const FileTree = ({ sendMessage }) => {
                     ↑ Drop here to move to root
                 </div>
             </div>
+            {preview && <FilePreview preview={preview} onClose={() => setPreview(null)} />}
         </div>
     );
 };
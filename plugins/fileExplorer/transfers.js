@@ -0,0 +1,131 @@
+// Chunked, resumable transfers through the fs_upload_* / fs_download_* actions.
+// Each chunk waits for its reply; a lost reply (e.g. during a reconnect) makes the
+// upload ask the server where to resume, and the download ask for the same offset again.
+
+const REPLY_TIMEOUT_MS = 30000;
+const MAX_RETRIES = 5;
+
+const waitForReply = (action, matches) => new Promise((resolve, reject) => {
+    const eventName = `ws_${action}`;
+    const handler = (e) => {
+        if (!matches(e.detail)) return;
+        clearTimeout(timer);
+        window.removeEventListener(eventName, handler);
+        resolve(e.detail);
+    };
+    const timer = setTimeout(() => {
+        window.removeEventListener(eventName, handler);
+        reject(new Error(`${action} timed out`));
+    }, REPLY_TIMEOUT_MS);
+    window.addEventListener(eventName, handler);
+});
+
+const request = (sendMessage, message, matches) => {
+    const reply = waitForReply(message.action, matches);
+    sendMessage(message);
+    return reply;
+};
+
+const toBase64 = (bytes) => {
+    let binary = '';
+    for (let i = 0; i < bytes.length; i += 0x8000) {
+        binary += String.fromCharCode(...bytes.subarray(i, i + 0x8000));
+    }
+    return btoa(binary);
+};
+
+const fromBase64 = (data) => Uint8Array.from(atob(data), (c) => c.charCodeAt(0));
+
+const sha256 = async (bytes) => {
+    const digest = new Uint8Array(await crypto.subtle.digest('SHA-256', bytes));
+    return Array.from(digest, (b) => b.toString(16).padStart(2, '0')).join('');
+};
+
+export const uploadFile = async (sendMessage, file, path, onProgress) => {
+    const start = async (transferId) => {
+        const reply = await request(
+            sendMessage,
+            { action: "fs_upload_start", path, size: file.size, transfer_id: transferId },
+            (m) => m.path === path
+        );
+        if (reply.status !== 'success') throw new Error(reply.error);
+        return reply;
+    };
+
+    const started = await start();
+    const transferId = started.transfer_id;
+    let offset = started.offset;
+    let retries = 0;
+
+    while (offset < file.size) {
+        const bytes = new Uint8Array(await file.slice(offset, offset + started.chunk_size).arrayBuffer());
+        const expected = offset + bytes.length;
+        let ack;
+        try {
+            ack = await request(
+                sendMessage,
+                { action: "fs_upload_chunk", transfer_id: transferId, offset, data: toBase64(bytes), checksum: await sha256(bytes) },
+                (m) => m.transfer_id === transferId && (m.status !== 'success' || m.offset === expected)
+            );
+        } catch (err) {
+            if (++retries > MAX_RETRIES) throw err;
+            offset = (await start(transferId)).offset;
+            continue;
+        }
+        if (ack.status === 'success') {
+            offset = ack.offset;
+            retries = 0;
+            onProgress?.(offset, file.size);
+        } else if (ack.offset !== undefined && ++retries <= MAX_RETRIES) {
+            // The server tells where its copy ends
+            offset = ack.offset;
+        } else {
+            throw new Error(ack.error);
+        }
+    }
+
+    const done = await request(sendMessage, { action: "fs_upload_finish", transfer_id: transferId }, (m) => m.transfer_id === transferId);
+    if (done.status !== 'success') throw new Error(done.error);
+    return done;
+};
+
+export const downloadFile = async (sendMessage, path) => {
+    const started = await request(sendMessage, { action: "fs_download_start", path }, (m) => m.path === path);
+    if (started.status !== 'success') throw new Error(started.error);
+    const transferId = started.transfer_id;
+    const parts = [];
+    let offset = 0;
+    let retries = 0;
+
+    while (true) {
+        const requested = offset;
+        let chunk;
+        try {
+            chunk = await request(
+                sendMessage,
+                { action: "fs_download_chunk", transfer_id: transferId, offset: requested },
+                (m) => m.transfer_id === transferId && (m.status !== 'success' || m.offset === requested)
+            );
+        } catch (err) {
+            if (++retries > MAX_RETRIES) throw err;
+            continue;
+        }
+        if (chunk.status !== 'success') throw new Error(chunk.error);
+        const bytes = fromBase64(chunk.data);
+        if (await sha256(bytes) !== chunk.checksum) {
+            if (++retries > MAX_RETRIES) throw new Error("Checksum mismatch");
+            continue;
+        }
+        parts.push(bytes);
+        offset += bytes.length;
+        retries = 0;
+        if (chunk.eof) break;
+    }
+
+    const url = URL.createObjectURL(new Blob(parts));
+    const link = document.createElement('a');
+    link.href = url;
+    link.download = path.split('/').pop();
+    link.click();
+    URL.revokeObjectURL(url);
+};
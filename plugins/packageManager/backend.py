@@ -3,7 +3,8 @@ import shutil
 import asyncio
 import json
 import venv
-from app.core.registry import ws_registry
+from app.core.registry import ws_registry, CONCURRENT, EXCLUSIVE
+from app.core.storage_manager import get_user_dir, mark_usage_stale
 
 def ensure_venv(user_storage_dir):
     venv_dir = os.path.join(user_storage_dir, ".venv")
@@ -11,7 +12,7 @@ def ensure_venv(user_storage_dir):
         venv.create(venv_dir, with_pip=True, system_site_packages=True)
     return os.path.join(venv_dir, "bin", "python")
 
-@ws_registry.register("package_manager:list")
+@ws_registry.register("package_manager:list", concurrency=CONCURRENT, limit=1)
 async def handle_list_packages(session, data: dict):
     python_path = ensure_venv(session.user.local_storage_dir)
     try:
@@ -23,29 +24,29 @@ async def handle_list_packages(session, data: dict):
         stdout, stderr = await proc.communicate()
         if proc.returncode == 0:
             packages = json.loads(stdout.decode('utf-8'))
-            await session.websocket.send_json({
+            await session.send_json({
                 "action": "package_manager:list",
                 "status": "success",
                 "packages": packages
             })
         else:
-            await session.websocket.send_json({
+            await session.send_json({
                 "action": "package_manager:list",
                 "status": "error",
                 "error": stderr.decode('utf-8')
             })
     except Exception as e:
-        await session.websocket.send_json({
+        await session.send_json({
             "action": "package_manager:list",
             "status": "error",
             "error": str(e)
         })
 
-@ws_registry.register("package_manager:install")
+@ws_registry.register("package_manager:install", resource="packages")
 async def handle_install_package(session, data: dict):
     package_name = data.get("package")
     if not package_name:
-        await session.websocket.send_json({
+        await session.send_json({
             "action": "package_manager:install",
             "status": "error",
             "error": "No package specified"
@@ -65,7 +66,7 @@ async def handle_install_package(session, data: dict):
                 line = await stream.readline()
                 if not line:
                     break
-                await session.websocket.send_json({
+                await session.send_json({
                     "action": "package_manager:log",
                     "type": log_type,
                     "line": line.decode('utf-8').rstrip()
@@ -76,31 +77,32 @@ async def handle_install_package(session, data: dict):
             read_stream(proc.stderr, "stderr")
         )
         await proc.wait()
+        mark_usage_stale(get_user_dir(session.user.user_id))
 
         if proc.returncode == 0:
-            await session.websocket.send_json({
+            await session.send_json({
                 "action": "package_manager:install",
                 "status": "success",
                 "package": package_name
             })
         else:
-            await session.websocket.send_json({
+            await session.send_json({
                 "action": "package_manager:install",
                 "status": "error",
                 "error": f"Pip exited with code {proc.returncode}"
             })
     except Exception as e:
-        await session.websocket.send_json({
+        await session.send_json({
             "action": "package_manager:install",
             "status": "error",
             "error": str(e)
         })
 
-@ws_registry.register("package_manager:uninstall")
+@ws_registry.register("package_manager:uninstall", resource="packages")
 async def handle_uninstall_package(session, data: dict):
     package_name = data.get("package")
     if not package_name:
-        await session.websocket.send_json({
+        await session.send_json({
             "action": "package_manager:uninstall",
             "status": "error",
             "error": "No package specified"
@@ -120,7 +122,7 @@ async def handle_uninstall_package(session, data: dict):
                 line = await stream.readline()
                 if not line:
                     break
-                await session.websocket.send_json({
+                await session.send_json({
                     "action": "package_manager:log",
                     "type": log_type,
                     "line": line.decode('utf-8').rstrip()
@@ -131,39 +133,41 @@ async def handle_uninstall_package(session, data: dict):
             read_stream(proc.stderr, "stderr")
         )
         await proc.wait()
+        mark_usage_stale(get_user_dir(session.user.user_id))
 
         if proc.returncode == 0:
-            await session.websocket.send_json({
+            await session.send_json({
                 "action": "package_manager:uninstall",
                 "status": "success",
                 "package": package_name
             })
         else:
-            await session.websocket.send_json({
+            await session.send_json({
                 "action": "package_manager:uninstall",
                 "status": "error",
                 "error": f"Pip exited with code {proc.returncode}"
             })
     except Exception as e:
-        await session.websocket.send_json({
+        await session.send_json({
             "action": "package_manager:uninstall",
             "status": "error",
             "error": str(e)
         })
 
-@ws_registry.register("package_manager:reset")
+@ws_registry.register("package_manager:reset", concurrency=EXCLUSIVE)
 async def handle_reset_env(session, data: dict):
     venv_dir = os.path.join(session.user.local_storage_dir, ".venv")
     try:
         if os.path.exists(venv_dir):
             shutil.rmtree(venv_dir)
         ensure_venv(session.user.local_storage_dir)
-        await session.websocket.send_json({
+        mark_usage_stale(get_user_dir(session.user.user_id))
+        await session.send_json({
             "action": "package_manager:reset",
             "status": "success"
         })
     except Exception as e:
-        await session.websocket.send_json({
+        await session.send_json({
             "action": "package_manager:reset",
             "status": "error",
             "error": str(e)
@@ -7,6 +7,19 @@ const formatSize = (bytes) => {
     return `${(bytes / (1024 * 1024)).toFixed(1)} MB`;
 };
 
+const formatGrowth = (bytes) => `${bytes >= 0 ? '+' : '-'}${formatSize(Math.abs(bytes))}`;
+
+const cardStyle = {
+    background: 'rgba(255, 255, 255, 0.03)',
+    border: '1px solid rgba(255, 255, 255, 0.05)',
+    padding: '12px',
+    borderRadius: '6px'
+};
+
+const rowStyle = { display: 'flex', justifyContent: 'space-between', gap: '8px', fontSize: '0.78rem', opacity: 0.8, marginBottom: '4px' };
+
+const ellipsisStyle = { overflow: 'hidden', textOverflow: 'ellipsis', whiteSpace: 'nowrap' };
+
 const StorageMonitor = ({ sendMessage }) => {
     const [info, setInfo] = useState(null);
 
@@ -105,6 +118,43 @@ const StorageMonitor = ({ sendMessage }) => {
                             <span style={{ fontWeight: '500' }}>{info.states_count}</span>
                         </div>
                     </div>
+                    <div style={cardStyle}>
+                        <div style={{ fontSize: '0.85rem', fontWeight: '600', color: '#6c5ce7', marginBottom: '8px' }}>📊 Total</div>
+                        <div style={rowStyle}>
+                            <span>Disk Usage:</span>
+                            <span style={{ fontWeight: '500' }}>{formatSize(info.total_size || 0)}</span>
+                        </div>
+                        {info.growth && (
+                            <div style={rowStyle}>
+                                <span>Since last check:</span>
+                                <span style={{ fontWeight: '500' }}>{formatGrowth(info.growth.total)}</span>
+                            </div>
+                        )}
+                    </div>
+                    {info.top_files?.length > 0 && (
+                        <div style={cardStyle}>
+                            <div style={{ fontSize: '0.85rem', fontWeight: '600', color: '#6c5ce7', marginBottom: '8px' }}>🗂️ Largest Files</div>
+                            {info.top_files.map(file => (
+                                <div key={file.path} style={rowStyle} title={file.path}>
+                                    <span style={ellipsisStyle}>{file.path}</span>
+                                    <span style={{ fontWeight: '500', flexShrink: 0 }}>{formatSize(file.size)}</span>
+                                </div>
+                            ))}
+                        </div>
+                    )}
+                    {info.node_states?.length > 0 && (
+                        <div style={cardStyle}>
+                            <div style={{ fontSize: '0.85rem', fontWeight: '600', color: '#6c5ce7', marginBottom: '8px' }}>🧩 Largest Node States</div>
+                            {info.node_states.slice(0, 10).map(state => (
+                                <div key={state.node_id} style={rowStyle} title={state.node_id}>
+                                    <span style={ellipsisStyle}>
+                                        {state.node ? `${state.project} › ${state.node}` : `Deleted node (${state.node_id.slice(0, 8)})`}
+                                    </span>
+                                    <span style={{ fontWeight: '500', flexShrink: 0 }}>{formatSize(state.size)}</span>
+                                </div>
+                            ))}
+                        </div>
+                    )}
                 </div>
             ) : (
                 <div style={{ fontSize: '0.8rem', opacity: 0.6, textAlign: 'center', padding: '20px 0' }}>Loading storage statistics...</div>
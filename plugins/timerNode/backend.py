@@ -1,6 +1,4 @@
-import asyncio
-import time
-from datetime import datetime, timezone, timedelta
+from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 from app.core.node_registry import node_registry
 from app.services.trigger_manager import trigger_manager
@@ -28,69 +26,50 @@ def parse_target_time(target_str: str) -> tuple[int, int, int, int]:
     except Exception:
         return 12, 0, 0, 0
 
-async def timer_trigger_handler(user_id: str, project_id: str, node_id: str, config: dict, manager):
-    mode = config.get("mode", "interval")
-    tz_name = config.get("timezone", "UTC")
-    
+def _interval_seconds(config: dict) -> float:
     try:
-        user_tz = ZoneInfo(tz_name)
+        interval_val = int(config.get("interval", 5))
     except Exception:
-        user_tz = ZoneInfo("UTC")
+        interval_val = 5
 
-    if mode == "exact":
-        target_str = config.get("targetTime", "12:00:00")
-        repeat_daily = config.get("repeatDaily", True)
-        
-        while True:
-            hours, minutes, seconds, millis = parse_target_time(target_str)
-            now = datetime.now(user_tz)
-            target_dt = now.replace(hour=hours, minute=minutes, second=seconds, microsecond=millis * 1000)
-            
-            if target_dt <= now:
-                target_dt += timedelta(days=1)
-                
-            delay = (target_dt - datetime.now(user_tz)).total_seconds()
-            if delay > 0:
-                await asyncio.sleep(delay)
-                
-            timestamp = datetime.now(timezone.utc).isoformat()
-            await manager.fire_trigger(user_id, project_id, node_id, {
-                "timestamp": timestamp,
-                "mode": mode,
-                "triggeredAt": target_str,
-                "timezone": tz_name
-            })
-            
-            if not repeat_daily:
-                break
+    if interval_val < 1:
+        interval_val = 1
+
+    unit = config.get("unit", "minutes")
+
+    if unit == "hours":
+        delay = interval_val * 3600.0
+    elif unit == "days":
+        delay = interval_val * 86400.0
     else:
-        try:
-            interval_val = int(config.get("interval", 5))
-        except Exception:
-            interval_val = 5
-            
-        if interval_val < 1:
-            interval_val = 1
-            
-        unit = config.get("unit", "minutes")
-        
-        if unit == "hours":
-            delay = interval_val * 3600.0
-        elif unit == "days":
-            delay = interval_val * 86400.0
-        else:
-            delay = interval_val * 60.0
+        delay = interval_val * 60.0
+
+    return max(delay, 60.0)
+
+def _user_timezone(config: dict):
+    try:
+        return ZoneInfo(config.get("timezone", "UTC"))
+    except Exception:
+        return ZoneInfo("UTC")
+
+def timer_next_fire(config: dict, after: float, last_fired):
+    """Next fire time (UNIX seconds) after 'after', None once a one-shot timer fired."""
+    if config.get("mode", "interval") != "exact":
+        return after + _interval_seconds(config)
 
-        if delay < 60.0:
-            delay = 60.0
-            
-        while True:
-            await asyncio.sleep(delay)
-            timestamp = datetime.now(timezone.utc).isoformat()
-            await manager.fire_trigger(user_id, project_id, node_id, {
-                "timestamp": timestamp,
-                "mode": mode,
-                "interval": delay
-            })
+    if last_fired is not None and not config.get("repeatDaily", True):
+        return None
+    hours, minutes, seconds, millis = parse_target_time(config.get("targetTime", "12:00:00"))
+    now = datetime.fromtimestamp(after, _user_timezone(config))
+    target_dt = now.replace(hour=hours, minute=minutes, second=seconds, microsecond=millis * 1000)
+    if target_dt <= now:
+        target_dt += timedelta(days=1)
+    return target_dt.timestamp()
+
+def timer_output(config: dict) -> dict:
+    mode = config.get("mode", "interval")
+    if mode == "exact":
+        return {"mode": mode, "triggeredAt": config.get("targetTime", "12:00:00"), "timezone": config.get("timezone", "UTC")}
+    return {"mode": mode, "interval": _interval_seconds(config)}
 
-trigger_manager.register_handler("TimerNode", timer_trigger_handler)
+trigger_manager.register_scheduler("TimerNode", timer_next_fire, timer_output)